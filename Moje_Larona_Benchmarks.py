@@ -0,0 +1,371 @@
+"""
+Gradebook Benchmarks
+Times the same workload against every generation of the gradebook:
+the dictionary functions of Sections C and D, the Gradebook classes of
+Section E (dictionary, columnar and in-memory SQLite storage) and the
+Gradebook of Section F.
+
+Usage:
+    python Moje_Larona_Benchmarks.py [--students N] [--subjects M] [--density D]
+        [--seed S] [--repeat R] [--sections C,D,E,F]
+        [--save-baseline FILE] [--baseline FILE] [--threshold T]
+
+--save-baseline writes the timings to a JSON file. --baseline compares the
+run against such a file and exits with status 1 if any operation got slower
+than the baseline by more than the threshold (0.25 = 25% by default).
+
+Sections C and D are driven through their prompts by answering input()
+calls, and they ask for every subject when a student is added, so a
+missing grade in a sparse roster is entered as 0 for them. Operations a
+section does not have are reported as "-", and operations that raise are
+reported as "error" along with the exception.
+"""
+
+import contextlib
+import importlib.util
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+OPERATIONS = ("add", "update", "search", "sort", "subject_stats", "class_average", "report")
+
+SECTION_FILES = {
+    "C": "Moje_Larona_Section C.py",
+    "D": "Moje_Larona_Section D.py",
+    "E": "Moje_Larona_Section E.py",
+    "F": "Moje_Larona_Section F.py",
+}
+
+# Timings shorter than this are too noisy to flag as regressions
+MIN_COMPARED_SECONDS = 0.005
+
+
+class Roster:
+    """A synthetic class: subjects, students with their grades, and the
+    grade updates and name searches run against it"""
+
+    def __init__(self, subjects, students, updates, searches):
+        self.subjects = subjects
+        self.students = students  # List of (name, {subject: grade})
+        self.updates = updates  # List of (name, subject, grade)
+        self.searches = searches  # List of names
+
+
+def make_roster(num_students, num_subjects, density=1.0, seed=42):
+    """Build a reproducible roster of num_students x num_subjects
+
+    density is the chance that a student has a grade in a subject, so 1.0
+    gives a dense roster and lower values a sparse one. The same arguments
+    always give the same roster"""
+    rng = random.Random(seed)
+    subjects = [f"Subject {i + 1}" for i in range(num_subjects)]
+    students = []
+    for i in range(num_students):
+        grades = {subject: rng.randint(0, 100) for subject in subjects if rng.random() < density}
+        students.append((f"Student {i + 1}", grades))
+
+    names = [name for name, _ in students]
+    num_lookups = min(num_students, 1000)
+    updates = [(rng.choice(names), rng.choice(subjects), rng.randint(0, 100)) for _ in range(num_lookups)] if names else []
+    searches = [rng.choice(names) for _ in range(num_lookups)] if names else []
+    return Roster(subjects, students, updates, searches)
+
+
+def load_section(section):
+    """Load a fresh copy of a section's file as a module"""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), SECTION_FILES[section])
+    spec = importlib.util.spec_from_file_location(f"section_{section.lower()}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class ScriptedAnswers:
+    """Stands in for input() in Sections C and D, answering each prompt
+    from the student, subject and grades currently being entered"""
+
+    def __init__(self, subjects):
+        self.subjects = subjects
+        self.name = None
+        self.subject = None
+        self.grades = {}
+
+    def __call__(self, prompt):
+        if prompt.startswith("How many subjects"):
+            return str(len(self.subjects))
+        if "subject name" in prompt:
+            number = int(prompt.split("subject name ", 1)[1].rstrip(": "))
+            return self.subjects[number - 1]
+        if "(y/n)" in prompt:
+            return "y"
+        if "marks for " in prompt:
+            subject = prompt.rsplit("marks for ", 1)[1].rstrip(": ")
+            return str(self.grades.get(subject, 0))
+        if "subject" in prompt.lower():
+            return self.subject
+        return self.name
+
+
+class DictSectionDriver:
+    """Runs the workload against the module-level dictionaries of Section C or D"""
+
+    def __init__(self, section, roster, report_file):
+        self.module = load_section(section)
+        self.roster = roster
+        self.report_file = report_file
+        self.answers = ScriptedAnswers(roster.subjects)
+        self.module.input = self.answers  # Shadows the builtin for this module only
+        self.module.setup_subjects()
+
+    def add(self):
+        for name, grades in self.roster.students:
+            self.answers.name, self.answers.grades = name, grades
+            self.module.add_students()
+
+    def update(self):
+        for name, subject, grade in self.roster.updates:
+            self.answers.name, self.answers.subject, self.answers.grades = name, subject, {subject: grade}
+            self.module.student_grade_update()
+
+    def search(self):
+        for name in self.roster.searches:
+            self.answers.name = name
+            self.module.search_student()
+
+    sort = None  # Sections C and D cannot sort students
+
+    def subject_stats(self):
+        self.module.subject_summary()
+
+    def class_average(self):
+        self.module.overall_average()
+
+    def report(self):
+        self.module.class_report()
+        self.module.summary_table()
+
+
+class SectionEDriver:
+    """Runs the workload against a Section E Gradebook, ColumnarGradebook or SqliteGradebook"""
+
+    def __init__(self, section, roster, report_file, storage="Gradebook"):
+        module = load_section(section)
+        self.gradebook = getattr(module, storage)()
+        self.roster = roster
+        self.report_file = report_file
+        for subject in roster.subjects:
+            self.gradebook.add_subject(subject)
+
+    def add(self):
+        gradebook = self.gradebook
+        for name, grades in self.roster.students:
+            gradebook.add_student(name)
+            for subject, grade in grades.items():
+                gradebook.update_student_grade(name, subject, grade)
+
+    def update(self):
+        for name, subject, grade in self.roster.updates:
+            self.gradebook.update_student_grade(name, subject, grade)
+
+    def search(self):
+        for name in self.roster.searches:
+            self.gradebook.search_student(name)
+
+    def sort(self):
+        self.gradebook.sort_students_by_average()
+
+    def subject_stats(self):
+        for subject in self.roster.subjects:
+            self.gradebook.subject_stats(subject)
+
+    def class_average(self):
+        self.gradebook.class_average()
+
+    def report(self):
+        self.gradebook.class_report(self.report_file)
+        self.gradebook.summary_table(self.report_file)
+
+
+class SectionFDriver:
+    """Runs the workload against the Section F Gradebook"""
+
+    def __init__(self, section, roster, report_file):
+        module = load_section(section)
+        self.gradebook = module.Gradebook()
+        self.roster = roster
+        self.report_file = report_file
+        for subject in roster.subjects:
+            self.gradebook.add_subject(subject)
+
+    def add(self):
+        gradebook = self.gradebook
+        for name, grades in self.roster.students:
+            gradebook.add_student(name)
+            for subject, grade in grades.items():
+                gradebook.add_grade_to_student(name, subject, grade)
+
+    def update(self):
+        for name, subject, grade in self.roster.updates:
+            self.gradebook.add_grade_to_student(name, subject, grade)
+
+    def search(self):
+        for name in self.roster.searches:
+            self.gradebook.find_student(name)
+
+    def sort(self):
+        self.gradebook.rank_by_average()
+
+    subject_stats = None  # Section F has no per-subject statistics
+
+    def class_average(self):
+        self.gradebook.class_average()
+
+    def report(self):
+        self.gradebook.display_class_report()
+
+
+IMPLEMENTATIONS = {
+    "C": lambda roster, out: DictSectionDriver("C", roster, out),
+    "D": lambda roster, out: DictSectionDriver("D", roster, out),
+    "E": lambda roster, out: SectionEDriver("E", roster, out),
+    "E-columnar": lambda roster, out: SectionEDriver("E", roster, out, storage="ColumnarGradebook"),
+    "E-sqlite": lambda roster, out: SectionEDriver("E", roster, out, storage="SqliteGradebook"),
+    "F": lambda roster, out: SectionFDriver("F", roster, out),
+}
+
+
+def run_implementation(name, roster, repeat=3):
+    """Time every operation for one implementation
+
+    Each repeat starts from an empty gradebook; the fastest time of each
+    operation is kept. Returns ({operation: seconds or None}, {operation: error})"""
+    timings = {}
+    errors = {}
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(repeat):
+            driver = IMPLEMENTATIONS[name](roster, devnull)
+            for operation in OPERATIONS:
+                action = getattr(driver, operation)
+                if action is None or operation in errors:
+                    timings.setdefault(operation, None)
+                    continue
+                start = time.perf_counter()
+                try:
+                    action()
+                except Exception as error:
+                    errors[operation] = f"{type(error).__name__}: {error}"
+                    timings[operation] = None
+                    continue
+                elapsed = time.perf_counter() - start
+                best = timings.get(operation)
+                timings[operation] = elapsed if best is None else min(best, elapsed)
+    return timings, errors
+
+
+def run_benchmarks(settings, implementations=None):
+    """Run the workload described by settings against each implementation
+
+    Returns a JSON-ready dictionary with the settings, timings and errors"""
+    roster = make_roster(settings["students"], settings["subjects"], settings["density"], settings["seed"])
+    results = {"settings": settings, "python": platform.python_version(), "timings": {}, "errors": {}}
+    for name in implementations or IMPLEMENTATIONS:
+        timings, errors = run_implementation(name, roster, settings["repeat"])
+        results["timings"][name] = timings
+        if errors:
+            results["errors"][name] = errors
+    return results
+
+
+def compare_to_baseline(results, baseline, threshold=0.25):
+    """List every operation that is more than threshold slower than the baseline"""
+    if baseline["settings"] != results["settings"]:
+        raise ValueError(f"Baseline was run with {baseline['settings']}, not {results['settings']}")
+
+    regressions = []
+    for name, timings in results["timings"].items():
+        for operation, seconds in timings.items():
+            before = baseline["timings"].get(name, {}).get(operation)
+            if seconds is None or before is None or before < MIN_COMPARED_SECONDS:
+                continue
+            if seconds > before * (1 + threshold):
+                regressions.append(f"{name} {operation}: {before:.4f}s -> {seconds:.4f}s "
+                                   f"({seconds / before - 1:+.0%})")
+    return regressions
+
+
+def print_results(results):
+    """Print the timings as a table with one row per implementation"""
+    print(f"{'Section':<12}" + "".join(f"{operation:>15}" for operation in OPERATIONS))
+    for name, timings in results["timings"].items():
+        cells = []
+        for operation in OPERATIONS:
+            seconds = timings.get(operation)
+            if operation in results["errors"].get(name, {}):
+                cells.append("error")
+            elif seconds is None:
+                cells.append("-")
+            else:
+                cells.append(f"{seconds:.4f}")
+        print(f"{name:<12}" + "".join(f"{cell:>15}" for cell in cells))
+
+    for name, errors in results["errors"].items():
+        for operation, error in errors.items():
+            print(f"{name} {operation} failed: {error}")
+
+
+def option(flag, default, convert=str):
+    """Value following flag on the command line, or default if it is not given"""
+    if flag in sys.argv[1:]:
+        return convert(sys.argv[sys.argv.index(flag) + 1])
+    return default
+
+
+def main():
+    """Run the benchmarks from the command line; returns the exit status"""
+    settings = {
+        "students": option("--students", 5000, int),
+        "subjects": option("--subjects", 5, int),
+        "density": option("--density", 1.0, float),
+        "seed": option("--seed", 42, int),
+        "repeat": option("--repeat", 3, int),
+    }
+    sections = option("--sections", None)
+    implementations = None
+    if sections is not None:
+        wanted = sections.split(",")
+        implementations = [name for name in IMPLEMENTATIONS if name.split("-")[0] in wanted]
+
+    print(f"{settings['students']} students x {settings['subjects']} subjects, "
+          f"density {settings['density']}, seed {settings['seed']}")
+    results = run_benchmarks(settings, implementations)
+    print_results(results)
+
+    save_path = option("--save-baseline", None)
+    if save_path is not None:
+        with open(save_path, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+        print(f"Baseline saved to {save_path}")
+
+    baseline_path = option("--baseline", None)
+    if baseline_path is not None:
+        with open(baseline_path, encoding="utf-8") as file:
+            baseline = json.load(file)
+        try:
+            regressions = compare_to_baseline(results, baseline, option("--threshold", 0.25, float))
+        except ValueError as error:
+            print(f"Error: {error}")
+            return 2
+        if regressions:
+            print("Regressions against the baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("No regressions against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
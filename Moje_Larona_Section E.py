@@ -1,58 +1,493 @@
+import asyncio
+import contextlib
+import copy
+import csv
+import functools
+import heapq
+import inspect
+import io
+import itertools
+import json
+import math
+import mmap
+import operator
+import os
+import random
+import re
+import shlex
+import sqlite3
+import struct
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.parse
+from array import array
+from collections import OrderedDict
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http import HTTPStatus
+from multiprocessing import shared_memory
+from types import MappingProxyType
+
+from Moje_Larona_Shared import (AverageRanking, ChangeJournal, FrozenStudent, Instrumentation, ReadOnlySnapshot,
+                                StudentGrades, SubjectNames, VersionPublisher, percentile)
+
+# Set to True to cross-check every running average against a full recompute
+DEBUG_AGGREGATES = False
+
+
+def check_aggregate(label, running, recomputed):
+    """Raise if a running aggregate has drifted from its full recompute"""
+    if not math.isclose(running, recomputed, abs_tol=1e-9):
+        raise AssertionError(f"{label}: running value {running} != recomputed {recomputed}")
+
+
+def write_lines(lines, out=None, lines_per_write=1000):
+    """Write text lines to out (stdout by default), joining them into large writes"""
+    if out is None:
+        out = sys.stdout
+    block = []
+    for line in lines:
+        block.append(line)
+        if len(block) >= lines_per_write:
+            out.write("".join(block))
+            block = []
+    if block:
+        out.write("".join(block))
+
+
+def counting_sort(items, buckets, descending=False):
+    """Stable O(n) sort of items by bucket numbers from 0 to 101
+
+    buckets[i] is the bucket of items[i] (a grade plus one, with 0 for no
+    grade). Items in the same bucket keep their order in items either way,
+    just like sorted(..., reverse=descending) keeps ties"""
+    lists = [[] for _ in range(102)]
+    appends = [bucket.append for bucket in lists]
+    for item, bucket in zip(items, buckets):
+        appends[bucket](item)
+    if descending:
+        lists.reverse()
+    return list(itertools.chain.from_iterable(lists))
+
+
+def sort_by_key(items, key, descending=False):
+    """Stable sort of items by key(item), picking the algorithm from the keys
+
+    When every key is a raw integer grade (-1 for no grade up to 100) this
+    is a counting_sort; any other keys, such as averages, which are floats,
+    fall back to Python's comparison sort. Both give the same order"""
+    items = list(items)
+    keys = list(map(key, items))
+    if set(map(type, keys)) <= {int} and (not keys or (min(keys) >= -1 and max(keys) <= 100)):
+        return counting_sort(items, [grade + 1 for grade in keys], descending)
+    order = sorted(range(len(items)), key=keys.__getitem__, reverse=descending)
+    return [items[position] for position in order]
+
+
+def format_summary_rows(rows, num_subjects):
+    """Yield summary table lines for (name, [grade or None for each subject]) rows"""
+    row_format = "{:<15}" + "{:<12}" * num_subjects + "{}\n"
+    for name, grades in rows:
+        present = [grade for grade in grades if grade is not None]
+        average = f"{sum(present) / len(present):.2f}" if present else "N/A"
+        cells = ["N/A" if grade is None else grade for grade in grades]
+        yield row_format.format(name, *cells, average)
+
+
+def student_info_lines(name, grades, average):
+    """Yield a student's display_info lines from a {subject: grade} dictionary"""
+    yield f"\n{name}'s Results:\n"
+    if not grades:
+        yield "  No grades recorded\n"
+        return
+
+    for subject, grade in grades.items():
+        yield f"  {subject}: {grade}\n"
+
+    yield f"  Average: {average:.2f}\n"
+
+
+def parse_grade(text):
+    """Convert text to a grade between 0-100, raising ValueError if it isn't one"""
+    try:
+        grade = int(text)
+    except ValueError:
+        raise ValueError("Please enter a valid number") from None
+    if not 0 <= grade <= 100:
+        raise ValueError("Grade must range from 0 to 100")
+    return grade
+
+
 class Student:
-    def __init__(self, name):
+    # No per-student __dict__ or grade dictionary: the grades are one byte each in
+    # self._grades, in the order of the subject ids in the shared self._layout
+    __slots__ = ("name", "_layout", "_grades", "grade_total", "gradebook")
+
+    def __init__(self, name, subject_names=None):
         self.name = name
-        self.grades = {}  # {subject: grade}
+        self._layout = (subject_names or SubjectNames()).empty  # A gradebook passes its own SubjectNames
+        self._grades = b""
+        self.grade_total = 0  # Running sum of the grades (count is len(self._grades))
+        self.gradebook = None  # Gradebook notified when a grade changes
+
+    @property
+    def grades(self):
+        """Read-only {subject: grade} view of the subjects this student has a grade in"""
+        return StudentGrades(self)
 
     def add_grade(self, subject, grade):
         """Add or update a grade for a subject"""
-        self.grades[subject] = grade
+        if not isinstance(grade, int) or not 0 <= grade <= 100:
+            raise ValueError("Grade must be an integer from 0 to 100")
+        old_grade = self._store_grade(subject, grade)
+        if self.gradebook is not None:
+            self.gradebook.grade_changed(self, subject, old_grade, grade)
+
+    def _store_grade(self, subject, grade):
+        """Write an already validated grade without telling the gradebook; returns the old grade"""
+        subject_id = self._layout.names.id_of(subject)
+        grades = self._grades
+        position = self._layout.positions.get(subject_id)
+        if position is None:
+            self._layout = self._layout.add(subject_id)
+            self._grades = grades + bytes((grade,))
+            self.grade_total += grade
+            return None
+        old_grade = grades[position]
+        self._grades = grades[:position] + bytes((grade,)) + grades[position + 1:]
+        self.grade_total += grade - old_grade
+        return old_grade
 
     def remove_grade(self, subject):
         """Remove a grade for a specific subject"""
-        if subject in self.grades:
-            del self.grades[subject]
-            return True
-        return False
+        subject_id = self._layout.names.ids.get(subject)
+        position = self._layout.positions.get(subject_id)
+        if position is None:
+            return False
+        grades = self._grades
+        old_grade = grades[position]
+        self._layout = self._layout.remove(subject_id)
+        self._grades = grades[:position] + grades[position + 1:]
+        self.grade_total -= old_grade
+        if self.gradebook is not None:
+            self.gradebook.grade_changed(self, subject, old_grade, None)
+        return True
 
     def calculate_average(self):
         """Calculate the student's average grade"""
-        if not self.grades:
+        if not self._grades:
             return 0
-        return sum(self.grades.values()) / len(self.grades)
+        if DEBUG_AGGREGATES:
+            check_aggregate(f"{self.name} total", self.grade_total, sum(self._grades))
+        return self.grade_total / len(self._grades)
 
     def get_grade(self, subject):
         """Get grade for a specific subject"""
-        return self.grades.get(subject, None)
+        layout = self._layout
+        position = layout.positions.get(layout.names.ids.get(subject))
+        return None if position is None else self._grades[position]
 
     def display_info(self):
         """Display student's grades and average"""
-        print(f"\n{self.name}'s Results:")
-        if not self.grades:
-            print("  No grades recorded")
-            return
-
-        for subject, grade in self.grades.items():
-            print(f"  {subject}: {grade}")
+        write_lines(self.info_lines())
 
-        average = self.calculate_average()
-        print(f"  Average: {average:.2f}")
+    def info_lines(self):
+        """Yield the student's grades and average as text lines"""
+        return student_info_lines(self.name, self.grades, self.calculate_average())
 
     def has_subject(self, subject):
         """Check if student has a grade for the given subject"""
-        return subject in self.grades
+        return self.get_grade(subject) is not None
 
     def __str__(self):
         return f"Student: {self.name}, Grades: {len(self.grades)}, Average: {self.calculate_average():.2f}"
 
 
+class GradeHistogram:
+    """Number of grades at each value from 0 to 100 in one subject
+
+    Updated one grade at a time as grades change, so every statistic below
+    is at most one pass over the 101 buckets however many students there
+    are. Percentiles use the nearest-rank method, like percentile()."""
+
+    __slots__ = ("counts", "count", "total", "total_squares")
+
+    def __init__(self):
+        self.counts = [0] * 101  # counts[grade] = number of students with that grade
+        self.count = 0
+        self.total = 0
+        self.total_squares = 0  # Running sum of the squared grades, for the standard deviation
+
+    def __len__(self):
+        return self.count
+
+    def add(self, grade):
+        self.counts[grade] += 1
+        self.count += 1
+        self.total += grade
+        self.total_squares += grade * grade
+
+    def remove(self, grade):
+        self.counts[grade] -= 1
+        self.count -= 1
+        self.total -= grade
+        self.total_squares -= grade * grade
+
+    def lowest(self):
+        """Lowest grade, or None if there are no grades"""
+        for grade, count in enumerate(self.counts):
+            if count:
+                return grade
+        return None
+
+    def highest(self):
+        """Highest grade, or None if there are no grades"""
+        for grade in range(100, -1, -1):
+            if self.counts[grade]:
+                return grade
+        return None
+
+    def mean(self):
+        return self.total / self.count if self.count else 0
+
+    def stdev(self):
+        """Population standard deviation of the grades (0 if there are none)"""
+        if not self.count:
+            return 0
+        # Integer arithmetic keeps the variance exact and never below 0
+        return math.sqrt(self.count * self.total_squares - self.total * self.total) / self.count
+
+    def grade_at(self, rank):
+        """The rank-th lowest grade, counting from 1"""
+        seen = 0
+        for grade, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return grade
+        raise IndexError(f"Rank {rank} is past the {self.count} grades")
+
+    def percentile(self, percent):
+        """Nearest-rank percentile (0-100) of the grades, or None if there are none"""
+        if not self.count:
+            return None
+        return self.grade_at(max(1, math.ceil(percent / 100 * self.count)))
+
+    def median(self):
+        """Median grade (the mean of the two middle grades for an even count), or None"""
+        if not self.count:
+            return None
+        return (self.grade_at((self.count + 1) // 2) + self.grade_at(self.count // 2 + 1)) / 2
+
+    def copy(self):
+        histogram = GradeHistogram()
+        histogram.merge(self)
+        return histogram
+
+    def merge(self, other):
+        """Add another histogram's grades to this one"""
+        self.counts = [mine + theirs for mine, theirs in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.total += other.total
+        self.total_squares += other.total_squares
+
+    def percentile_rank(self, grade):
+        """Percentage of the grades below grade, counting grades equal to it as half"""
+        if not self.count:
+            return None
+        below = sum(self.counts[:grade])
+        return 100 * (below + self.counts[grade] / 2) / self.count
+
+
+_NOT_CACHED = object()  # ReportCache.lookup's result for a key it does not hold
+
+
+class ReportCache:
+    """Least-recently-used cache of a Gradebook's rendered reports and sorted views
+
+    Entries are keyed by the version counters of what they were computed
+    from (see cached_report), so a change only makes the entries that read
+    it unreachable; those then age out. At most max_entries entries and
+    max_size characters or list items are kept, evicting the least recently
+    used first. hits and misses count lookups. Any value can be cached,
+    None included."""
+
+    def __init__(self, max_entries=256, max_size=10000000):
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.entries = OrderedDict()  # key -> value, least recently used first
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()  # Reports may run on server threads
+
+    def get(self, key, compute):
+        """Cached value for key, calling compute() to fill it on a miss"""
+        value = self.lookup(key)
+        if value is _NOT_CACHED:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def lookup(self, key):
+        """Cached value for key, or _NOT_CACHED on a miss"""
+        with self._lock:
+            value = self.entries.get(key, _NOT_CACHED)
+            if value is _NOT_CACHED:
+                self.misses += 1
+            else:
+                self.entries.move_to_end(key)
+                self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Keep value for key, evicting least recently used entries to stay in bounds"""
+        with self._lock:
+            if key not in self.entries:
+                self.entries[key] = value
+                self.size += self._size_of(value)
+            while self.entries and (len(self.entries) > self.max_entries or self.size > self.max_size):
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= self._size_of(evicted)
+
+    @staticmethod
+    def _size_of(value):
+        return len(value) if hasattr(value, "__len__") else 1
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        """{hits, misses, hit_rate, entries, size}"""
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0,
+                "entries": len(self.entries), "size": self.size}
+
+
+def cached_report(scope):
+    """Serve a Gradebook method's result from gradebook.report_cache, when it has one
+
+    scope names the version counters the result depends on: "all" for any
+    change, "subject" for grade changes in the subject given as the first
+    argument plus students being added or removed, and "student" for changes
+    to the student named by the first argument. Lists are copied on the way
+    out so callers can't change the cached one."""
+    def decorate(method):
+        @functools.wraps(method)
+        def cached_method(self, *args, **kwargs):
+            cache = self.report_cache
+            if cache is None:
+                return method(self, *args, **kwargs)
+            key = report_key(self, scope, method.__name__, args, kwargs)
+            value = cache.get(key, lambda: method(self, *args, **kwargs))
+            return list(value) if isinstance(value, list) else value
+        return cached_method
+    return decorate
+
+
+def report_key(gradebook, scope, name, args=(), kwargs=None):
+    """ReportCache key of gradebook.name(*args, **kwargs) for a cached_report scope"""
+    if scope == "subject":
+        versions = (gradebook.subject_versions.get(args[0], 0), gradebook.roster_version)
+    elif scope == "student":
+        versions = gradebook.student_versions.get(args[0], 0)
+    else:
+        versions = gradebook.change_version
+    return name, args, tuple(sorted((kwargs or {}).items())), versions
+
+
 class Gradebook:
+    keep_aggregates = True  # Maintain running totals and histograms (off when storage computes them)
+
     def __init__(self):
         self.students = {}  # {name: Student object}
         self.subjects = set()
+        self.subject_names = SubjectNames()  # Subject ids and layouts shared by this gradebook's students
+        self.grade_total = 0  # Running sum of every grade in the gradebook
+        self.grade_count = 0  # Running number of grades in the gradebook
+        self.subject_histograms = {}  # {subject: GradeHistogram}
+        self.change_version = 0  # Bumped by every change
+        self.roster_version = 0  # change_version when a student was last added or removed
+        self.subject_versions = {}  # {subject: change_version of its last grade change}
+        self.student_versions = {}  # {name: change_version of the student's last change}
+        self.report_cache = None  # ReportCache for reports and sorted views, if any
+        self._order = {}  # {name: insertion number}, same order as self.students
+        self._next_order = 0
+        self.journal = None  # GradebookJournal that records every change, if any
+        self.versions = None  # GradebookVersions publishing read-only snapshots, if any
+        self.rank_index = None  # StudentRanking, built by the first rank query and kept up to date after
+
+    def grade_changed(self, student, subject, old_grade, new_grade):
+        """Called by a student after one of its grades changed (None = no grade)"""
+        self._apply_grade_change(student.name, subject, old_grade, new_grade)
+        if self.journal is not None:
+            self.journal.record(["grade", student.name, subject, new_grade])
+        if self.versions is not None:
+            self.versions.students_changed([student.name])
+        if self.rank_index is not None:
+            self.rank_index.update(student.name)
+
+    def _apply_grade_change(self, name, subject, old_grade, new_grade):
+        """Keep totals, histograms and versions in step with one grade change"""
+        self.change_version += 1
+        self.subject_versions[subject] = self.student_versions[name] = self.change_version
+        if not self.keep_aggregates:
+            return
+        histogram = self.subject_histograms.get(subject)
+        if histogram is None:
+            histogram = self.subject_histograms[subject] = GradeHistogram()
+        if old_grade is not None:
+            self.grade_total -= old_grade
+            self.grade_count -= 1
+            histogram.remove(old_grade)
+        if new_grade is not None:
+            self.grade_total += new_grade
+            self.grade_count += 1
+            histogram.add(new_grade)
+
+    def _track_student(self, name):
+        """Give a student that was just added the next insertion number"""
+        self._order[name] = self._next_order
+        self._next_order += 1
+        self.change_version += 1
+        self.roster_version = self.student_versions[name] = self.change_version
+        if self.journal is not None:
+            self.journal.record(["student", name])
+        if self.versions is not None:
+            self.versions.students_changed([name])
+        if self.rank_index is not None:
+            self.rank_index.update(name)
+
+    def _untrack_student(self, name, grades):
+        """Take a student that was just removed out of the totals and indexes"""
+        for subject, grade in grades.items():
+            self._apply_grade_change(name, subject, grade, None)
+        if self.versions is not None:
+            self.versions.student_removed(name)
+        if self.rank_index is not None:
+            self.rank_index.remove(name)
+        del self._order[name]
+        self.change_version += 1
+        self.roster_version = self.change_version
+        del self.student_versions[name]
+        if self.journal is not None:
+            self.journal.record(["remove", name])
 
     def add_subject(self, subject):
         """Add a subject to the gradebook"""
+        if subject in self.subjects:
+            return
+        self.subject_names.id_of(subject)  # Intern the name once for all students
         self.subjects.add(subject)
+        self.change_version += 1
+        if self.journal is not None:
+            self.journal.record(["subject", subject])
+        if self.versions is not None:
+            self.versions.subjects_changed()
 
     def subject_exists(self, subject):
         """Check if subject exists"""
@@ -62,13 +497,18 @@ class Gradebook:
         """Add a new student to the gradebook"""
         if name in self.students:
             return False  # Student already exists
-        self.students[name] = Student(name)
+        student = Student(name, self.subject_names)
+        student.gradebook = self
+        self.students[name] = student
+        self._track_student(name)
         return True
 
     def remove_student(self, name):
         """Remove a student from the gradebook"""
         if name in self.students:
-            del self.students[name]
+            student = self.students.pop(name)
+            student.gradebook = None
+            self._untrack_student(name, student.grades)
             return True
         return False
 
@@ -87,55 +527,230 @@ class Gradebook:
         self.students[name].add_grade(subject, grade)
         return True
 
+    def update_grades(self, updates):
+        """Apply many grade updates as one all-or-nothing batch
+
+        updates is an iterable of (name, subject, grade) rows, or a columnar
+        batch {"name": [...], "subject": [...], "grade": [...]} whose grades
+        may be an array or bytes. Every row is checked before anything is
+        changed: the student and subject must exist and the grade must be an
+        integer from 0 to 100, and each row must hold exactly those three
+        values. Returns a list of (row number, message) for the bad rows;
+        when it is not empty nothing was applied. The class totals,
+        histograms and journal are updated once for the whole batch."""
+        if isinstance(updates, dict):
+            names, subjects, grades = updates["name"], updates["subject"], updates["grade"]
+            if not len(names) == len(subjects) == len(grades):
+                raise ValueError("name, subject and grade columns must have the same length")
+        else:
+            rows = updates if isinstance(updates, list) else list(updates)
+            errors = [(number, f"Row {row!r} must be (name, subject, grade)")
+                      for number, row in enumerate(rows, 1)
+                      if not isinstance(row, (tuple, list)) or len(row) != 3]
+            if errors:
+                return errors
+            names = [row[0] for row in rows]
+            subjects = [row[1] for row in rows]
+            grades = [row[2] for row in rows]
+
+        errors = self.validate_grades(names, subjects, grades)
+        if errors:
+            return errors
+
+        self._apply_grade_batch(self._store_grades(names, subjects, grades))
+        return []
+
+    def validate_grades(self, names, subjects, grades):
+        """Check batch columns for update_grades; returns (row number, message) pairs
+
+        Whole columns are checked at once with set differences and min/max, and
+        the rows are only walked one by one to report errors when something failed"""
+        unknown_names = set(names).difference(self.students)
+        unknown_subjects = set(subjects).difference(self.subjects)
+        grades_valid = set(map(type, grades)) <= {int} and (not grades or (min(grades) >= 0 and max(grades) <= 100))
+        if not unknown_names and not unknown_subjects and grades_valid:
+            return []
+
+        errors = []
+        for row, (name, subject, grade) in enumerate(zip(names, subjects, grades), 1):
+            if name in unknown_names:
+                errors.append((row, f"{name} was not found"))
+            elif subject in unknown_subjects:
+                errors.append((row, f"{subject} was not found"))
+            elif not isinstance(grade, int) or not 0 <= grade <= 100:
+                errors.append((row, f"Grade {grade!r} must be an integer from 0 to 100"))
+        return errors
+
+    def _store_grades(self, names, subjects, grades):
+        """Write validated batch columns without notifying anything
+
+        Returns (name, subject, old grade or None, new grade) for each row"""
+        students = self.students
+        return [(name, subject, students[name]._store_grade(subject, grade), grade)
+                for name, subject, grade in zip(names, subjects, grades)]
+
+    def _apply_grade_batch(self, changes):
+        """Bring totals, histograms and the journal up to date after a batch
+
+        changes holds (name, subject, old grade or None, new grade) in the order applied"""
+        if changes:
+            self.change_version += 1
+        subject_versions = self.subject_versions
+        student_versions = self.student_versions
+        version = self.change_version
+        for name, subject, _, _ in changes:
+            subject_versions[subject] = student_versions[name] = version
+
+        if self.keep_aggregates:
+            old_grades = [change[2] for change in changes if change[2] is not None]
+            self.grade_total += sum(change[3] for change in changes) - sum(old_grades)
+            self.grade_count += len(changes) - len(old_grades)
+            histograms = self.subject_histograms
+            for _, subject, old_grade, new_grade in changes:
+                histogram = histograms.get(subject)
+                if histogram is None:
+                    histogram = histograms[subject] = GradeHistogram()
+                if old_grade is not None:
+                    histogram.remove(old_grade)
+                histogram.add(new_grade)
+
+        if self.journal is not None:
+            for name, subject, _, new_grade in changes:
+                self.journal.record(["grade", name, subject, new_grade])
+            self.journal.sync()
+
+        if self.versions is not None:
+            self.versions.students_changed([change[0] for change in changes])
+        if self.rank_index is not None:
+            for name in dict.fromkeys(change[0] for change in changes):
+                self.rank_index.update(name)
+
     def search_student(self, name):
         """Search for a student and return their object"""
         return self.students.get(name, None)
 
+    def filter_students(self, expression):
+        """Students matching a filter such as "Math < 50 and average > 70" (see GradeFilter)
+
+        Raises ValueError for a malformed filter or an unknown subject. The
+        matches are worked out at once with whole-column operations; the
+        Student objects are then yielded lazily, in insertion order"""
+        grade_filter = expression if isinstance(expression, GradeFilter) else GradeFilter(expression)
+        return grade_filter.students(self)
+
+    def grade_columns(self, subjects):
+        """GradeColumns view of the named subjects and every student's average"""
+        return self._grade_columns(tuple(subjects))  # A tuple, so the report cache can key on it
+
+    @cached_report("all")
+    def _grade_columns(self, subjects):
+        """grade_columns for a tuple of subjects, built from summary_rows"""
+        columns = {subject: bytearray() for subject in subjects}
+        names = []
+        for name, grades in self.summary_rows(subjects):
+            names.append(name)
+            for column, grade in zip(columns.values(), grades):
+                column.append(MISSING_GRADE if grade is None else grade)
+        averages = [student.calculate_average() for student in self.students.values()]
+        return GradeColumns(names, {subject: bytes(column) for subject, column in columns.items()}, averages)
+
+    def snapshot(self):
+        """Read-only view of the gradebook as it is now (see GradebookVersions)
+
+        The first call starts versioning, so make it before other threads
+        start changing the gradebook"""
+        if self.versions is None:
+            GradebookVersions(self)
+        return self.versions.current
+
     def get_all_students(self):
         """Get all student objects"""
         return list(self.students.values())
 
+    @cached_report("all")
     def sort_students_by_average(self, descending=True):
         """Sort students by their average grade"""
-        sorted_students = sorted(
-            self.students.values(),
-            key=lambda student: student.calculate_average(),
-            reverse=descending
-        )
-        return sorted_students
+        return sort_by_key(self.students.values(), lambda student: student.calculate_average(), descending)
+
+    def _ranking(self):
+        """The StudentRanking, built on the first call"""
+        if self.rank_index is None:
+            self.rank_index = StudentRanking(self)
+        return self.rank_index
+
+    def rank_of(self, name, descending=True):
+        """Place of a student (from 1) in sort_students_by_average(descending), in O(log n)
+
+        Raises KeyError for a student who is not in the gradebook"""
+        return self._ranking().rank_of(name, descending)
 
+    def student_at_rank(self, rank, descending=True):
+        """Student at a place (from 1) of sort_students_by_average(descending), in O(log n)"""
+        return self.students[self._ranking().name_at(rank, descending)]
+
+    def students_ranked(self, first, last, descending=True):
+        """Students at places first to last (inclusive) of sort_students_by_average(descending)"""
+        students = self.students
+        return [students[name] for name in self._ranking().names(first, last, descending)]
+
+    @cached_report("subject")
     def sort_students_by_subject(self, subject, descending=True):
-        """Sort students by grade in a specific subject"""
+        """Sort students by grade in a specific subject
 
-        def subject_grade(student):
-            grade = student.get_grade(subject)
-            return grade if grade is not None else -1  # Students without grade go last
+        The keys are whole grades, so sort_by_key ranks them with a counting
+        sort in one pass"""
+        subject_id = self.subject_names.ids.get(subject)
+
+        def grade(student):
+            position = student._layout.positions.get(subject_id)
+            return -1 if position is None else student._grades[position]  # No grade ranks below 0
+
+        return sort_by_key(self.students.values(), grade, descending)
+
+    def _graded(self, subject, descending):
+        """Students with a grade in subject, sorted by it; ties stay in insertion order"""
+        graded = [student for student in self.students.values() if student.has_subject(subject)]
+        return sort_by_key(graded, lambda student: student.get_grade(subject), descending)
+
+    def top_students(self, subject, count):
+        """Get the count students with the highest grades in a subject"""
+        return self._graded(subject, True)[:count]
+
+    def bottom_students(self, subject, count):
+        """Get the count students with the lowest grades in a subject"""
+        return self._graded(subject, False)[:count]
 
-        sorted_students = sorted(
-            self.students.values(),
-            key=subject_grade,
-            reverse=descending
-        )
-        return sorted_students
+    def subject_distribution(self, subject):
+        """GradeHistogram of a subject's grades (empty if it has none)
+
+        Gives the median, percentiles, standard deviation and percentile ranks"""
+        histogram = self.subject_histograms.get(subject)
+        if histogram is None:
+            return GradeHistogram()
+
+        if DEBUG_AGGREGATES:
+            grades = [student.get_grade(subject) for student in self.students.values()
+                      if student.has_subject(subject)]
+            check_aggregate(f"{subject} total", histogram.total, sum(grades))
+            check_aggregate(f"{subject} count", histogram.count, len(grades))
+        return histogram
 
     def subject_stats(self, subject):
         """Get statistics for a specific subject"""
-        grades = []
-        for student in self.students.values():
-            grade = student.get_grade(subject)
-            if grade is not None:
-                grades.append(grade)
-
-        if not grades:
+        histogram = self.subject_distribution(subject)
+        if not histogram:
             return None, None, 0, 0
+        return histogram.highest(), histogram.lowest(), histogram.mean(), histogram.count
 
-        highest = max(grades)
-        lowest = min(grades)
-        average = sum(grades) / len(grades)
-        return highest, lowest, average, len(grades)
+    def percentile_rank(self, name, subject):
+        """Where a student's grade falls in a subject, as a percentile rank from 0 to 100
 
-    def class_average(self):
-        """Calculate overall class average"""
+        None if the student has no grade in the subject"""
+        grade = self.students[name].get_grade(subject)
+        return None if grade is None else self.subject_distribution(subject).percentile_rank(grade)
+
+    def recompute_totals(self):
+        """Sum every grade from scratch; returns (total, count)"""
         total_grade = 0
         total_subjects = 0
 
@@ -144,23 +759,71 @@ class Gradebook:
                 total_grade += grade
                 total_subjects += 1
 
-        if total_subjects == 0:
+        return total_grade, total_subjects
+
+    def class_average(self):
+        """Calculate overall class average"""
+        if DEBUG_AGGREGATES:
+            total_grade, total_subjects = self.recompute_totals()
+            check_aggregate("class total", self.grade_total, total_grade)
+            check_aggregate("class count", self.grade_count, total_subjects)
+
+        if self.grade_count == 0:
             return 0
-        return total_grade / total_subjects
+        return self.grade_total / self.grade_count
+
+    def grade_totals(self):
+        """(sum, number) of every grade in the gradebook"""
+        return self.grade_total, self.grade_count
+
+    def class_report(self, out=None):
+        """Make a class report (written to stdout unless out is given)"""
+        self._write_report("class_report_text", self.class_report_lines, out)
+
+    def _write_report(self, name, lines, out):
+        """Stream lines() to out, through the report cache when there is one
+
+        A cached copy of the text made by the method called name is written
+        in one piece. On a miss the lines are still written as they are made,
+        and kept in the cache for next time."""
+        cache = self.report_cache
+        if cache is None:
+            write_lines(lines(), out)
+            return
+        key = report_key(self, "all", name)
+        text = cache.lookup(key)
+        if text is not _NOT_CACHED:
+            (out or sys.stdout).write(text)
+            return
+        kept = []
 
-    def class_report(self):
-        """Make a class report"""
+        def keep(line):
+            kept.append(line)
+            return line
+
+        write_lines(map(keep, lines()), out)
+        cache.put(key, "".join(kept))
+
+    @cached_report("all")
+    def class_report_text(self):
+        return "".join(self.class_report_lines())
+
+    def class_report_lines(self):
+        """Yield the class report as text lines, one student at a time"""
         if not self.students:
-            print("No students in the system")
+            yield "No students in the system\n"
             return
 
-        print("\n~~~ Class Report ~~~")
-        print(f"Total Students: {len(self.students)}")
-        print(f"Subjects: {', '.join(sorted(self.subjects))}")
-        print(f"Overall Class Average: {self.class_average():.2f}\n")
+        yield "\n~~~ Class Report ~~~\n"
+        yield f"Total Students: {len(self.students)}\n"
+        yield f"Subjects: {', '.join(sorted(self.subjects))}\n"
+        yield f"Overall Class Average: {self.class_average():.2f}\n\n"
+        yield from self.students_info_lines()
 
+    def students_info_lines(self):
+        """Yield every student's display_info lines, in insertion order"""
         for student in self.students.values():
-            student.display_info()
+            yield from student.info_lines()
 
     def subject_summary(self):
         """Generate summary for all subjects"""
@@ -170,71 +833,2768 @@ class Gradebook:
 
         print("\n~~~ Subject Summary ~~~")
         for subject in sorted(self.subjects):
-            highest, lowest, average, count = self.subject_stats(subject)
-            print(f"\n{subject}:")
-            if highest is not None:
-                print(f"  Highest Grade: {highest}")
-                print(f"  Lowest Grade: {lowest}")
-                print(f"  Average: {average:.2f}")
-                print(f"  Students with grade: {count}")
-            else:
-                print(f"  No grades recorded")
+            sys.stdout.write(self.subject_summary_text(subject))
+
+    @cached_report("subject")
+    def subject_summary_text(self, subject):
+        """One subject's part of the subject summary"""
+        highest, lowest, average, count = self.subject_stats(subject)
+        if highest is None:
+            return f"\n{subject}:\n  No grades recorded\n"
+        histogram = self.subject_distribution(subject)
+        return (f"\n{subject}:\n"
+                f"  Highest Grade: {highest}\n"
+                f"  Lowest Grade: {lowest}\n"
+                f"  Average: {average:.2f}\n"
+                f"  Median: {histogram.median():.2f}\n"
+                f"  Standard Deviation: {histogram.stdev():.2f}\n"
+                f"  Students with grade: {count}\n")
+
+    @cached_report("student")
+    def student_info_text(self, name):
+        """A student's grades and average as display_info shows them"""
+        return "".join(self.students[name].info_lines())
+
+    def summary_table(self, out=None):
+        """Generate a summary table (written to stdout unless out is given)"""
+        self._write_report("summary_table_text", self.summary_table_lines, out)
+
+    @cached_report("all")
+    def summary_table_text(self):
+        return "".join(self.summary_table_lines())
+
+    def summary_rows(self, subjects):
+        """Yield (name, [grade or None for each subject]) for every student"""
+        for student in self.students.values():
+            yield student.name, [student.get_grade(subject) for subject in subjects]
 
-    def summary_table(self):
-        """Generate a summary table"""
+    def summary_table_lines(self):
+        """Yield the summary table as text lines, one student at a time"""
         if not self.students:
-            print("No students in the system")
+            yield "No students in the system\n"
             return
 
-        print("\n~~~ Student Summary Table ~~~")
+        yield "\n~~~ Student Summary Table ~~~\n"
 
-        # Header
-        header = f"{'Name':<15}"
-        for subject in sorted(self.subjects):
-            header += f"{subject:<12}"
-        header += "Average"
-        print(header)
-        print("-" * len(header))
+        # Column order and formats are worked out once for the whole table
+        subjects = sorted(self.subjects)
+        header = f"{'Name':<15}" + "".join(f"{subject:<12}" for subject in subjects) + "Average"
+        yield header + "\n"
+        yield "-" * len(header) + "\n"
 
         # Student rows
+        yield from format_summary_rows(self.summary_rows(subjects), len(subjects))
+
+
+MISSING_GRADE = 255  # Byte stored in a columnar cell that has no grade
+
+# bytes.translate tables used by the columnar reductions
+_MISSING_AS_ZERO = bytes(range(255)) + b"\x00"  # max() ignores missing cells
+_MISSING_FIRST = bytes([g + 1 if g <= 100 else 0 for g in range(256)])  # Missing sorts below 0
+
+
+class StudentRow(Student):
+    """Thin view of one student's row in a ColumnarGradebook
+
+    Has the same API as Student, but reads and writes the gradebook's columns"""
+
+    __slots__ = ()
+
+    def __init__(self, gradebook, name):
+        self.gradebook = gradebook
+        self.name = name
+
+    @property
+    def grades(self):
+        """Read-only {subject: grade} copy of the subjects this student has a grade in"""
+        return MappingProxyType(self.gradebook.row_grades(self.name))
+
+    def add_grade(self, subject, grade):
+        """Add or update a grade for a subject"""
+        self.gradebook.set_grade(self.name, subject, grade)
+
+    def remove_grade(self, subject):
+        """Remove a grade for a specific subject"""
+        return self.gradebook.clear_grade(self.name, subject)
+
+    def calculate_average(self):
+        """Calculate the student's average grade"""
+        return self.gradebook.row_average(self.name)
+
+    def get_grade(self, subject):
+        """Get grade for a specific subject"""
+        return self.gradebook.cell(self.name, subject)
+
+    def has_subject(self, subject):
+        """Check if student has a grade for the given subject"""
+        return self.get_grade(subject) is not None
+
+
+class ColumnarGradebook(Gradebook):
+    """Gradebook that keeps grades in a dense student x subject matrix
+
+    Each subject is a bytearray column with one byte per student row and
+    MISSING_GRADE where the student has no grade. Aggregates and sorts run
+    as whole-column bytes operations instead of loops over Student objects.
+    self.students still maps names to StudentRow views, so GradebookManager
+    works unchanged."""
+
+    def __init__(self):
+        super().__init__()
+        self._names = []  # row position -> name
+        self._rows = {}  # name -> row position
+        self._columns = {}  # subject -> bytearray column
+        self._row_totals = array("l")  # Running sum of each row's grades
+        self._row_counts = array("l")  # Running number of grades in each row
+
+    def _column(self, subject):
+        """Get the column for a subject, creating an empty one if needed"""
+        column = self._columns.get(subject)
+        if column is None:
+            column = bytearray([MISSING_GRADE]) * len(self._names)
+            self._columns[subject] = column
+        return column
+
+    def add_subject(self, subject):
+        """Add a subject to the gradebook"""
+        super().add_subject(subject)
+        self._column(subject)
+
+    def add_student(self, name):
+        """Add a new student to the gradebook"""
+        if name in self._rows:
+            return False  # Student already exists
+        self._rows[name] = len(self._names)
+        self._names.append(name)
+        self._row_totals.append(0)
+        self._row_counts.append(0)
+        for column in self._columns.values():
+            column.append(MISSING_GRADE)
+        self.students[name] = StudentRow(self, name)
+        self._track_student(name)
+        return True
+
+    def remove_student(self, name):
+        """Remove a student from the gradebook"""
+        if name not in self._rows:
+            return False
+        grades = self.row_grades(name)
+        row = self._rows.pop(name)
+        for column in self._columns.values():
+            del column[row]
+        del self._names[row]
+        del self._row_totals[row]
+        del self._row_counts[row]
+        del self.students[name]
+        # Rows after the removed one moved up by one
+        for position in range(row, len(self._names)):
+            self._rows[self._names[position]] = position
+        self._untrack_student(name, grades)
+        return True
+
+    def set_grade(self, name, subject, grade):
+        """Store a grade in the student's row"""
+        if not isinstance(grade, int) or not 0 <= grade <= 100:
+            raise ValueError("Grade must be an integer from 0 to 100")
+        old_grade = self._store_grade(name, subject, grade)
+        self.grade_changed(self.students[name], subject, old_grade, grade)
+
+    def _store_grades(self, names, subjects, grades):
+        """Write validated batch columns straight into the matrix
+
+        Returns (name, subject, old grade or None, new grade) for each row"""
+        rows = self._rows
+        columns = {subject: self._column(subject) for subject in set(subjects)}
+        row_totals = self._row_totals
+        row_counts = self._row_counts
+        changes = []
+        for name, subject, grade in zip(names, subjects, grades):
+            row = rows[name]
+            column = columns[subject]
+            old_grade = column[row]
+            column[row] = grade
+            if old_grade == MISSING_GRADE:
+                row_counts[row] += 1
+                row_totals[row] += grade
+                old_grade = None
+            else:
+                row_totals[row] += grade - old_grade
+            changes.append((name, subject, old_grade, grade))
+        return changes
+
+    def _store_grade(self, name, subject, grade):
+        """Write a validated grade into the columns; returns the old grade"""
+        column = self._column(subject)
+        row = self._rows[name]
+        old_grade = column[row]
+        column[row] = grade
+        if old_grade == MISSING_GRADE:
+            self._row_totals[row] += grade
+            self._row_counts[row] += 1
+            return None
+        self._row_totals[row] += grade - old_grade
+        return old_grade
+
+    def clear_grade(self, name, subject):
+        """Remove a grade from the student's row"""
+        column = self._columns.get(subject)
+        row = self._rows[name]
+        if column is None or column[row] == MISSING_GRADE:
+            return False
+        old_grade = column[row]
+        column[row] = MISSING_GRADE
+        self._row_totals[row] -= old_grade
+        self._row_counts[row] -= 1
+        self.grade_changed(self.students[name], subject, old_grade, None)
+        return True
+
+    def cell(self, name, subject):
+        """Get one grade, or None if the student has no grade for the subject"""
+        column = self._columns.get(subject)
+        if column is None:
+            return None
+        grade = column[self._rows[name]]
+        return None if grade == MISSING_GRADE else grade
+
+    def row_grades(self, name):
+        """Get a student's grades as a {subject: grade} dictionary"""
+        row = self._rows[name]
+        return {subject: column[row] for subject, column in self._columns.items()
+                if column[row] != MISSING_GRADE}
+
+    def row_average(self, name):
+        """Calculate one student's average grade"""
+        row = self._rows[name]
+        if DEBUG_AGGREGATES:
+            check_aggregate(f"{name} total", self._row_totals[row], sum(self.row_grades(name).values()))
+        count = self._row_counts[row]
+        return self._row_totals[row] / count if count else 0
+
+    def _row_averages(self):
+        """Average of every row, in row order, from the running row totals"""
+        return [total / count if count else 0
+                for total, count in zip(self._row_totals, self._row_counts)]
+
+    def update_student_grade(self, name, subject, grade):
+        """Update or add a grade for a student"""
+        if name not in self._rows:
+            return False
+        self.set_grade(name, subject, grade)
+        return True
+
+    @cached_report("all")
+    def _grade_columns(self, subjects):
+        """grade_columns straight from the columns and running row totals"""
+        empty = bytes([MISSING_GRADE]) * len(self._names)
+        return GradeColumns(list(self._names), {subject: bytes(self._columns.get(subject, empty)) for subject in subjects},
+                            self._row_averages())
+
+    @cached_report("all")
+    def sort_students_by_average(self, descending=True):
+        """Sort students by their average grade"""
+        averages = self._row_averages()
+        order = sorted(range(len(averages)), key=averages.__getitem__, reverse=descending)
+        return [self.students[self._names[row]] for row in order]
+
+    @cached_report("subject")
+    def sort_students_by_subject(self, subject, descending=True):
+        """Sort students by grade in a specific subject"""
+        column = self._columns.get(subject)
+        if column is None:
+            return self.get_all_students()
+        keys = column.translate(_MISSING_FIRST)  # Students without grade go last
+        students = self.students
+        return counting_sort([students[name] for name in self._names], keys, descending)
+
+    def top_students(self, subject, count):
+        """Get the count students with the highest grades in a subject"""
+        column = self._columns.get(subject)
+        graded = len(column) - column.count(MISSING_GRADE) if column is not None else 0
+        return self.sort_students_by_subject(subject, descending=True)[:min(count, graded)]
+
+    def bottom_students(self, subject, count):
+        """Get the count students with the lowest grades in a subject"""
+        column = self._columns.get(subject)
+        if column is None:
+            return []
+        missing = column.count(MISSING_GRADE)
+        return self.sort_students_by_subject(subject, descending=False)[missing:missing + count]
+
+    def recompute_totals(self):
+        """Sum every grade from scratch; returns (total, count)"""
+        total_grade = 0
+        total_subjects = 0
+
+        for column in self._columns.values():
+            missing = column.count(MISSING_GRADE)
+            total_grade += sum(column) - missing * MISSING_GRADE
+            total_subjects += len(column) - missing
+
+        return total_grade, total_subjects
+
+    def summary_rows(self, subjects):
+        """Yield (name, [grade or None for each subject]), read straight from the columns"""
+        columns = [self._columns[subject] for subject in subjects]
+        if not columns:
+            for name in self._names:
+                yield name, []
+            return
+        for name, grades in zip(self._names, zip(*columns)):
+            yield name, [None if grade == MISSING_GRADE else grade for grade in grades]
+
+
+class SqliteStudents(Mapping):
+    """{name: StudentRow} view of the students in a SqliteGradebook, in insertion order"""
+
+    def __init__(self, gradebook):
+        self.gradebook = gradebook
+
+    def __len__(self):
+        return len(self.gradebook._order)
+
+    def __iter__(self):
+        return iter(self.gradebook._order)
+
+    def __contains__(self, name):
+        return name in self.gradebook._order
+
+    def __getitem__(self, name):
+        if name not in self.gradebook._order:
+            raise KeyError(name)
+        return StudentRow(self.gradebook, name)
+
+    def values(self):
+        return [StudentRow(self.gradebook, name) for name in self.gradebook._order]
+
+
+class SqliteGradebook(Gradebook):
+    """Gradebook that keeps students, subjects and grades in a SQLite database
+
+    A drop-in replacement for Gradebook: self.students maps names to
+    StudentRow views that read and write the database. Statistics, sorts
+    and searches are indexed SQL queries, with the aggregates computed by
+    SQLite; triggers keep each student's and the class's grade total and
+    count up to date, so the class average and every average sort read
+    them instead of summing grades. The database runs in WAL mode, each
+    change is its own transaction unless it is inside transaction(), and
+    update_grades writes a whole batch with one executemany() in one
+    transaction. The SQL strings are constants, so sqlite3's statement
+    cache prepares each one only once. Student ids are the insertion
+    numbers in self._order, which is loaded from the database on open.
+    Threads share the one connection: every statement, and every
+    transaction() as a whole, holds self.lock while it uses it."""
+
+    keep_aggregates = False
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS subjects (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE,
+            listed INTEGER NOT NULL DEFAULT 0  -- 1 once added to the gradebook with add_subject
+        );
+        CREATE TABLE IF NOT EXISTS students (
+            id INTEGER PRIMARY KEY,  -- Insertion number
+            name TEXT NOT NULL UNIQUE,
+            grade_total INTEGER NOT NULL DEFAULT 0,
+            grade_count INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS grades (
+            student_id INTEGER NOT NULL REFERENCES students (id) ON DELETE CASCADE,
+            subject_id INTEGER NOT NULL REFERENCES subjects (id),
+            grade INTEGER NOT NULL CHECK (grade BETWEEN 0 AND 100),
+            seq INTEGER NOT NULL,  -- Order the student first got a grade in the subject
+            PRIMARY KEY (student_id, subject_id)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS totals (grade_total INTEGER NOT NULL, grade_count INTEGER NOT NULL);
+        INSERT INTO totals SELECT 0, 0 WHERE NOT EXISTS (SELECT 1 FROM totals);
+
+        CREATE INDEX IF NOT EXISTS grades_by_subject ON grades (subject_id, grade, student_id);
+        CREATE INDEX IF NOT EXISTS students_by_average
+            ON students ((CASE WHEN grade_count THEN grade_total * 1.0 / grade_count ELSE 0 END), id);
+
+        CREATE TRIGGER IF NOT EXISTS grade_added AFTER INSERT ON grades BEGIN
+            UPDATE students SET grade_total = grade_total + NEW.grade, grade_count = grade_count + 1
+                WHERE id = NEW.student_id;
+            UPDATE totals SET grade_total = grade_total + NEW.grade, grade_count = grade_count + 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS grade_changed AFTER UPDATE OF grade ON grades BEGIN
+            UPDATE students SET grade_total = grade_total + NEW.grade - OLD.grade WHERE id = NEW.student_id;
+            UPDATE totals SET grade_total = grade_total + NEW.grade - OLD.grade;
+        END;
+        CREATE TRIGGER IF NOT EXISTS grade_removed AFTER DELETE ON grades BEGIN
+            UPDATE students SET grade_total = grade_total - OLD.grade, grade_count = grade_count - 1
+                WHERE id = OLD.student_id;
+            UPDATE totals SET grade_total = grade_total - OLD.grade, grade_count = grade_count - 1;
+        END;
+    """
+
+    AVERAGE = "(CASE WHEN grade_count THEN grade_total * 1.0 / grade_count ELSE 0 END)"
+    SET_GRADE = ("INSERT INTO grades (student_id, subject_id, grade, seq) VALUES (?, ?, ?, ?) "
+                 "ON CONFLICT (student_id, subject_id) DO UPDATE SET grade = excluded.grade")
+    GET_GRADE = "SELECT grade FROM grades WHERE student_id = ? AND subject_id = ?"
+    ROW_GRADES = ("SELECT subjects.name, grade FROM grades JOIN subjects ON subjects.id = subject_id "
+                  "WHERE student_id = ? ORDER BY seq")
+
+    def __init__(self, path=":memory:"):
+        super().__init__()
+        self.path = path
+        # Autocommit mode: transaction() issues BEGIN/COMMIT itself
+        self.connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False,
+                                          cached_statements=256)
+        self.lock = threading.RLock()  # Held while a thread uses the shared connection
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")  # WAL stays consistent; fsync on checkpoint
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript(self.SCHEMA)
+        self._transaction_depth = 0
+
+        self.students = SqliteStudents(self)
+        self._load()
+
+    def _load(self):
+        """Read the subjects, the students' insertion numbers and the next seq from the database"""
+        self.subjects.clear()
+        self._subject_ids = {}  # Every subject name in the database -> id
+        for subject_id, subject, listed in self._fetchall("SELECT id, name, listed FROM subjects"):
+            self._subject_ids[subject] = subject_id
+            if listed:
+                self.subjects.add(subject)
+        self._order = {}
+        self.student_versions = {}
+        for student_id, name in self._fetchall("SELECT id, name FROM students ORDER BY id"):
+            self._order[name] = student_id
+            self.student_versions[name] = self.change_version
+        self._next_order = max(self._order.values(), default=-1) + 1
+        self._next_seq = self._fetchone("SELECT COALESCE(MAX(seq), -1) + 1 FROM grades")[0]
+
+    def _resync(self):
+        """Bring everything kept in memory back in line with the database after a rollback
+
+        Every version counter moves, so no cached report survives, and the
+        rank index, the published snapshot and the journal are rebuilt from
+        what the database now holds"""
+        self.change_version += 1
+        self.roster_version = self.change_version
+        self._load()
+        self.subject_versions = dict.fromkeys(self._subject_ids, self.change_version)
+        self.rank_index = None
+        if self.versions is not None:
+            GradebookVersions(self)
+        if self.journal is not None:
+            self.journal.compact()
+
+    def _execute(self, sql, parameters=()):
+        with self.lock:
+            return self.connection.execute(sql, parameters)
+
+    def _fetchone(self, sql, parameters=()):
+        with self.lock:
+            return self.connection.execute(sql, parameters).fetchone()
+
+    def _fetchall(self, sql, parameters=()):
+        with self.lock:
+            return self.connection.execute(sql, parameters).fetchall()
+
+    def _stream(self, sql, parameters=(), block_size=1000):
+        """Yield the rows of a query, fetching a block at a time under the lock"""
+        with self.lock:
+            cursor = self.connection.execute(sql, parameters)
+        while True:
+            with self.lock:
+                rows = cursor.fetchmany(block_size)
+            if not rows:
+                return
+            yield from rows
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Group the changes made inside the with block into one transaction
+
+        Other threads wait for the connection until it ends. A nested block
+        is a savepoint. If a block raises, what it wrote is rolled back and
+        the in-memory bookkeeping is reloaded (see _resync) before the error
+        is passed on"""
+        with self.lock:
+            depth = self._transaction_depth
+            self.connection.execute("BEGIN" if depth == 0 else f"SAVEPOINT nested_{depth}")
+            self._transaction_depth += 1
+            try:
+                yield self
+            except BaseException:
+                self.connection.execute("ROLLBACK" if depth == 0 else f"ROLLBACK TO nested_{depth}")
+                if depth:
+                    self.connection.execute(f"RELEASE nested_{depth}")
+                self._resync()
+                raise
+            else:
+                self.connection.execute("COMMIT" if depth == 0 else f"RELEASE nested_{depth}")
+            finally:
+                self._transaction_depth = depth
+
+    def _subject_id(self, subject):
+        """Id of a subject name, adding it to the subjects table if needed"""
+        subject_id = self._subject_ids.get(subject)
+        if subject_id is None:
+            subject_id = self._execute("INSERT INTO subjects (name) VALUES (?)", (subject,)).lastrowid
+            self._subject_ids[subject] = subject_id
+        return subject_id
+
+    def add_subject(self, subject):
+        """Add a subject to the gradebook"""
+        if subject in self.subjects:
+            return
+        with self.transaction():
+            self._execute("UPDATE subjects SET listed = 1 WHERE id = ?", (self._subject_id(subject),))
+            super().add_subject(subject)
+
+    def add_student(self, name):
+        """Add a new student to the gradebook"""
+        with self.transaction():
+            if name in self._order:
+                return False  # Student already exists
+            self._execute("INSERT INTO students (id, name) VALUES (?, ?)", (self._next_order, name))
+            self._track_student(name)
+        return True
+
+    def remove_student(self, name):
+        """Remove a student from the gradebook"""
+        with self.transaction():
+            if name not in self._order:
+                return False
+            grades = self.row_grades(name)
+            self._execute("DELETE FROM students WHERE id = ?", (self._order[name],))  # Grades cascade
+            self._untrack_student(name, grades)
+        return True
+
+    def search_student(self, name):
+        """Search for a student with an indexed lookup on the name"""
+        row = self._fetchone("SELECT name FROM students WHERE name = ?", (name,))
+        return None if row is None else StudentRow(self, row[0])
+
+    get_student = search_student
+
+    def update_student_grade(self, name, subject, grade):
+        """Update or add a grade for a student"""
+        if name not in self._order:
+            return False
+        self.set_grade(name, subject, grade)
+        return True
+
+    def set_grade(self, name, subject, grade):
+        """Store a grade in the database"""
+        if not isinstance(grade, int) or not 0 <= grade <= 100:
+            raise ValueError("Grade must be an integer from 0 to 100")
+        with self.transaction():
+            old_grade = self._store_grade(name, subject, grade)
+            self.grade_changed(StudentRow(self, name), subject, old_grade, grade)
+
+    def _store_grade(self, name, subject, grade):
+        """Write a validated grade; returns the old grade"""
+        key = (self._order[name], self._subject_id(subject))
+        row = self._fetchone(self.GET_GRADE, key)
+        self._execute(self.SET_GRADE, (*key, grade, self._next_seq))
+        self._next_seq += 1
+        return None if row is None else row[0]
+
+    def update_grades(self, updates):
+        """Apply many grade updates as one all-or-nothing batch (see Gradebook.update_grades)
+
+        The rows and the bookkeeping that follows them share one transaction"""
+        with self.transaction():
+            return super().update_grades(updates)
+
+    def _store_grades(self, names, subjects, grades):
+        """Write validated batch columns with one executemany() in one transaction
+
+        The old grades are not looked up, since nothing here keeps totals of
+        its own; they are reported as None"""
+        order = self._order
+        with self.transaction():
+            subject_ids = {subject: self._subject_id(subject) for subject in set(subjects)}
+            first_seq = self._next_seq
+            self._next_seq += len(names)
+            self.connection.executemany(self.SET_GRADE, zip(map(order.__getitem__, names),
+                                                            map(subject_ids.__getitem__, subjects),
+                                                            grades, itertools.count(first_seq)))
+        return [(name, subject, None, grade) for name, subject, grade in zip(names, subjects, grades)]
+
+    def clear_grade(self, name, subject):
+        """Remove a grade from the database"""
+        subject_id = self._subject_ids.get(subject)
+        if subject_id is None:
+            return False
+        key = (self._order[name], subject_id)
+        with self.transaction():
+            row = self._fetchone(self.GET_GRADE, key)
+            if row is None:
+                return False
+            self._execute("DELETE FROM grades WHERE student_id = ? AND subject_id = ?", key)
+            self.grade_changed(StudentRow(self, name), subject, row[0], None)
+        return True
+
+    def cell(self, name, subject):
+        """Get one grade, or None if the student has no grade for the subject"""
+        subject_id = self._subject_ids.get(subject)
+        if subject_id is None:
+            return None
+        row = self._fetchone(self.GET_GRADE, (self._order[name], subject_id))
+        return None if row is None else row[0]
+
+    def row_grades(self, name):
+        """Get a student's grades as a {subject: grade} dictionary"""
+        return dict(self._fetchall(self.ROW_GRADES, (self._order[name],)))
+
+    def row_average(self, name):
+        """Calculate one student's average grade from the trigger-kept totals"""
+        total, count = self._fetchone("SELECT grade_total, grade_count FROM students WHERE id = ?",
+                                      (self._order[name],))
+        return total / count if count else 0
+
+    def grade_totals(self):
+        """(sum, number) of every grade, from the trigger-kept totals row"""
+        return self._fetchone("SELECT grade_total, grade_count FROM totals")
+
+    def class_average(self):
+        """Calculate overall class average"""
+        total, count = self.grade_totals()
+        if DEBUG_AGGREGATES:
+            total_grade, total_subjects = self.recompute_totals()
+            check_aggregate("class total", total, total_grade)
+            check_aggregate("class count", count, total_subjects)
+        return total / count if count else 0
+
+    def recompute_totals(self):
+        """Sum every grade from scratch; returns (total, count)"""
+        total, count = self._fetchone("SELECT SUM(grade), COUNT(*) FROM grades")
+        return total or 0, count
+
+    def subject_stats(self, subject):
+        """Get statistics for a specific subject with one indexed aggregate query"""
+        subject_id = self._subject_ids.get(subject)
+        if subject_id is None:
+            return None, None, 0, 0
+        highest, lowest, total, count = self._fetchone(
+            "SELECT MAX(grade), MIN(grade), SUM(grade), COUNT(*) FROM grades WHERE subject_id = ?", (subject_id,))
+        return (highest, lowest, total / count, count) if count else (None, None, 0, 0)
+
+    def subject_distribution(self, subject):
+        """GradeHistogram of a subject's grades, counted by a GROUP BY on the subject index"""
+        histogram = GradeHistogram()
+        subject_id = self._subject_ids.get(subject)
+        if subject_id is not None:
+            for grade, count in self._fetchall(
+                    "SELECT grade, COUNT(*) FROM grades WHERE subject_id = ? GROUP BY grade", (subject_id,)):
+                histogram.counts[grade] = count
+                histogram.count += count
+                histogram.total += grade * count
+                histogram.total_squares += grade * grade * count
+        return histogram
+
+    def _rows(self, sql, parameters=()):
+        return [StudentRow(self, name) for name, in self._fetchall(sql, parameters)]
+
+    @cached_report("all")
+    def sort_students_by_average(self, descending=True):
+        """Sort students by their average grade, ties in insertion order"""
+        direction = "DESC" if descending else "ASC"
+        return self._rows(f"SELECT name FROM students ORDER BY {self.AVERAGE} {direction}, id")
+
+    @cached_report("subject")
+    def sort_students_by_subject(self, subject, descending=True):
+        """Sort students by grade in a specific subject (no grade ranks below 0)"""
+        direction = "DESC" if descending else "ASC"
+        return self._rows("SELECT name FROM students LEFT JOIN grades ON student_id = id AND subject_id = ? "
+                          f"ORDER BY COALESCE(grade, -1) {direction}, id", (self._subject_ids.get(subject),))
+
+    def _ranked(self, subject, count, direction):
+        return self._rows("SELECT name FROM grades JOIN students ON id = student_id WHERE subject_id = ? "
+                          f"ORDER BY grade {direction}, student_id LIMIT ?", (self._subject_ids.get(subject), count))
+
+    def top_students(self, subject, count):
+        """Get the count students with the highest grades in a subject"""
+        return self._ranked(subject, count, "DESC")
+
+    def bottom_students(self, subject, count):
+        """Get the count students with the lowest grades in a subject"""
+        return self._ranked(subject, count, "ASC")
+
+    def students_info_lines(self):
+        """Yield every student's display_info lines from one query over all grades"""
+        rows = self._stream(
+            "SELECT students.id, students.name, grade_total, grade_count, subjects.name, grade FROM students "
+            "LEFT JOIN grades ON student_id = students.id LEFT JOIN subjects ON subjects.id = subject_id "
+            "ORDER BY students.id, seq")
+        for (_, name, total, count), student_rows in itertools.groupby(rows, key=lambda row: row[:4]):
+            grades = {subject: grade for *_, subject, grade in student_rows if subject is not None}
+            yield from student_info_lines(name, grades, total / count if count else 0)
+
+    @cached_report("all")
+    def _grade_columns(self, subjects):
+        """grade_columns built from one pivot query that also reads the averages"""
+        pivot = "".join(f", MAX(CASE WHEN subject_id = ? THEN grade END)" for _ in subjects)
+        rows = self._fetchall(
+            f"SELECT name, {self.AVERAGE}{pivot} FROM students LEFT JOIN grades ON student_id = id "
+            "GROUP BY id ORDER BY id", [self._subject_ids.get(subject) for subject in subjects])
+        columns = {subject: bytes(MISSING_GRADE if row[2 + i] is None else row[2 + i] for row in rows)
+                   for i, subject in enumerate(subjects)}
+        return GradeColumns([row[0] for row in rows], columns, [row[1] for row in rows])
+
+    def summary_rows(self, subjects):
+        """Yield (name, [grade or None for each subject]), pivoted by SQLite in one query"""
+        columns = "".join(f", MAX(CASE WHEN subject_id = ? THEN grade END)" for _ in subjects)
+        rows = self._stream(
+            f"SELECT name{columns} FROM students LEFT JOIN grades ON student_id = id GROUP BY id ORDER BY id",
+            [self._subject_ids.get(subject) for subject in subjects])
+        for name, *grades in rows:
+            yield name, grades
+
+
+class GradeColumns:
+    """Columnar view of a gradebook for filtering
+
+    names lists the students in insertion order, columns maps each subject
+    to bytes with one grade per student (MISSING_GRADE for none) and
+    averages holds each student's average in the same order"""
+
+    def __init__(self, names, columns, averages):
+        self.names = names
+        self.columns = columns
+        self.averages = averages
+
+    def __len__(self):
+        return len(self.names)
+
+
+class GradeFilter:
+    """A compiled filter expression over grades, such as  Math < 50 and average > 70
+
+    Grammar (keywords are case-insensitive):
+        expression  = term ("or" term)*
+        term        = factor ("and" factor)*
+        factor      = "not" factor | "(" expression ")" | comparison
+        comparison  = operand ("<" | "<=" | ">" | ">=" | "=" | "==" | "!=") number
+        operand     = "average" | subject name, in quotes if it has digits or symbols
+
+    A comparison on a subject is false for students without a grade in it.
+    Each comparison becomes a mask with one byte per student: grades go
+    through a 256-entry bytes.translate table over the whole column at once,
+    and averages through a single map() of the number's comparison method.
+    Masks are held as ints, so and, or and not are one &, | or ^ each."""
+
+    TOKEN = re.compile(r"""\s*(?:(?P<number>\d+(?:\.\d+)?)|(?P<op><=|>=|==|!=|<|>|=)|(?P<paren>[()])"""
+                       r"""|(?P<quoted>"[^"]*"|'[^']*')|(?P<word>[A-Za-z_]\w*))""")
+    KEYWORDS = ("and", "or", "not")
+
+    # Operator -> (test of a grade against the number, method of the number that tests an average)
+    OPERATORS = {
+        "<": (lambda grade, number: grade < number, "__gt__"),
+        "<=": (lambda grade, number: grade <= number, "__ge__"),
+        ">": (lambda grade, number: grade > number, "__lt__"),
+        ">=": (lambda grade, number: grade >= number, "__le__"),
+        "=": (lambda grade, number: grade == number, "__eq__"),
+        "==": (lambda grade, number: grade == number, "__eq__"),
+        "!=": (lambda grade, number: grade != number, "__ne__"),
+    }
+
+    def __init__(self, text):
+        self.text = text
+        self.subjects = []  # Subjects the expression reads, in order of appearance
+        self._tokens = self._tokenize(text)
+        self._position = 0
+        self._evaluate = self._expression()  # Function of (GradeColumns, all-ones mask) -> mask
+        if self._position < len(self._tokens):
+            raise ValueError(f"Unexpected {self._tokens[self._position][1]!r} in filter")
+
+    def _tokenize(self, text):
+        tokens = []
+        position = 0
+        text = text.rstrip()
+        while position < len(text):
+            match = self.TOKEN.match(text, position)
+            if match is None or match.end() == position:
+                raise ValueError(f"Cannot read the filter from {text[position:].strip()!r}")
+            kind = match.lastgroup
+            value = match.group(kind)
+            if kind == "word" and value.lower() in self.KEYWORDS:
+                kind, value = "keyword", value.lower()
+            elif kind == "quoted":
+                value = value[1:-1]
+            tokens.append((kind, value))
+            position = match.end()
+        return tokens
+
+    def _peek(self):
+        return self._tokens[self._position] if self._position < len(self._tokens) else (None, None)
+
+    def _take(self, kind, value=None):
+        token = self._peek()
+        if token[0] != kind or (value is not None and token[1] != value):
+            found = "the end" if token[0] is None else repr(token[1])
+            raise ValueError(f"Expected {value or kind} in filter but found {found}")
+        self._position += 1
+        return token[1]
+
+    def _expression(self):
+        parts = [self._term()]
+        while self._peek() == ("keyword", "or"):
+            self._position += 1
+            parts.append(self._term())
+        if len(parts) == 1:
+            return parts[0]
+        return lambda view, ones: functools.reduce(operator.or_, (part(view, ones) for part in parts))
+
+    def _term(self):
+        parts = [self._factor()]
+        while self._peek() == ("keyword", "and"):
+            self._position += 1
+            parts.append(self._factor())
+        if len(parts) == 1:
+            return parts[0]
+        return lambda view, ones: functools.reduce(operator.and_, (part(view, ones) for part in parts))
+
+    def _factor(self):
+        kind, value = self._peek()
+        if (kind, value) == ("keyword", "not"):
+            self._position += 1
+            inner = self._factor()
+            return lambda view, ones: inner(view, ones) ^ ones
+        if (kind, value) == ("paren", "("):
+            self._position += 1
+            inner = self._expression()
+            self._take("paren", ")")
+            return inner
+        return self._comparison()
+
+    def _comparison(self):
+        kind, value = self._peek()
+        if kind == "quoted":
+            self._position += 1
+            operand = value
+        else:
+            words = [self._take("word")]
+            while self._peek()[0] == "word":
+                words.append(self._take("word"))
+            operand = " ".join(words)
+        symbol = self._take("op")
+        number = float(self._take("number"))
+        test, method = self.OPERATORS[symbol]
+
+        if kind != "quoted" and operand.lower() in ("average", "avg"):
+            compare = getattr(number, method)  # number.__gt__(average) is average < number, and so on
+            return lambda view, ones: int.from_bytes(bytes(map(compare, view.averages)), "little")
+
+        self.subjects.append(operand)
+        table = bytes(1 if grade <= 100 and test(grade, number) else 0 for grade in range(256))
+        return lambda view, ones: int.from_bytes(view.columns[operand].translate(table), "little")
+
+    def mask(self, view):
+        """bytes with 1 for each student in view that matches and 0 for the rest"""
+        ones = int.from_bytes(b"\x01" * len(view), "little")
+        return self._evaluate(view, ones).to_bytes(len(view), "little")
+
+    def students(self, gradebook):
+        """Lazily yield the gradebook's students that match, in insertion order"""
+        unknown = [subject for subject in self.subjects if subject not in gradebook.subjects]
+        if unknown:
+            raise ValueError(f"Unknown subject in filter: {unknown[0]}")
+        view = gradebook.grade_columns(dict.fromkeys(self.subjects))
+        students = gradebook.students
+        return (students[name] for name in itertools.compress(view.names, self.mask(view)))
+
+
+class StudentVersion(FrozenStudent, Student):
+    """Frozen copy of a student as of one gradebook version"""
+
+    __slots__ = ()
+
+    @classmethod
+    def of(cls, student):
+        """Copy a Student or StudentRow"""
+        if not isinstance(student, StudentRow):
+            return super().of(student)
+        version = cls.__new__(cls)
+        version.name = student.name
+        version.gradebook = None
+        version._layout, version._grades, version.grade_total = student.gradebook.subject_names.empty, b"", 0
+        for subject, grade in student.grades.items():
+            version._store_grade(subject, grade)
+        return version
+
+
+class SnapshotStudents(Mapping):
+    """{name: StudentVersion} view of a snapshot's records, in insertion order"""
+
+    def __init__(self, records):
+        self.records = records
+        self._by_name = None  # Built on the first lookup by name
+
+    def __len__(self):
+        return self.records.count
+
+    def __iter__(self):
+        return (student.name for student in self.records.values())
+
+    def __getitem__(self, name):
+        if self._by_name is None:
+            self._by_name = {student.name: student for student in self.records.values()}
+        return self._by_name[name]
+
+    def values(self):
+        return self.records.values()
+
+
+class SnapshotOrder(Mapping):
+    """{name: insertion number} view of a snapshot's ranking tree"""
+
+    def __init__(self, ranking):
+        self.ranking = ranking
+        self._by_name = None  # Built on the first lookup
+
+    def _index(self):
+        if self._by_name is None:
+            self._by_name = {name: index for (_, index), name in self.ranking.items()}
+        return self._by_name
+
+    def __len__(self):
+        return len(self.ranking)
+
+    def __iter__(self):
+        return iter(self._index())
+
+    def __getitem__(self, name):
+        return self._index()[name]
+
+
+class StudentRanking(AverageRanking):
+    """AverageRanking of a gradebook's students by (-average, insertion number)
+
+    Keeps the order of sort_students_by_average(): highest average first
+    and, for equal averages, insertion order, which is also the order of
+    ties when sorting lowest first. Gradebook builds one on the first rank
+    query and keeps it up to date after every change from then on."""
+
+    def __init__(self, gradebook):
+        order = gradebook._order
+        super().__init__(gradebook, ((order[name], student) for name, student in gradebook.students.items()))
+
+    def update(self, name):
+        """Move a student who was added or whose grades changed to their new place"""
+        self._move(self.gradebook.students[name], self.gradebook._order[name])
+
+    def name_at(self, rank, descending=True):
+        """Name of the student at a place, from 1"""
+        return self.entry_at(rank, descending)[1]
+
+    def names(self, first, last, descending=True):
+        """Names of the students at places first to last (inclusive)"""
+        return [name for _, name in self.entries_between(first, last, descending)]
+
+
+class GradebookSnapshot(ReadOnlySnapshot, Gradebook):
+    """Read-only Gradebook as of one published version (see GradebookVersions)
+
+    Has the same reports, sorts, statistics and searches as the gradebook it
+    was taken from, read from frozen StudentVersion records; the methods
+    that would change it raise TypeError. There are no histograms, so
+    per-subject statistics scan the students."""
+
+    ranking_type = StudentRanking
+
+    # The Gradebook fields a snapshot has no use for, so that making one
+    # does not run Gradebook.__init__
+    subject_histograms = subject_versions = student_versions = MappingProxyType({})
+    report_cache = journal = versions = rank_index = None
+
+    def __init__(self, version, records, ranking, subject_names, subjects, grade_total, grade_count):
+        self.version = version  # Number of snapshots built before this one
+        self.change_version = self.roster_version = version  # Frozen, since a snapshot never changes
+        self.records = records  # PersistentVector of StudentVersion by insertion number
+        self.ranking = ranking  # RankTree of (-average, insertion number) -> name
+        self.students = SnapshotStudents(records)
+        self.subject_names = subject_names  # The live gradebook's, which only ever grows
+        self.subjects = subjects  # frozenset
+        self.grade_total = grade_total
+        self.grade_count = grade_count
+        self._order = SnapshotOrder(ranking)
+
+    add_subject = add_student = remove_student = update_student_grade = update_grades = ReadOnlySnapshot._read_only
+
+    def sort_students_by_average(self, descending=True):
+        """Sort students by their average grade, read in order from the ranking tree"""
+        if not descending:
+            return super().sort_students_by_average(descending)
+        return self.ranked_records()
+
+    def subject_distribution(self, subject):
+        """GradeHistogram of a subject's grades, counted from the students"""
+        histogram = GradeHistogram()
         for student in self.students.values():
-            row = f"{student.name:<15}"
-            total = 0
-            valid_subjects = 0
+            grade = student.get_grade(subject)
+            if grade is not None:
+                histogram.add(grade)
+        return histogram
+
+
+class GradebookVersions(VersionPublisher):
+    """Keeps an immutable GradebookSnapshot of a gradebook up to date as it changes
+
+    Multi-version concurrency control: a change notes which students it
+    touched, and the next read of self.current (or gradebook.snapshot())
+    builds a snapshot whose records share every unchanged student with the
+    previous one. A reader takes that point-in-time view once and can read
+    it for as long as it likes, however many changes are made meanwhile.
+    Writers on several threads must take turns with write_lock; readers
+    only take it to build a snapshot when there are changes since the last."""
+
+    def __init__(self, gradebook):
+        super().__init__(gradebook, [(gradebook._order[name], StudentVersion.of(student))
+                                     for name, student in gradebook.students.items()])
+
+    def _subjects(self):
+        return frozenset(self.gradebook.subjects)
+
+    def _snapshot(self, records, ranking, subjects, grade_total, grade_count):
+        version = 0 if self._current is None else self._current.version + 1
+        return GradebookSnapshot(version, records, ranking, self.gradebook.subject_names, subjects,
+                                 grade_total, grade_count)
+
+    def _version_at(self, index, name):
+        """Frozen copy of the student with that insertion number, or None if it was removed"""
+        gradebook = self.gradebook
+        if gradebook._order.get(name) != index:
+            return None
+        return StudentVersion.of(gradebook.students[name])
+
+    def students_changed(self, names):
+        """Note students that were added or changed"""
+        order = self.gradebook._order
+        for name in names:
+            self._changed[order[name]] = name
+
+    def student_removed(self, name):
+        """Note a student's removal (called before its insertion number is dropped)"""
+        self._changed[self.gradebook._order[name]] = name
+
+
+def stress_snapshots(num_students=2000, num_subjects=5, writers=2, readers=2, seconds=2.0):
+    """Check that snapshot reports stay consistent while other threads write
+
+    Writer threads keep changing grades, sending batches and removing and
+    re-adding students. Reader threads meanwhile take snapshots and render
+    the class report and summary table from them, checking that every
+    report agrees with itself: one row per student, the header's student
+    count and class average match the rows, and rendering the same snapshot
+    again after more writes gives exactly the same text. Returns the number
+    of writes, reports and the list of inconsistencies found (empty when
+    all is well)."""
+    subjects = [f"Subject {i + 1}" for i in range(num_subjects)]
+    names = [f"Student {i + 1}" for i in range(num_students)]
+    gradebook = Gradebook()
+    for subject in subjects:
+        gradebook.add_subject(subject)
+    for name in names:
+        gradebook.add_student(name)
+    gradebook.update_grades([(name, subject, (i * 31 + j * 17) % 101)
+                             for i, name in enumerate(names) for j, subject in enumerate(subjects)])
+    versions = GradebookVersions(gradebook)
+
+    deadline = time.perf_counter() + seconds
+    counts = {"writes": 0, "reports": 0}
+    problems = []
+
+    def write(seed):
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            name = rng.choice(names)
+            with versions.write_lock:
+                action = rng.random()
+                if action < 0.6:
+                    if gradebook.student_exists(name):
+                        gradebook.update_student_grade(name, rng.choice(subjects), rng.randint(0, 100))
+                elif action < 0.8:
+                    batch = [(other, rng.choice(subjects), rng.randint(0, 100))
+                             for other in rng.sample(names, 20) if gradebook.student_exists(other)]
+                    gradebook.update_grades(batch)
+                elif gradebook.remove_student(name):
+                    gradebook.add_student(name)
+                    for subject in rng.sample(subjects, rng.randint(0, num_subjects)):
+                        gradebook.update_student_grade(name, subject, rng.randint(0, 100))
+                counts["writes"] += 1
+
+    def check(snapshot):
+        """Render both reports from one snapshot; returns the text, noting any inconsistency"""
+        report, table = io.StringIO(), io.StringIO()
+        snapshot.class_report(report)
+        snapshot.summary_table(table)
+        lines = report.getvalue().splitlines()
+        rows = table.getvalue().splitlines()[4:]
+        total, count = snapshot.recompute_totals()
+        if lines[2] != f"Total Students: {len(rows)}" or len(rows) != len(snapshot.students):
+            problems.append(f"version {snapshot.version}: {lines[2]!r} but {len(rows)} rows")
+        if (total, count) != (snapshot.grade_total, snapshot.grade_count):
+            problems.append(f"version {snapshot.version}: totals {snapshot.grade_total}/{snapshot.grade_count} "
+                            f"but the students add up to {total}/{count}")
+        return report.getvalue() + table.getvalue()
+
+    def read():
+        last_version = -1
+        while time.perf_counter() < deadline:
+            snapshot = gradebook.snapshot()
+            if snapshot.version < last_version:
+                problems.append(f"version went back from {last_version} to {snapshot.version}")
+            last_version = snapshot.version
+            try:
+                first = check(snapshot)
+                time.sleep(0.001)  # Let the writers move on
+                if check(snapshot) != first:
+                    problems.append(f"version {snapshot.version} changed after it was published")
+            except Exception as error:  # For example a dictionary changing during iteration
+                problems.append(f"version {snapshot.version}: {type(error).__name__}: {error}")
+                return
+            counts["reports"] += 2
+
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-5)  # Switch threads often so reads and writes interleave finely
+    try:
+        threads = [threading.Thread(target=write, args=(seed,)) for seed in range(writers)]
+        threads += [threading.Thread(target=read) for _ in range(readers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+        versions.close()
+
+    live, latest = io.StringIO(), io.StringIO()
+    gradebook.class_report(live)
+    gradebook.summary_table(live)
+    versions.current.class_report(latest)
+    versions.current.summary_table(latest)
+    if live.getvalue() != latest.getvalue():
+        problems.append("the last published version does not match the gradebook")
+
+    print(f"{writers} writers, {readers} readers, {seconds:.1f}s: {counts['writes']} writes, "
+          f"{counts['reports']} reports from {versions.current.version} published versions, "
+          f"{len(problems)} inconsistencies")
+    for problem in problems[:10]:
+        print(f"  {problem}")
+    return counts["writes"], counts["reports"], problems
+
+
+# Binary gradebook file layout (all integers little-endian):
+#   header        magic, version, reserved, student count, subject count,
+#                 then offsets of the subject table, name index, names and matrix
+#   subject table u16 length + UTF-8 bytes per subject
+#   name index    u64 offset into the names block per student, plus the end offset
+#   names         UTF-8 student names, back to back
+#   matrix        one column of uint8 grades per subject, MISSING_GRADE = no grade
+BINARY_MAGIC = b"GRDB"
+BINARY_VERSION = 1
+_BINARY_HEADER = struct.Struct("<4sHHIIQQQQ")
+
+
+def _align(offset):
+    """Round an offset up to a multiple of 8"""
+    return (offset + 7) & ~7
+
+
+def _binary_pieces(gradebook):
+    """Lay a gradebook out in the binary format
+
+    Returns (total size, [(offset, bytes-like), ...]) with the pieces in file order"""
+    names = [student.name.encode("utf-8") for student in gradebook.students.values()]
+    num_students = len(names)
+
+    if isinstance(gradebook, ColumnarGradebook):
+        columns = dict(gradebook._columns)
+    else:
+        columns = {}
+        for row, student in enumerate(gradebook.students.values()):
+            for subject, grade in student.grades.items():
+                if not isinstance(grade, int) or not 0 <= grade <= 100:
+                    raise ValueError(f"{student.name}'s {subject} grade {grade!r} is not an integer from 0 to 100")
+                column = columns.get(subject)
+                if column is None:
+                    column = columns[subject] = bytearray([MISSING_GRADE]) * num_students
+                column[row] = grade
+    subjects = sorted(set(gradebook.subjects) | set(columns))
+
+    subject_table = b"".join(struct.pack("<H", len(subject.encode("utf-8"))) + subject.encode("utf-8")
+                             for subject in subjects)
+    name_offsets = array("Q", [0])
+    for name in names:
+        name_offsets.append(name_offsets[-1] + len(name))
+    if sys.byteorder == "big":
+        name_offsets.byteswap()
+
+    subjects_offset = _BINARY_HEADER.size
+    name_index_offset = _align(subjects_offset + len(subject_table))
+    names_offset = name_index_offset + 8 * (num_students + 1)
+    matrix_offset = _align(names_offset + sum(len(name) for name in names))
+
+    header = _BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, 0, num_students, len(subjects),
+                                 subjects_offset, name_index_offset, names_offset, matrix_offset)
+    pieces = [(0, header), (subjects_offset, subject_table), (name_index_offset, name_offsets.tobytes()),
+              (names_offset, b"".join(names))]
+    empty_column = bytes([MISSING_GRADE]) * num_students
+    for number, subject in enumerate(subjects):
+        pieces.append((matrix_offset + number * num_students, columns.get(subject, empty_column)))
+    return matrix_offset + len(subjects) * num_students, pieces
+
+
+def save_binary_gradebook(gradebook, path):
+    """Write any Gradebook to the binary format read by MappedGradebook"""
+    _, pieces = _binary_pieces(gradebook)
+    with open(path, "wb") as file:
+        for offset, data in pieces:
+            file.write(bytes(offset - file.tell()))  # Alignment padding
+            file.write(data)
+
+
+class MappedGradebook:
+    """Read-only gradebook backed by a memory-mapped binary file
+
+    Nothing is loaded up front: names and grades are read from the mapping
+    when needed, and the aggregates walk each subject's uint8 column in
+    fixed-size chunks with bytes operations, so rosters larger than RAM
+    work without building Student objects."""
+
+    CHUNK_ROWS = 1 << 20  # Rows read from a column at a time
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._read_header()
+        except ValueError as error:
+            self.close()
+            raise ValueError(f"{path}: {error}") from None
+
+    @classmethod
+    def from_buffer(cls, buffer):
+        """View a binary gradebook held in any buffer, e.g. shared memory"""
+        mapped = cls.__new__(cls)
+        mapped._file = None
+        mapped._map = buffer
+        mapped._read_header()
+        return mapped
+
+    def _read_header(self):
+        (magic, version, _, self.num_students, num_subjects, subjects_offset,
+         self._name_index_offset, self._names_offset, self._matrix_offset) = _BINARY_HEADER.unpack_from(self._map, 0)
+        if magic != BINARY_MAGIC:
+            raise ValueError("not a binary gradebook file")
+        if version != BINARY_VERSION:
+            raise ValueError(f"unsupported version {version}")
+
+        self.subjects = []
+        offset = subjects_offset
+        for _ in range(num_subjects):
+            (length,) = struct.unpack_from("<H", self._map, offset)
+            self.subjects.append(self._read(offset + 2, offset + 2 + length).decode("utf-8"))
+            offset += 2 + length
+        self._column_numbers = {subject: number for number, subject in enumerate(self.subjects)}
+
+    def _read(self, start, end):
+        """Bytes in [start, end) of the mapping"""
+        return bytes(self._map[start:end])
+
+    def close(self):
+        """Unmap and close the file"""
+        if self._file is not None:
+            self._map.close()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.num_students
+
+    def name(self, row):
+        """Name of the student in a row"""
+        start, end = struct.unpack_from("<QQ", self._map, self._name_index_offset + 8 * row)
+        return self._read(self._names_offset + start, self._names_offset + end).decode("utf-8")
+
+    def _column_start(self, subject):
+        return self._matrix_offset + self._column_numbers[subject] * self.num_students
+
+    def get_grade(self, row, subject):
+        """Grade of one student, or None if there is none"""
+        if subject not in self._column_numbers:
+            return None
+        grade = self._map[self._column_start(subject) + row]
+        return None if grade == MISSING_GRADE else grade
+
+    def _column_chunks(self, subject, first_row=0, last_row=None):
+        """Yield a subject's grades as bytes chunks of at most CHUNK_ROWS"""
+        start = self._column_start(subject)
+        last_row = self.num_students if last_row is None else last_row
+        for row in range(first_row, last_row, self.CHUNK_ROWS):
+            yield self._read(start + row, start + min(row + self.CHUNK_ROWS, last_row))
+
+    def partial_stats(self, subject, first_row=0, last_row=None):
+        """(total, count, highest, lowest) of a subject's grades in [first_row, last_row)"""
+        total = count = 0
+        highest = lowest = None
+        if subject not in self._column_numbers:
+            return total, count, highest, lowest
+
+        for chunk in self._column_chunks(subject, first_row, last_row):
+            missing = chunk.count(MISSING_GRADE)
+            if missing == len(chunk):
+                continue
+            total += sum(chunk) - missing * MISSING_GRADE
+            count += len(chunk) - missing
+            chunk_high = max(chunk.translate(_MISSING_AS_ZERO))
+            chunk_low = min(chunk)  # Missing cells hold the largest byte value
+            highest = chunk_high if highest is None else max(highest, chunk_high)
+            lowest = chunk_low if lowest is None else min(lowest, chunk_low)
+        return total, count, highest, lowest
 
-            for subject in sorted(self.subjects):
-                grade = student.get_grade(subject)
-                if grade is not None:
-                    row += f"{grade:<12}"
-                    total += grade
-                    valid_subjects += 1
+    def subject_stats(self, subject):
+        """Get statistics for a specific subject"""
+        total, count, highest, lowest = self.partial_stats(subject)
+        if count == 0:
+            return None, None, 0, 0
+        return highest, lowest, total / count, count
+
+    def class_average(self):
+        """Calculate overall class average"""
+        total = count = 0
+        for subject in self.subjects:
+            for chunk in self._column_chunks(subject):
+                missing = chunk.count(MISSING_GRADE)
+                total += sum(chunk) - missing * MISSING_GRADE
+                count += len(chunk) - missing
+        return total / count if count else 0
+
+    def rows(self, subjects, first_row=0, last_row=None):
+        """Yield (name, [grade or None for each subject]) for rows in [first_row, last_row)"""
+        last_row = self.num_students if last_row is None else last_row
+        present = [subject for subject in subjects if subject in self._column_numbers]
+        empty = bytes([MISSING_GRADE]) * self.CHUNK_ROWS
+        for start in range(first_row, last_row, self.CHUNK_ROWS):
+            end = min(start + self.CHUNK_ROWS, last_row)
+            chunks = {subject: next(self._column_chunks(subject, start, end)) for subject in present}
+            columns = [chunks.get(subject, empty[:end - start]) for subject in subjects]
+            grade_rows = zip(*columns) if columns else ((),) * (end - start)
+            for row, grades in zip(range(start, end), grade_rows):
+                yield self.name(row), [None if grade == MISSING_GRADE else grade for grade in grades]
+
+    def row_averages(self, first_row=0, last_row=None):
+        """Average of each row in [first_row, last_row), read chunk by chunk"""
+        last_row = self.num_students if last_row is None else last_row
+        if not self.subjects:
+            return [0] * (last_row - first_row)
+        averages = []
+        chunks = zip(*(self._column_chunks(subject, first_row, last_row) for subject in self.subjects))
+        for column_chunks in chunks:
+            for row in zip(*column_chunks):
+                missing = row.count(MISSING_GRADE)
+                count = len(row) - missing
+                averages.append((sum(row) - missing * MISSING_GRADE) / count if count else 0)
+        return averages
+
+    def rank_by_average(self, descending=True):
+        """Student names sorted by average grade (ties keep file order)"""
+        averages = self.row_averages()
+        order = sorted(range(len(averages)), key=averages.__getitem__, reverse=descending)
+        return [self.name(row) for row in order]
+
+
+def _report_chunk(memory_name, first_row, last_row, task, subjects, orders=None, orders_offset=0):
+    """Worker for ParallelReporter: do one task for one range of rows
+
+    For "report", orders lists each way students order their subjects, as
+    column numbers in subjects, and the shared memory holds every row's
+    4-byte index into orders at orders_offset. Without orders each student
+    lists the subjects in the order given."""
+    memory = shared_memory.SharedMemory(name=memory_name)
+    try:
+        mapped = MappedGradebook.from_buffer(memory.buf)
+        if task == "stats":
+            return {subject: mapped.partial_stats(subject, first_row, last_row) for subject in mapped.subjects}
+        if task == "averages":
+            return array("d", mapped.row_averages(first_row, last_row)).tobytes()
+        if task == "summary":
+            return "".join(format_summary_rows(mapped.rows(subjects, first_row, last_row), len(subjects)))
+        if task == "report":
+            row_orders = array("I")
+            if orders is not None:
+                row_orders.frombytes(memory.buf[orders_offset + 4 * first_row:orders_offset + 4 * last_row])
+            lines = []
+            for row, (name, grades) in enumerate(mapped.rows(subjects, first_row, last_row)):
+                if orders is None:
+                    present = {subject: grade for subject, grade in zip(subjects, grades) if grade is not None}
                 else:
-                    row += f"{'N/A':<12}"
+                    present = {subjects[column]: grades[column] for column in orders[row_orders[row]]}
+                average = sum(present.values()) / len(present) if present else 0
+                lines.extend(student_info_lines(name, present, average))
+            return "".join(lines)
+        raise ValueError(f"Unknown report task: {task}")
+    finally:
+        mapped = None  # Drop the view of memory.buf before closing it
+        memory.close()
+
+
+class ParallelReporter:
+    """Builds reports for a Gradebook on a pool of worker processes
+
+    The grades are packed into shared memory in the binary gradebook
+    layout, and packed again before the next report once the gradebook's
+    change_version has moved. Each worker views that memory with
+    MappedGradebook and handles one range of rows, returning partial
+    aggregates (sums, counts, min/max) or rendered text, which are merged
+    back in roster order. Nothing but the shared memory name, the row range
+    and the subject lists is sent to a worker. The reports are the same,
+    byte for byte, as the gradebook's own.
+
+    Use it as a context manager so the pool and shared memory are released:
+        with ParallelReporter(gradebook, workers=4) as reporter:
+            reporter.summary_table(out)"""
+
+    def __init__(self, gradebook, workers=None, chunk_rows=25000):
+        self.gradebook = gradebook
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_rows = chunk_rows
+        self._memory = None
+        self._load()
+        self._pool = ProcessPoolExecutor(max_workers=self.workers)
+
+    def _load(self):
+        """Pack the gradebook as it is now into a new block of shared memory"""
+        gradebook = self.gradebook
+        self._version = gradebook.change_version
+        self._students = list(gradebook.students.values())  # Row number -> student
+
+        size, pieces = _binary_pieces(gradebook)
+        self._orders_offset = _align(size)
+        memory = shared_memory.SharedMemory(create=True, size=max(1, self._orders_offset + 4 * len(self._students)))
+        for offset, data in pieces:
+            memory.buf[offset:offset + len(data)] = data
+        self._subjects = MappedGradebook.from_buffer(memory.buf).subjects
+        if isinstance(gradebook, ColumnarGradebook):
+            self._orders = None  # Every row lists its grades in column order
+        else:
+            row_orders, self._orders = self._subject_orders()
+            memory.buf[self._orders_offset:self._orders_offset + 4 * len(row_orders)] = row_orders.tobytes()
+        self._memory = memory
+
+    def _subject_orders(self):
+        """(order number of each row, each order as column numbers in self._subjects)
+
+        A Gradebook lists a student's grades in the order they were first
+        given, so the workers are told that order to match class_report"""
+        columns = {subject: number for number, subject in enumerate(self._subjects)}
+        numbers = {}  # Order key -> order number
+        orders = []
+        row_orders = array("I")
+        for student in self._students:
+            layout = getattr(student, "_layout", None)
+            key = layout if layout is not None else tuple(student.grades)
+            number = numbers.get(key)
+            if number is None:
+                number = numbers[key] = len(orders)
+                orders.append(tuple(columns[subject] for subject in student.grades))
+            row_orders.append(number)
+        return row_orders, orders
+
+    def _refresh(self):
+        """Pack the gradebook again if it changed since the last packing"""
+        if self.gradebook.change_version != self._version:
+            self._free_memory()
+            self._load()
+
+    def _free_memory(self):
+        self._memory.close()
+        self._memory.unlink()
+        self._memory = None
+
+    def close(self):
+        """Stop the workers and free the shared memory"""
+        self._pool.shutdown()
+        self._free_memory()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _map(self, task, subjects=(), orders=None):
+        """Run a task over every row range; results come back in roster order"""
+        starts = range(0, len(self._students), self.chunk_rows)
+        ends = [min(start + self.chunk_rows, len(self._students)) for start in starts]
+        count = len(ends)
+        return self._pool.map(_report_chunk, [self._memory.name] * count, starts, ends,
+                              [task] * count, [list(subjects)] * count, [orders] * count,
+                              [self._orders_offset] * count)
+
+    def _merged_stats(self):
+        """Merge every chunk's partial stats into {subject: (total, count, highest, lowest)}"""
+        self._refresh()
+        merged = {subject: (0, 0, None, None) for subject in self._subjects}
+        for partial in self._map("stats"):
+            for subject, (total, count, highest, lowest) in partial.items():
+                old_total, old_count, old_high, old_low = merged[subject]
+                if count:
+                    highest = highest if old_high is None else max(old_high, highest)
+                    lowest = lowest if old_low is None else min(old_low, lowest)
+                    merged[subject] = (old_total + total, old_count + count, highest, lowest)
+        return merged
+
+    def subject_stats(self):
+        """{subject: (highest, lowest, average, count)} for every subject"""
+        stats = {}
+        for subject, (total, count, highest, lowest) in self._merged_stats().items():
+            stats[subject] = (highest, lowest, total / count, count) if count else (None, None, 0, 0)
+        return stats
 
-            if valid_subjects > 0:
-                average = total / valid_subjects
-                row += f"{average:.2f}"
+    def class_average(self):
+        """Calculate overall class average"""
+        merged = self._merged_stats().values()
+        count = sum(partial[1] for partial in merged)
+        return sum(partial[0] for partial in merged) / count if count else 0
+
+    def sort_students_by_average(self, descending=True):
+        """Sort students by their average grade (same order as Gradebook's)"""
+        self._refresh()
+        averages = array("d")
+        for block in self._map("averages"):
+            averages.frombytes(block)
+        order = sorted(range(len(averages)), key=averages.__getitem__, reverse=descending)
+        return [self._students[row] for row in order]
+
+    def summary_table(self, out=None):
+        """Write the summary table, rendering rows on the workers"""
+        self._refresh()
+        lines = self.gradebook.summary_table_lines()
+        if not self._students:
+            write_lines(lines, out)
+            return
+        write_lines(itertools.islice(lines, 3), out)  # Title, header and rule
+        write_lines(self._map("summary", sorted(self.gradebook.subjects)), out)
+
+    def class_report(self, out=None):
+        """Write the class report, rendering students on the workers
+
+        Each student's grades are listed in the same order as the gradebook's
+        own class_report: column order for a ColumnarGradebook and the order
+        they were first given otherwise"""
+        self._refresh()
+        if not self._students:
+            write_lines(self.gradebook.class_report_lines(), out)
+            return
+        write_lines(itertools.islice(self.gradebook.class_report_lines(), 4), out)  # Report heading
+        if self._orders is None:
+            write_lines(self._map("report", list(self.gradebook._columns)), out)
+        else:
+            write_lines(self._map("report", self._subjects, self._orders), out)
+
+
+def benchmark_parallel(num_students=200000, num_subjects=6, worker_counts=(1, 2, 4, 8)):
+    """Time ParallelReporter against the single-process reports as workers are added"""
+    gradebook = ColumnarGradebook()
+    subjects = [f"Subject {i + 1}" for i in range(num_subjects)]
+    for subject in subjects:
+        gradebook.add_subject(subject)
+    for i in range(num_students):
+        name = f"Student {i + 1}"
+        gradebook.add_student(name)
+        for j, subject in enumerate(subjects):
+            if (i + j) % 7:
+                gradebook.update_student_grade(name, subject, (i * 31 + j * 17) % 101)
+
+    def timed(action):
+        start = time.perf_counter()
+        action()
+        return time.perf_counter() - start
+
+    print(f"{num_students} students, {os.cpu_count()} CPUs")
+    print(f"{'Workers':<10}{'Summary (s)':>14}{'Report (s)':>14}{'Ranking (s)':>14}")
+    serial = [timed(lambda: gradebook.summary_table(io.StringIO())),
+              timed(lambda: gradebook.class_report(io.StringIO())),
+              timed(lambda: gradebook.sort_students_by_average())]
+    print(f"{'serial':<10}{serial[0]:>14.2f}{serial[1]:>14.2f}{serial[2]:>14.2f}")
+    for workers in worker_counts:
+        with ParallelReporter(gradebook, workers=workers) as reporter:
+            reporter.class_average()  # Start the worker processes before timing
+            times = [timed(lambda: reporter.summary_table(io.StringIO())),
+                     timed(lambda: reporter.class_report(io.StringIO())),
+                     timed(lambda: reporter.sort_students_by_average())]
+        print(f"{workers:<10}{times[0]:>14.2f}{times[1]:>14.2f}{times[2]:>14.2f}")
+
+
+class GradebookSummary:
+    """Mergeable partial aggregates of one or more gradebooks
+
+    Totals and counts add up, histograms add bucket by bucket and the top-k
+    lists keep the k best of both, so the summaries of separate gradebooks
+    merge into the summary of all of them without reading any student
+    again. Top-k entries are (value, section, name), best first; students
+    with equal values keep the order of their sections, then their
+    insertion order, as if all sections were one gradebook."""
+
+    def __init__(self, top_k=10):
+        self.top_k = top_k
+        self.grade_total = 0
+        self.grade_count = 0
+        self.student_count = 0
+        self.histograms = {}  # {subject: GradeHistogram}
+        self.top_by_average = []  # [(average, section, name)]
+        self.top_by_subject = {}  # {subject: [(grade, section, name)]}
+
+    @classmethod
+    def of(cls, gradebook, section, top_k=10):
+        """Summarise one gradebook, labelling its students with section"""
+        summary = cls(top_k)
+        summary.grade_total, summary.grade_count = gradebook.grade_totals()
+        summary.student_count = len(gradebook.students)
+        for subject in gradebook.subjects:
+            summary.histograms[subject] = gradebook.subject_distribution(subject).copy()
+            summary.top_by_subject[subject] = [(student.get_grade(subject), section, student.name)
+                                               for student in gradebook.top_students(subject, top_k)]
+        averages = ((student.calculate_average(), student.name) for student in gradebook.students.values())
+        summary.top_by_average = [(average, section, name)
+                                  for average, name in heapq.nlargest(top_k, averages, key=lambda entry: entry[0])]
+        return summary
+
+    def _best(self, entries):
+        # nlargest keeps the earlier of equal entries first, like a stable sort
+        return heapq.nlargest(self.top_k, entries, key=lambda entry: entry[0])
+
+    def merge(self, other):
+        """Add another summary (of different students) into this one; returns self"""
+        self.grade_total += other.grade_total
+        self.grade_count += other.grade_count
+        self.student_count += other.student_count
+        for subject, histogram in other.histograms.items():
+            if subject in self.histograms:
+                self.histograms[subject].merge(histogram)
             else:
-                row += "N/A"
-            print(row)
+                self.histograms[subject] = histogram.copy()
+        self.top_by_average = self._best(self.top_by_average + other.top_by_average)
+        for subject, entries in other.top_by_subject.items():
+            self.top_by_subject[subject] = self._best(self.top_by_subject.get(subject, []) + entries)
+        return self
+
+    def class_average(self):
+        return self.grade_total / self.grade_count if self.grade_count else 0
+
+    def subject_stats(self, subject):
+        """(highest, lowest, average, count), like Gradebook.subject_stats"""
+        histogram = self.histograms.get(subject)
+        if not histogram:
+            return None, None, 0, 0
+        return histogram.highest(), histogram.lowest(), histogram.mean(), histogram.count
+
+    def _top(self, entries, count):
+        if count > self.top_k:
+            raise ValueError(f"Only the top {self.top_k} students are kept; summarise with a larger top_k")
+        return entries[:count]
+
+    def top_students(self, count):
+        """The count best (average, section, name) entries"""
+        return self._top(self.top_by_average, count)
+
+    def top_students_in(self, subject, count):
+        """The count best (grade, section, name) entries in a subject"""
+        return self._top(self.top_by_subject.get(subject, []), count)
+
+
+class GradebookFederation:
+    """Many section Gradebooks answered as one
+
+    Cross-section statistics merge one GradebookSummary per section instead
+    of reading every student. A section's summary is kept until its
+    change_version moves, so only sections that changed are summarised
+    again, on up to workers threads at once. Rankings list (value, section,
+    name) entries and are limited to the top_k best of each kind."""
+
+    def __init__(self, sections=None, top_k=10, workers=None):
+        self.sections = dict(sections or {})  # {section name: Gradebook}
+        self.top_k = top_k
+        self.workers = workers
+        self._summaries = {}  # {section name: (change_version, GradebookSummary)}
+
+    def add_section(self, section, gradebook):
+        self.sections[section] = gradebook
+        self._summaries.pop(section, None)
+
+    def remove_section(self, section):
+        self._summaries.pop(section, None)
+        return self.sections.pop(section, None) is not None
+
+    def summaries(self):
+        """{section name: GradebookSummary}, summarising only the sections that changed"""
+        stale = [section for section, gradebook in self.sections.items()
+                 if self._summaries.get(section, (None,))[0] != gradebook.change_version]
+
+        def summarise(section):
+            gradebook = self.sections[section]
+            version = gradebook.change_version  # Read first so a change made meanwhile is not missed
+            return version, GradebookSummary.of(gradebook, section, self.top_k)
+
+        if self.workers and self.workers > 1 and len(stale) > 1:
+            with ThreadPoolExecutor(self.workers) as pool:
+                fresh = list(pool.map(summarise, stale))
+        else:
+            fresh = [summarise(section) for section in stale]
+        self._summaries.update(zip(stale, fresh))
+        return {section: self._summaries[section][1] for section in self.sections}
+
+    def summary(self):
+        """One GradebookSummary of every section, merged in section order"""
+        merged = GradebookSummary(self.top_k)
+        for summary in self.summaries().values():
+            merged.merge(summary)
+        return merged
+
+    def class_average(self):
+        return self.summary().class_average()
+
+    def subject_stats(self, subject):
+        return self.summary().subject_stats(subject)
+
+    def top_students(self, count):
+        return self.summary().top_students(count)
+
+    def top_students_in(self, subject, count):
+        return self.summary().top_students_in(subject, count)
+
+
+class GradebookJournal(ChangeJournal):
+    """ChangeJournal of a gradebook, saving its subjects sorted and students in insertion order"""
+
+    @staticmethod
+    def _set_grade(gradebook, name, subject, grade):
+        """Apply a logged grade change (None removes the grade)"""
+        if grade is None:
+            gradebook.get_student(name).remove_grade(subject)
+        else:
+            gradebook.update_student_grade(name, subject, grade)
+
+    def _contents(self):
+        """The subjects and students a snapshot saves"""
+        return sorted(self.gradebook.subjects), self.gradebook.students.values()
+
+
+def benchmark_journal(num_students=100000, num_subjects=5, batch_size=256):
+    """Measure journaled mutation throughput and recovery time
+
+    Builds a num_students roster through a journal, then times recovery
+    from the full log and from a compacted snapshot"""
+    subjects = [f"Subject {i + 1}" for i in range(num_subjects)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        journal = GradebookJournal(directory, batch_size=batch_size, snapshot_every=None)
+        gradebook = Gradebook()
+        journal.open(gradebook)
+
+        start = time.perf_counter()
+        for subject in subjects:
+            gradebook.add_subject(subject)
+        for i in range(num_students):
+            name = f"Student {i + 1}"
+            gradebook.add_student(name)
+            for j, subject in enumerate(subjects):
+                gradebook.update_student_grade(name, subject, (i * 7 + j * 13) % 101)
+        journal.close()
+        elapsed = time.perf_counter() - start
+        records = num_subjects + num_students * (num_subjects + 1)
+        print(f"Wrote {records} records in {elapsed:.2f}s ({records / elapsed:,.0f} mutations/s)")
+
+        start = time.perf_counter()
+        journal = GradebookJournal(directory, snapshot_every=None)
+        replayed = journal.open(Gradebook())
+        print(f"Recovered from log ({replayed} records) in {time.perf_counter() - start:.2f}s")
+
+        start = time.perf_counter()
+        journal.compact()
+        journal.close()
+        print(f"Compacted snapshot in {time.perf_counter() - start:.2f}s")
+
+        start = time.perf_counter()
+        journal = GradebookJournal(directory, snapshot_every=None)
+        journal.open(Gradebook())
+        journal.close()
+        print(f"Recovered from snapshot in {time.perf_counter() - start:.2f}s")
+
+
+def benchmark_memory(num_students=100000, num_subjects=5):
+    """Measure with tracemalloc the memory Students take, against the previous dictionary layout"""
+
+    class DictStudent:
+        """The layout Student had before __slots__: a __dict__ plus a {subject: grade} dict"""
+
+        def __init__(self, name):
+            self.name = name
+            self.grades = {}
+            self.grade_total = 0
+            self.gradebook = None
+
+        def add_grade(self, subject, grade):
+            self.grade_total += grade - self.grades.get(subject, 0)
+            self.grades[subject] = grade
+
+    subjects = [f"Subject {i + 1}" for i in range(num_subjects)]
+    subject_names = SubjectNames()  # What a gradebook hands its students
+    for subject in subjects:
+        subject_names.id_of(subject)
+    names = [f"Student {i + 1}" for i in range(num_students)]  # Shared by both layouts
+
+    def measure(student_class):
+        tracemalloc.start()
+        students = []
+        for i, name in enumerate(names):
+            student = student_class(name)
+            for j, subject in enumerate(subjects):
+                student.add_grade(subject, (i * 31 + j * 17) % 101)
+            students.append(student)
+        used = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return used
+
+    print(f"{num_students} students x {num_subjects} subjects")
+    print(f"{'Layout':<12}{'Total (MB)':>14}{'Per student (bytes)':>22}")
+    slots_student = functools.partial(Student, subject_names=subject_names)
+    for label, student_class in (("dict", DictStudent), ("slots", slots_student)):
+        used = measure(student_class)
+        print(f"{label:<12}{used / 1e6:>14.1f}{used / num_students:>22.0f}")
+
+
+def benchmark_sorting(sizes=(10000, 100000, 1000000), missing=0.1, repeat=3):
+    """Time counting_sort against sorted() on grade keys, checking both give the same order
+
+    Each row ranks sizes[i] items by a random grade (a fraction missing of
+    them have none), highest first; the best of repeat runs is kept"""
+    rng = random.Random(42)
+    print(f"{'Items':>10}{'sorted() (s)':>15}{'counting (s)':>15}{'Speedup':>10}")
+    for size in sizes:
+        keys = bytes(0 if rng.random() < missing else rng.randint(0, 100) + 1 for _ in range(size))
+        items = list(range(size))
+        timings = {}
+        for label, rank in (("sorted", lambda: sorted(items, key=keys.__getitem__, reverse=True)),
+                            ("counting", lambda: counting_sort(items, keys, descending=True))):
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                result = rank()
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            timings[label] = (best, result)
+        if timings["sorted"][1] != timings["counting"][1]:
+            raise AssertionError(f"counting_sort and sorted() disagree at {size} items")
+        print(f"{size:>10}{timings['sorted'][0]:>15.4f}{timings['counting'][0]:>15.4f}"
+              f"{timings['sorted'][0] / timings['counting'][0]:>9.1f}x")
+
+
+def benchmark_snapshots(num_students=20000, num_subjects=5, changes=1000):
+    """Compare keeping a copy of the gradebook per marking period by deepcopy and by snapshot()
+
+    Times taking a copy after changes grade updates and comparing it with
+    the copy from before them: every student for the deep copies, only the
+    changed ones for GradebookDiff. The memory column is what the second
+    deep copy takes, and for snapshots what the changes left allocated
+    (tracemalloc) while the first snapshot is kept: the copied trie paths
+    and the new records of the changed students."""
+    rng = random.Random(42)
+    subjects = [f"Subject {i + 1}" for i in range(num_subjects)]
+    gradebook = Gradebook()
+    for subject in subjects:
+        gradebook.add_subject(subject)
+    for i in range(num_students):
+        gradebook.add_student(f"Student {i + 1}")
+    gradebook.update_grades([(name, subject, rng.randint(0, 100)) for name in gradebook.students for subject in subjects])
+    names = list(gradebook.students)
+    first_copy, first_snapshot = copy.deepcopy(gradebook), gradebook.snapshot()
+    updates = [(rng.choice(names), rng.choice(subjects), rng.randint(0, 100)) for _ in range(changes)]
+
+    def measure(take):
+        tracemalloc.start()
+        start = time.perf_counter()
+        taken = take()
+        elapsed = time.perf_counter() - start
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return taken, elapsed, size
+
+    def compare_copies(old, new):
+        changed = [name for name, student in new.students.items() if student.grades != old.students[name].grades]
+        ranks = {student.name: rank for rank, student in enumerate(new.sort_students_by_average(), 1)}
+        return changed, ranks
+
+    _, _, snapshot_bytes = measure(lambda: [gradebook.update_student_grade(*update) for update in updates])
+    # The copy leaves out the versions (and the lock they hold), as a plain copy of the data
+    second_copy, copy_seconds, copy_bytes = measure(lambda: copy.deepcopy(gradebook, {id(gradebook.versions): None}))
+    second_snapshot, snapshot_seconds, _ = measure(gradebook.snapshot)
+    start = time.perf_counter()
+    changed, _ = compare_copies(first_copy, second_copy)
+    copy_compare = time.perf_counter() - start
+    start = time.perf_counter()
+    difference = first_snapshot.diff(second_snapshot)
+    snapshot_compare = time.perf_counter() - start
+    if sorted(changed) != sorted({change[0] for change in difference.grade_changes}):
+        raise AssertionError("GradebookDiff and the deep copies disagree on the changed students")
+
+    print(f"{num_students} students x {num_subjects} subjects, {changes} grade changes between copies "
+          f"({len(changed)} students changed)")
+    print(f"{'Copy':<10}{'take (s)':>12}{'memory (KB)':>14}{'compare (s)':>14}")
+    print(f"{'deepcopy':<10}{copy_seconds:>12.4f}{copy_bytes / 1024:>14.0f}{copy_compare:>14.4f}")
+    print(f"{'snapshot':<10}{snapshot_seconds:>12.6f}{snapshot_bytes / 1024:>14.0f}{snapshot_compare:>14.4f}")
+
+
+def benchmark_ranks(num_students=100000, num_subjects=5, changes=1000):
+    """Time finding one student's rank after each of changes grade changes
+
+    Once by sorting the class again each time (sort_students_by_average,
+    timed on a hundredth of the changes) and once with the StudentRanking
+    kept by rank_of(), checking both agree on the last rank"""
+    rng = random.Random(42)
+    subjects = [f"Subject {i + 1}" for i in range(num_subjects)]
+    gradebook = Gradebook()
+    for subject in subjects:
+        gradebook.add_subject(subject)
+    for i in range(num_students):
+        gradebook.add_student(f"Student {i + 1}")
+    gradebook.update_grades([(name, subject, rng.randint(0, 100)) for name in gradebook.students for subject in subjects])
+    names = list(gradebook.students)
+    updates = [(rng.choice(names), rng.choice(subjects), rng.randint(0, 100)) for _ in range(changes)]
+
+    sorted_ranks, sort_seconds = [], 0.0
+    for name, subject, grade in updates[:max(1, changes // 100)]:  # Sorting is too slow for all of them
+        gradebook.update_student_grade(name, subject, grade)
+        start = time.perf_counter()
+        sorted_ranks.append(gradebook.sort_students_by_average().index(gradebook.students[name]) + 1)
+        sort_seconds += time.perf_counter() - start
+    sort_seconds *= changes / len(sorted_ranks)
+
+    start = time.perf_counter()
+    gradebook.rank_of(names[0])
+    build_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    index_ranks = []
+    for name, subject, grade in updates:
+        gradebook.update_student_grade(name, subject, grade)
+        index_ranks.append(gradebook.rank_of(name))
+    index_seconds = time.perf_counter() - start
+
+    last_name = updates[-1][0]
+    if gradebook.sort_students_by_average().index(gradebook.students[last_name]) + 1 != index_ranks[-1]:
+        raise AssertionError("rank_of() and sort_students_by_average() disagree")
+
+    print(f"{num_students} students x {num_subjects} subjects, {changes} changes each followed by one rank")
+    print(f"{'Method':<14}{'total (s)':>12}{'per rank (ms)':>15}")
+    print(f"{'re-sort':<14}{sort_seconds:>12.4f}{sort_seconds / changes * 1000:>15.3f}   (estimated from "
+          f"{len(sorted_ranks)} changes)")
+    print(f"{'StudentRanking':<14}{index_seconds:>12.4f}{index_seconds / changes * 1000:>15.3f}   "
+          f"(plus {build_seconds:.4f}s to build it once)")
+
+
+def benchmark_sqlite(num_students=50000, num_subjects=5, lookups=1000):
+    """Time the same workload on the in-memory Gradebook and on a SqliteGradebook file
+
+    Loading adds every student and then sends all the grades as one batch;
+    the other rows are lookups lookups long or one call over the whole roster"""
+    rng = random.Random(42)
+    subjects = [f"Subject {i + 1}" for i in range(num_subjects)]
+    names = [f"Student {i + 1}" for i in range(num_students)]
+    rows = [(name, subject, rng.randint(0, 100)) for name in names for subject in subjects]
+    updates = [(rng.choice(names), rng.choice(subjects), rng.randint(0, 100)) for _ in range(lookups)]
+    searches = [rng.choice(names) for _ in range(lookups)]
+
+    def load(gradebook):
+        for subject in subjects:
+            gradebook.add_subject(subject)
+        with gradebook.transaction() if isinstance(gradebook, SqliteGradebook) else contextlib.nullcontext():
+            for name in names:
+                gradebook.add_student(name)
+        gradebook.update_grades(rows)
+
+    workload = (
+        ("load", load),
+        ("update", lambda gradebook: [gradebook.update_student_grade(*update) for update in updates]),
+        ("search", lambda gradebook: [gradebook.search_student(name) for name in searches]),
+        ("class_average", lambda gradebook: [gradebook.class_average() for _ in range(lookups)]),
+        ("subject_stats", lambda gradebook: [gradebook.subject_stats(subject) for subject in subjects]),
+        ("sort_average", lambda gradebook: gradebook.sort_students_by_average()),
+        ("sort_subject", lambda gradebook: gradebook.sort_students_by_subject(subjects[0])),
+    )
+
+    with tempfile.TemporaryDirectory() as directory:
+        backends = (("dict", Gradebook()), ("sqlite", SqliteGradebook(os.path.join(directory, "gradebook.db"))))
+        print(f"{num_students} students x {num_subjects} subjects, {lookups} updates/searches/averages")
+        print(f"{'Backend':<10}" + "".join(f"{label:>15}" for label, _ in workload))
+        for backend, gradebook in backends:
+            cells = []
+            for _, action in workload:
+                start = time.perf_counter()
+                action(gradebook)
+                cells.append(time.perf_counter() - start)
+            print(f"{backend:<10}" + "".join(f"{seconds:>15.4f}" for seconds in cells))
+        backends[1][1].close()
+
+
+class GradebookImporter:
+    """Streams a roster/grades CSV or TSV file into a Gradebook
+
+    The layout is chosen from the header row:
+      wide  Name,Math,English,...  one row per student, an empty cell means no grade
+      long  name,subject,grade     one row per grade
+    Rows are read, validated and applied through a chain of generators, so
+    memory stays bounded however long the file is. A bad row is written to
+    the error report and skipped instead of stopping the load."""
+
+    def __init__(self, gradebook, batch_size=5000, error_path=None, max_errors_kept=100):
+        self.gradebook = gradebook
+        self.batch_size = batch_size
+        self.error_path = error_path  # CSV file that receives every bad row, if given
+        self.max_errors_kept = max_errors_kept
+        self.errors = []  # First max_errors_kept (line, message) pairs
+        self.rows_read = 0
+        self.rows_imported = 0
+        self.grades_imported = 0
+        self.error_count = 0
+        self.seconds = 0.0
+        self._error_writer = None
+
+    @property
+    def rows_per_second(self):
+        return self.rows_read / self.seconds if self.seconds else 0.0
+
+    def read_rows(self, path):
+        """Yield (line number, row) pairs from the file"""
+        delimiter = "\t" if path.lower().endswith((".tsv", ".tab")) else ","
+        with open(path, newline="", encoding="utf-8-sig") as file:
+            yield from enumerate(csv.reader(file, delimiter=delimiter), 1)
+
+    def report_error(self, line, row, message):
+        """Record a bad row"""
+        self.error_count += 1
+        if len(self.errors) < self.max_errors_kept:
+            self.errors.append((line, message))
+        if self._error_writer is not None:
+            self._error_writer.writerow([line, message] + row)
+
+    def records(self, rows):
+        """Validate rows and yield (name, [(subject, grade), ...]) records"""
+        first = next(rows, None)
+        if first is None:
+            return
+        columns = [cell.strip() for cell in first[1]]
+        long_layout = [column.lower() for column in columns] == ["name", "subject", "grade"]
+        subjects = [] if long_layout else columns[1:]
+        for subject in subjects:
+            if subject:
+                self.gradebook.add_subject(subject)
+
+        for line, row in rows:
+            if not any(cell.strip() for cell in row):
+                continue  # Blank line
+            self.rows_read += 1
+
+            name = row[0].strip()
+            if not name:
+                self.report_error(line, row, "Student name cannot be empty")
+                continue
+
+            try:
+                if long_layout:
+                    if len(row) != 3:
+                        raise ValueError("Expected name, subject and grade")
+                    subject = row[1].strip()
+                    if not subject:
+                        raise ValueError("Subject name cannot be empty")
+                    grades = [(subject, parse_grade(row[2]))]
+                else:
+                    if len(row) > len(columns):
+                        raise ValueError(f"Expected at most {len(columns)} columns")
+                    grades = [(subject, parse_grade(cell))
+                              for subject, cell in zip(subjects, row[1:]) if subject and cell.strip()]
+            except ValueError as error:
+                self.report_error(line, row, str(error))
+                continue
+
+            yield name, grades
+
+    def batches(self, records):
+        """Group records into lists of batch_size"""
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def apply_batch(self, batch):
+        """Write one batch of records into the gradebook"""
+        gradebook = self.gradebook
+        updates = []
+        for name, grades in batch:
+            gradebook.add_student(name)  # Existing students are updated
+            for subject, grade in grades:
+                if subject not in gradebook.subjects:
+                    gradebook.add_subject(subject)
+                updates.append((name, subject, grade))
+            self.grades_imported += len(grades)
+
+        # The records were validated already, so the whole batch goes in at once
+        errors = gradebook.update_grades(updates)
+        if errors:
+            raise ValueError(f"Batch rejected: {errors[0][1]}")
+        self.rows_imported += len(batch)
+        if gradebook.journal is not None:
+            gradebook.journal.sync()
+
+    def run(self, path):
+        """Import the whole file; returns self with the counts filled in"""
+        start = time.perf_counter()
+        error_file = None
+        if self.error_path is not None:
+            error_file = open(self.error_path, "w", newline="", encoding="utf-8")
+            self._error_writer = csv.writer(error_file)
+            self._error_writer.writerow(["line", "error", "row"])
+        try:
+            for batch in self.batches(self.records(self.read_rows(path))):
+                self.apply_batch(batch)
+        finally:
+            if error_file is not None:
+                error_file.close()
+                self._error_writer = None
+        self.seconds = time.perf_counter() - start
+        return self
+
+    def summary(self):
+        """One-line description of the import"""
+        return (f"Imported {self.grades_imported} grades from {self.rows_imported} of {self.rows_read} rows "
+                f"in {self.seconds:.2f}s ({self.rows_per_second:,.0f} rows/s), {self.error_count} bad rows")
+
+
+def subject_stats_json(gradebook, subject):
+    """JSON-ready statistics of one subject, as served by GET /subjects/SUBJECT/stats"""
+    highest, lowest, average, count = gradebook.subject_stats(subject)
+    histogram = gradebook.subject_distribution(subject)
+    return {"subject": subject, "highest": highest, "lowest": lowest, "average": average, "count": count,
+            "median": histogram.median(), "stdev": histogram.stdev(),
+            "percentiles": {str(percent): histogram.percentile(percent) for percent in (10, 25, 75, 90)}}
+
+
+class HttpError(Exception):
+    """An HTTP error response: status code plus a message for the JSON body"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class GradebookServer:
+    """Serves a Gradebook as JSON over HTTP/1.1 with asyncio (stdlib only)
+
+    Endpoints (names and subjects are URL-encoded):
+      GET    /subjects                          subject names
+      POST   /subjects                {"name"}  add a subject
+      GET    /students?offset=&limit=           names and averages
+      POST   /students                {"name"}  add a student
+      GET    /students/NAME                     grades and average
+      DELETE /students/NAME                     remove a student
+      PUT    /students/NAME/grades/SUBJECT {"grade"}  set a grade
+      DELETE /students/NAME/grades/SUBJECT      remove a grade
+      POST   /grades   [[name, subject, grade], ...]  all-or-nothing batch
+      GET    /subjects/SUBJECT/stats            highest, lowest, average, count, median,
+                                                stdev and percentiles
+      GET    /class-average
+      GET    /sorted?by=average|SUBJECT&order=desc|asc&limit=
+      GET    /reports/summary, /reports/class   plain text reports
+
+    Connections are kept alive, and each one handles its requests in the
+    order they arrive, so pipelined requests are answered in order. Sorted
+    views and reports run in the default executor so the event loop keeps
+    serving other clients meanwhile; changes wait until no report is reading
+    the gradebook, and are applied between awaits so readers never see half
+    of one. Reports that arrive while a change is waiting start after it.
+    A request that fails unexpectedly gets a 500 reply instead of a dropped
+    connection."""
+
+    MAX_BODY = 16 << 20  # Largest request body accepted, in bytes
+
+    def __init__(self, gradebook, host="127.0.0.1", port=8080, idle_timeout=30):
+        self.gradebook = gradebook
+        self.host = host
+        self.port = port
+        self.idle_timeout = idle_timeout  # Seconds a kept-alive connection may sit idle
+        self.requests_served = 0
+        self._server = None
+        self._readers = 0  # Reports currently reading the gradebook in the executor
+        self._writers_waiting = 0  # Changes waiting for those reports to finish
+        self._readers_done = None  # asyncio.Condition, created on the server's loop
+        self._routes = [
+            ("GET", r"/subjects", self.get_subjects, False),
+            ("POST", r"/subjects", self.post_subject, False),
+            ("GET", r"/students", self.get_students, False),
+            ("POST", r"/students", self.post_student, False),
+            ("GET", r"/students/([^/]+)", self.get_student, False),
+            ("DELETE", r"/students/([^/]+)", self.delete_student, False),
+            ("PUT", r"/students/([^/]+)/grades/([^/]+)", self.put_grade, False),
+            ("DELETE", r"/students/([^/]+)/grades/([^/]+)", self.delete_grade, False),
+            ("POST", r"/grades", self.post_grades, False),
+            ("GET", r"/subjects/([^/]+)/stats", self.get_subject_stats, False),
+            ("GET", r"/class-average", self.get_class_average, False),
+            ("GET", r"/sorted", self.get_sorted, True),
+            ("GET", r"/reports/summary", self.get_summary_report, True),
+            ("GET", r"/reports/class", self.get_class_report, True),
+        ]
+        self._routes = [(method, re.compile(pattern), handler, heavy)
+                        for method, pattern, handler, heavy in self._routes]
+
+    async def start(self):
+        """Start listening; port 0 picks a free port (see self.port)"""
+        self._readers_done = asyncio.Condition()
+        self._server = await asyncio.start_server(self._serve_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        print(f"Serving the gradebook on http://{self.host}:{self.port}/ (Ctrl+C to stop)")
+        await self._server.serve_forever()
+
+    async def close(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _serve_connection(self, reader, writer):
+        """Answer requests on one connection until it is closed or idle"""
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader), self.idle_timeout)
+                except HttpError as error:
+                    writer.write(self._response(error.status, {"error": str(error)}, keep_alive=False))
+                    break
+                if request is None:
+                    break
+                method, target, body, keep_alive = request
+                try:
+                    status, payload = await self._dispatch(method, target, body)
+                except Exception as error:  # A handler bug must not drop the connection silently
+                    status, payload = 500, {"error": f"{type(error).__name__}: {error}"}
+                writer.write(self._response(status, payload, keep_alive))
+                await writer.drain()
+                self.requests_served += 1
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        """Read one request; returns (method, target, body, keep_alive) or None at EOF"""
+        line = await reader.readline()
+        if not line:
+            return None
+        try:
+            method, target, version = line.decode("latin-1").split()
+        except ValueError:
+            raise HttpError(400, "Malformed request line") from None
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip()
+
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            raise HttpError(501, "Chunked request bodies are not supported")
+        try:
+            length = int(headers.get("content-length", 0) or 0)
+        except ValueError:
+            raise HttpError(400, "Content-Length must be a whole number") from None
+        if length < 0:
+            raise HttpError(400, "Content-Length must not be negative")
+        if length > self.MAX_BODY:
+            raise HttpError(413, "Request body too large")
+        body = await reader.readexactly(length) if length else b""
+
+        connection = headers.get("connection", "").lower()
+        if version == "HTTP/1.0":
+            keep_alive = connection == "keep-alive"
+        else:
+            keep_alive = connection != "close"
+        return method.upper(), target, body, keep_alive
+
+    @staticmethod
+    def _response(status, payload, keep_alive):
+        """Encode a response; str payloads are sent as text, anything else as JSON"""
+        if isinstance(payload, str):
+            body = payload.encode("utf-8")
+            content_type = "text/plain; charset=utf-8"
+        else:
+            body = json.dumps(payload).encode("utf-8")
+            content_type = "application/json"
+        reason = HTTPStatus(status).phrase
+        head = (f"HTTP/1.1 {status} {reason}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        return head.encode("latin-1") + body
+
+    async def _dispatch(self, method, target, body):
+        """Route a request to its handler; returns (status, payload)"""
+        url = urllib.parse.urlsplit(target)
+        query = {key: values[-1] for key, values in urllib.parse.parse_qs(url.query).items()}
+        path = url.path.rstrip("/") or "/"
+        allowed = False
+        for route_method, pattern, handler, heavy in self._routes:
+            match = pattern.fullmatch(path)
+            if match is None:
+                continue
+            allowed = True
+            if route_method != method:
+                continue
+            arguments = [urllib.parse.unquote(part) for part in match.groups()]
+            try:
+                data = json.loads(body) if body else None
+                if heavy:
+                    return await self._run_reader(handler, arguments, query)
+                if method != "GET":
+                    await self._wait_for_readers()
+                return handler(*arguments, query=query, data=data)
+            except HttpError as error:
+                return error.status, {"error": str(error)}
+            except (ValueError, TypeError, KeyError) as error:
+                return 400, {"error": str(error)}
+        if allowed:
+            return 405, {"error": f"{method} is not allowed on {path}"}
+        return 404, {"error": f"No such endpoint: {path}"}
+
+    async def _wait_for_readers(self):
+        """Wait until no report is reading the gradebook in the executor
+
+        While a change is waiting, new reports queue behind it, so a steady
+        stream of reports cannot keep it waiting forever"""
+        async with self._readers_done:
+            self._writers_waiting += 1
+            try:
+                await self._readers_done.wait_for(lambda: self._readers == 0)
+            finally:
+                self._writers_waiting -= 1
+                self._readers_done.notify_all()
+
+    async def _run_reader(self, handler, arguments, query):
+        """Run a read-only handler in the executor while changes are held back"""
+        async with self._readers_done:
+            await self._readers_done.wait_for(lambda: self._writers_waiting == 0)
+        self._readers += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, functools.partial(handler, *arguments, query=query, data=None))
+        finally:
+            self._readers -= 1
+            async with self._readers_done:
+                self._readers_done.notify_all()
+
+    # Handlers: each returns (status, payload) and raises HttpError for client errors
+
+    def _student(self, name):
+        student = self.gradebook.get_student(name)
+        if student is None:
+            raise HttpError(404, f"{name} was not found")
+        return student
+
+    def _subject(self, subject):
+        if subject not in self.gradebook.subjects:
+            raise HttpError(404, f"{subject} was not found")
+        return subject
+
+    @staticmethod
+    def _name_from(data):
+        name = data.get("name", "").strip() if isinstance(data, dict) else ""
+        if not name:
+            raise HttpError(400, "Body must be a JSON object with a non-empty \"name\"")
+        return name
+
+    def get_subjects(self, query, data):
+        return 200, sorted(self.gradebook.subjects)
+
+    def post_subject(self, query, data):
+        subject = self._name_from(data)
+        if subject in self.gradebook.subjects:
+            raise HttpError(409, f"{subject} already exists")
+        self.gradebook.add_subject(subject)
+        return 201, {"name": subject}
+
+    def get_students(self, query, data):
+        offset = int(query.get("offset", 0))
+        limit = int(query.get("limit", 100))
+        students = itertools.islice(self.gradebook.students.values(), offset, offset + limit)
+        return 200, {"total": len(self.gradebook.students),
+                     "students": [{"name": student.name, "average": student.calculate_average()}
+                                  for student in students]}
+
+    def post_student(self, query, data):
+        name = self._name_from(data)
+        if not self.gradebook.add_student(name):
+            raise HttpError(409, f"{name} already exists")
+        return 201, {"name": name}
+
+    def get_student(self, name, query, data):
+        student = self._student(name)
+        return 200, {"name": student.name, "grades": dict(student.grades), "average": student.calculate_average()}
+
+    def delete_student(self, name, query, data):
+        self._student(name)
+        self.gradebook.remove_student(name)
+        return 200, {"removed": name}
+
+    def put_grade(self, name, subject, query, data):
+        student = self._student(name)
+        self._subject(subject)
+        if not isinstance(data, dict) or "grade" not in data:
+            raise HttpError(400, "Body must be a JSON object with a \"grade\"")
+        student.add_grade(subject, data["grade"])  # ValueError becomes a 400
+        return 200, {"name": name, "subject": subject, "grade": data["grade"]}
+
+    def delete_grade(self, name, subject, query, data):
+        if not self._student(name).remove_grade(subject):
+            raise HttpError(404, f"{name} has no grade for {subject}")
+        return 200, {"name": name, "subject": subject}
+
+    def post_grades(self, query, data):
+        if not isinstance(data, list):
+            raise HttpError(400, "Body must be a JSON list of [name, subject, grade] rows")
+        rows = [(row["name"], row["subject"], row["grade"]) if isinstance(row, dict) else tuple(row)
+                for row in data]
+        errors = self.gradebook.update_grades(rows)
+        if errors:
+            return 400, {"errors": [{"row": row, "error": message} for row, message in errors]}
+        return 200, {"updated": len(rows)}
+
+    def get_subject_stats(self, subject, query, data):
+        return 200, subject_stats_json(self.gradebook, self._subject(subject))
+
+    def get_class_average(self, query, data):
+        return 200, {"average": self.gradebook.class_average()}
+
+    def get_sorted(self, query, data):
+        by = query.get("by", "average")
+        descending = query.get("order", "desc") != "asc"
+        limit = int(query.get("limit", 100))
+        if by == "average":
+            students = self.gradebook.sort_students_by_average(descending)[:limit]
+            return 200, [{"name": student.name, "average": student.calculate_average()} for student in students]
+        students = self.gradebook.sort_students_by_subject(self._subject(by), descending)[:limit]
+        return 200, [{"name": student.name, "grade": student.get_grade(by)} for student in students]
+
+    def get_summary_report(self, query, data):
+        out = io.StringIO()
+        self.gradebook.summary_table(out)
+        return 200, out.getvalue()
+
+    def get_class_report(self, query, data):
+        out = io.StringIO()
+        self.gradebook.class_report(out)
+        return 200, out.getvalue()
+
+
+async def _load_test_client(host, port, targets, count, pipeline, latencies):
+    """One keep-alive client sending count GET requests, pipeline at a time"""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for first in range(0, count, pipeline):
+            batch = [targets[(first + i) % len(targets)] for i in range(min(pipeline, count - first))]
+            start = time.perf_counter()
+            writer.write(b"".join(f"GET {target} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode("latin-1")
+                                  for target in batch))
+            await writer.drain()
+            for _ in batch:
+                status = (await reader.readline()).split()[1]
+                length = 0
+                while True:
+                    line = await reader.readline()
+                    if line == b"\r\n":
+                        break
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":")[1])
+                await reader.readexactly(length)
+                if status != b"200":
+                    raise RuntimeError(f"Load test request failed with status {status.decode()}")
+                latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+
+
+async def load_test(host, port, targets, client_counts=(1, 10, 100), requests_per_client=200, pipeline=1):
+    """Drive a running GradebookServer with concurrent keep-alive clients
+
+    Each client sends requests_per_client GETs cycling through targets, with
+    up to pipeline requests in flight. Prints throughput and tail latency for
+    each client count and returns the rows as dictionaries."""
+    results = []
+    print(f"{'Clients':>8}{'Requests':>10}{'Req/s':>10}{'p50 (ms)':>10}{'p99 (ms)':>10}{'Max (ms)':>10}")
+    for clients in client_counts:
+        latencies = []
+        start = time.perf_counter()
+        await asyncio.gather(*(_load_test_client(host, port, targets[i % len(targets):] + targets[:i % len(targets)],
+                                                 requests_per_client, pipeline, latencies)
+                               for i in range(clients)))
+        seconds = time.perf_counter() - start
+        latencies.sort()
+        row = {"clients": clients, "requests": len(latencies), "per_second": len(latencies) / seconds,
+               "p50": percentile(latencies, 50), "p99": percentile(latencies, 99),
+               "max": latencies[-1]}
+        results.append(row)
+        print(f"{clients:>8}{row['requests']:>10}{row['per_second']:>10.0f}{row['p50'] * 1e3:>10.2f}"
+              f"{row['p99'] * 1e3:>10.2f}{row['max'] * 1e3:>10.2f}")
+    return results
+
+
+def benchmark_server(num_students=10000, num_subjects=5, requests_per_client=200, pipeline=1):
+    """Serve a generated gradebook on a free local port and load test it at 1, 10 and 100 clients
+
+    The client runs in the same process as the server, so on one CPU the
+    numbers include the client's own work"""
+    gradebook = Gradebook()
+    subjects = [f"Subject {i + 1}" for i in range(num_subjects)]
+    for subject in subjects:
+        gradebook.add_subject(subject)
+    names = [f"Student {i + 1}" for i in range(num_students)]
+    for name in names:
+        gradebook.add_student(name)
+    gradebook.update_grades([(name, subject, (i * 31 + j * 17) % 101)
+                             for i, name in enumerate(names) for j, subject in enumerate(subjects)])
+
+    quote = urllib.parse.quote
+    targets = [f"/students/{quote(name)}" for name in names[:50]]
+    targets += [f"/subjects/{quote(subject)}/stats" for subject in subjects]
+    targets += ["/class-average", "/students?limit=20", f"/sorted?by={quote(subjects[0])}&limit=10"]
+
+    async def run():
+        server = await GradebookServer(gradebook, port=0).start()
+        try:
+            print(f"{num_students} students, pipeline depth {pipeline}")
+            return await load_test(server.host, server.port, targets,
+                                   requests_per_client=requests_per_client, pipeline=pipeline)
+        finally:
+            await server.close()
+
+    return asyncio.run(run())
+
+
+class GradebookBatch:
+    """Runs gradebook commands from a script or stdin without the menu
+
+    One command per line; words are split like a shell's, so quote names
+    with spaces, and # starts a comment:
+      add-subject SUBJECT ...            add subjects
+      add-student NAME ...               add students
+      remove-student NAME
+      grade NAME SUBJECT GRADE           add or change a grade
+      ungrade NAME SUBJECT               remove a grade
+      import FILE                        bulk load a CSV/TSV file (see GradebookImporter)
+      students                           names and averages
+      student NAME                       grades and average
+      subject SUBJECT                    statistics, as GET /subjects/SUBJECT/stats
+      average                            class average
+      sort [average|SUBJECT] [asc|desc] [LIMIT]
+      filter EXPRESSION                  students matching a GradeFilter expression
+      report summary|class               the text report
+
+    Each command writes one JSON object on its own line:
+    {"line": N, "command": NAME, "ok": true, ...results} or, when it fails,
+    {"line": N, "command": NAME, "ok": false, "error": MESSAGE}; a failed
+    command changes nothing and the run goes on with the next line. The
+    lines are written lines_per_write at a time with write_lines."""
+
+    WHOLE_LINE = ("filter",)  # Commands that take the rest of the line as one argument
+    PLAIN_WORDS = re.compile(r"[^\"'\\#]*")  # Arguments that split on whitespace alone
+
+    def __init__(self, gradebook, out=None, lines_per_write=1000):
+        self.gradebook = gradebook
+        self.out = out  # stdout when None
+        self.lines_per_write = lines_per_write
+        self.failures = 0
+        self._commands = {
+            "add-subject": self.add_subject,
+            "add-student": self.add_student,
+            "remove-student": self.remove_student,
+            "grade": self.grade,
+            "ungrade": self.ungrade,
+            "import": self.import_file,
+            "students": self.students,
+            "student": self.student,
+            "subject": self.subject,
+            "average": self.average,
+            "sort": self.sort,
+            "filter": self.filter,
+            "report": self.report,
+        }
+        self._signatures = {command: inspect.signature(action) for command, action in self._commands.items()}
+
+    def run(self, lines):
+        """Run every command in lines (a file or any iterable of str); returns the number that failed"""
+        write_lines(self.results(lines), self.out, self.lines_per_write)
+        if self.gradebook.journal is not None:
+            self.gradebook.journal.sync()
+        return self.failures
+
+    def results(self, lines):
+        """Yield the JSON line for each command as it runs"""
+        for number, line in enumerate(lines, 1):
+            parts = line.split(None, 1)
+            if not parts or parts[0].startswith("#"):
+                continue
+            command, rest = parts[0], parts[1] if len(parts) > 1 else ""
+
+            result = {"line": number, "command": command}
+            try:
+                action = self._commands.get(command)
+                if action is None:
+                    raise ValueError(f"Unknown command: {command}")
+                # A filter expression keeps its own quotes, so it is passed on as it is; shlex
+                # is only needed for quotes, escapes and comments
+                if command in self.WHOLE_LINE:
+                    arguments = [rest.strip()]
+                elif self.PLAIN_WORDS.fullmatch(rest):
+                    arguments = rest.split()
+                else:
+                    arguments = shlex.split(rest, comments=True)
+                try:
+                    self._signatures[command].bind(*arguments)
+                except TypeError:
+                    raise ValueError(f"Wrong number of arguments for {command}") from None
+                result.update(ok=True, **action(*arguments))
+            except (ValueError, KeyError, OSError) as error:
+                message = error.args[0] if isinstance(error, KeyError) else str(error)
+                result.update(ok=False, error=message)
+                self.failures += 1
+            yield json.dumps(result) + "\n"
+
+    # Commands: each returns a dictionary of results and raises ValueError or KeyError on failure
+
+    def _student(self, name):
+        student = self.gradebook.get_student(name)
+        if student is None:
+            raise KeyError(f"{name} was not found")
+        return student
+
+    def _subject(self, subject):
+        if subject not in self.gradebook.subjects:
+            raise KeyError(f"{subject} was not found")
+        return subject
+
+    def add_subject(self, *subjects):
+        if not all(subject.strip() for subject in subjects):
+            raise ValueError("Subject name cannot be empty")
+        existing = [subject for subject in subjects if subject in self.gradebook.subjects]
+        for subject in subjects:
+            self.gradebook.add_subject(subject)
+        return {"added": [subject for subject in subjects if subject not in existing], "existing": existing}
+
+    def add_student(self, *names):
+        if not all(name.strip() for name in names):
+            raise ValueError("Student name cannot be empty")
+        added, existing = [], []
+        for name in names:
+            (added if self.gradebook.add_student(name) else existing).append(name)
+        return {"added": added, "existing": existing}
+
+    def remove_student(self, name):
+        self._student(name)
+        self.gradebook.remove_student(name)
+        return {"removed": name}
+
+    def grade(self, name, subject, grade):
+        student = self._student(name)
+        student.add_grade(self._subject(subject), parse_grade(grade))
+        return {"name": name, "subject": subject, "grade": int(grade)}
+
+    def ungrade(self, name, subject):
+        if not self._student(name).remove_grade(subject):
+            raise KeyError(f"{name} has no grade for {subject}")
+        return {"name": name, "subject": subject}
+
+    def import_file(self, path):
+        importer = GradebookImporter(self.gradebook).run(path)
+        return {"rows": importer.rows_read, "imported": importer.rows_imported, "grades": importer.grades_imported,
+                "errors": [{"line": line, "error": message} for line, message in importer.errors]}
+
+    def students(self):
+        return {"students": [{"name": student.name, "average": student.calculate_average()}
+                             for student in self.gradebook.students.values()]}
+
+    def student(self, name):
+        student = self._student(name)
+        return {"name": student.name, "grades": dict(student.grades), "average": student.calculate_average()}
+
+    def subject(self, subject):
+        return subject_stats_json(self.gradebook, self._subject(subject))
+
+    def average(self):
+        return {"average": self.gradebook.class_average()}
+
+    def sort(self, by="average", order="desc", limit=None):
+        if order not in ("asc", "desc"):
+            raise ValueError(f"Order must be asc or desc, not {order}")
+        descending = order == "desc"
+        limit = None if limit is None else int(limit)
+        if by == "average":
+            students = self.gradebook.sort_students_by_average(descending)[:limit]
+            return {"students": [{"name": student.name, "average": student.calculate_average()}
+                                 for student in students]}
+        students = self.gradebook.sort_students_by_subject(self._subject(by), descending)[:limit]
+        return {"students": [{"name": student.name, "grade": student.get_grade(by)} for student in students]}
+
+    def filter(self, expression):
+        matches = self.gradebook.filter_students(expression)
+        return {"students": [{"name": student.name, "average": student.calculate_average()} for student in matches]}
+
+    def report(self, kind="summary"):
+        write_report = {"summary": self.gradebook.summary_table, "class": self.gradebook.class_report}.get(kind)
+        if write_report is None:
+            raise ValueError(f"Report must be summary or class, not {kind}")
+        out = io.StringIO()
+        write_report(out)
+        return {"report": out.getvalue()}
 
 
 class GradebookManager:
-    def __init__(self):
-        self.gradebook = Gradebook()
+    MENU_OPTIONS = ("Add New Student", "Update Student's Grade", "Remove Current Student",
+                    "Student Grades Profile", "Subject Grades Profile", "Student Search",
+                    "Display Sorted Students", "Class Report", "Subject Summary", "Summary Table",
+                    "Class Overall Average", "Import Grades From File", "Filter Students", "Exit")
+
+    def __init__(self, gradebook=None, instrumentation=None):
+        # Any Gradebook works here, including ColumnarGradebook
+        self.gradebook = gradebook if gradebook is not None else Gradebook()
+        self.instrumentation = instrumentation  # Times each menu action when set
 
     @staticmethod
     def valid_grade(prompt):
         """Get a valid grade between 0-100"""
         while True:
             try:
-                grade = int(input(prompt))
-                if 0 <= grade <= 100:
-                    return grade
-                else:
-                    print("Grade must range from 0 to 100")
-            except ValueError:
-                print("Please enter a valid number")
+                return parse_grade(input(prompt))
+            except ValueError as error:
+                print(error)
 
     @staticmethod
     def get_student_name(prompt):
@@ -329,9 +3689,8 @@ class GradebookManager:
     def display_student_profile(self):
         """Display a student's profile"""
         name = self.get_student_name("Enter the student's name: ")
-        student = self.gradebook.get_student(name)
-        if student:
-            student.display_info()
+        if self.gradebook.student_exists(name):
+            sys.stdout.write(self.gradebook.student_info_text(name))
         else:
             print(f"{name} was not found in the system")
 
@@ -345,6 +3704,7 @@ class GradebookManager:
 
         print(f"{subject} Grades:")
         highest_grade, lowest_grade, average_grade, student_count = self.gradebook.subject_stats(subject)
+        histogram = self.gradebook.subject_distribution(subject)
 
         # Display individual student grades
         for student in self.gradebook.students.values():
@@ -358,6 +3718,8 @@ class GradebookManager:
             print(f"  Highest Grade: {highest_grade}")
             print(f"  Lowest Grade: {lowest_grade}")
             print(f"  Average: {average_grade:.2f}")
+            print(f"  Median: {histogram.median():.2f}")
+            print(f"  Standard Deviation: {histogram.stdev():.2f}")
             print(f"  Number of Students: {student_count}")
         else:...
         print(f"No grades recorded for {subject}")
@@ -372,6 +3734,36 @@ class GradebookManager:
         else:
             print(f"{name} does not exist")
 
+    def import_file_interactive(self):
+        """Interactive method to bulk import a CSV/TSV file"""
+        path = input("Enter the path of the CSV/TSV file: ").strip()
+        if not os.path.exists(path):
+            print(f"{path} was not found")
+            return
+
+        importer = GradebookImporter(self.gradebook).run(path)
+        print(importer.summary())
+        for line, message in importer.errors[:10]:
+            print(f"  Line {line}: {message}")
+        if importer.error_count > 10:
+            print(f"  ...and {importer.error_count - 10} more")
+
+    def filter_students_interactive(self):
+        """Interactive method to list the students matching a filter expression"""
+        print("Combine comparisons on subjects or average with and, or, not and brackets,")
+        print("for example: Math < 50 and average > 70   or   not (\"Computer Science\" >= 60)")
+        expression = input("Enter a filter: ").strip()
+        try:
+            matches = self.gradebook.filter_students(expression)
+        except ValueError as error:
+            print(f"Invalid filter: {error}")
+            return
+
+        count = 0
+        for count, student in enumerate(matches, 1):
+            print(f"{count}. {student.name}: {student.calculate_average():.2f}")
+        print(f"{count} student(s) matched" if count else "No students matched the filter")
+
     def display_sorted_students(self):
         """Display students sorted by average or subject"""
         print("Sort Students By:")
@@ -409,71 +3801,75 @@ class GradebookManager:
                 grade_display = grade if grade is not None else "N/A"
                 print(f"{i}. {student.name}: {grade_display}")
 
-    @staticmethod
-    def display_menu():
+    @classmethod
+    def display_menu(cls):
         """Display the main menu"""
         print("~~~ Main Menu ~~~")
-        print("1. Add New Student")
-        print("2. Update Student's Grade")
-        print("3. Remove Current Student")
-        print("4. Student Grades Profile")
-        print("5. Subject Grades Profile")
-        print("6. Student Search")
-        print("7. Display Sorted Students")
-        print("8. Class Report")
-        print("9. Subject Summary")
-        print("10. Summary Table")
-        print("11. Class Overall Average")
-        print("12. Exit")
+        for number, option in enumerate(cls.MENU_OPTIONS, 1):
+            print(f"{number}. {option}")
 
-    @staticmethod
-    def get_menu_choice():
+    @classmethod
+    def get_menu_choice(cls):
         """Get valid menu choice"""
+        last = len(cls.MENU_OPTIONS)
         while True:
             try:
-                choice = int(input("Enter your choice (1-12): "))
-                if 1 <= choice <= 12:
+                choice = int(input(f"Enter your choice (1-{last}): "))
+                if 1 <= choice <= last:
                     return choice
                 else:
-                    print("Please enter a number between 1 and 12")
+                    print(f"Please enter a number between 1 and {last}")
             except ValueError:
                 print("Please enter a valid number")
 
     def run(self):
         """Main program loop"""
         print("~~~ Student GradeBook Management System ~~~")
-        self.setup_subjects()
+        if not self.gradebook.subjects:  # Subjects may come from a saved journal
+            self.setup_subjects()
 
         while True:
             self.display_menu()
             option = self.get_menu_choice()
 
-            if option == 1:
-                self.add_student_interactive()
-            elif option == 2:
-                self.update_student_grade_interactive()
-            elif option == 3:
-                self.remove_student_interactive()
-            elif option == 4:
-                self.display_student_profile()
-            elif option == 5:
-                self.display_subject_profile()
-            elif option == 6:
-                self.search_student_interactive()
-            elif option == 7:
-                self.display_sorted_students()
-            elif option == 8:
-                self.gradebook.class_report()
-            elif option == 9:
-                self.gradebook.subject_summary()
-            elif option == 10:
-                self.gradebook.summary_table()
-            elif option == 11:
-                overall_avg = self.gradebook.class_average()
-                print(f"Overall Class Average: {overall_avg:.2f}")
-            elif option == 12:
-                print("Adios")
-                break
+            # Time the action when instrumentation is on
+            if self.instrumentation is not None:
+                timer = self.instrumentation.action(self.MENU_OPTIONS[option - 1])
+            else:
+                timer = contextlib.nullcontext()
+            with timer:
+                if option == 1:
+                    self.add_student_interactive()
+                elif option == 2:
+                    self.update_student_grade_interactive()
+                elif option == 3:
+                    self.remove_student_interactive()
+                elif option == 4:
+                    self.display_student_profile()
+                elif option == 5:
+                    self.display_subject_profile()
+                elif option == 6:
+                    self.search_student_interactive()
+                elif option == 7:
+                    self.display_sorted_students()
+                elif option == 8:
+                    self.gradebook.class_report()
+                elif option == 9:
+                    self.gradebook.subject_summary()
+                elif option == 10:
+                    self.gradebook.summary_table()
+                elif option == 11:
+                    overall_avg = self.gradebook.class_average()
+                    print(f"Overall Class Average: {overall_avg:.2f}")
+                elif option == 12:
+                    self.import_file_interactive()
+                elif option == 13:
+                    self.filter_students_interactive()
+                elif option == 14:
+                    if self.gradebook.journal is not None:
+                        self.gradebook.journal.close()
+                    print("Adios")
+                    break
 
 
 # Unit Tests
@@ -487,8 +3883,8 @@ def run_tests():
     student1.add_grade("Music", 95)
 
     assert student1.name == "Ari Grande"
-    assert student1.get_grade("Math") == 85
-    assert student1.calculate_average() == 88.5
+    assert student1.get_grade("Math") == 90
+    assert student1.calculate_average() == 92.5
     assert student1.has_subject("Math") == True
     assert student1.has_subject("History") == False
 
@@ -505,7 +3901,7 @@ def run_tests():
 
     student = gradebook.get_student("Ari Grande")
     assert student is not None
-    assert student.calculate_average() == 92.5
+    assert student.calculate_average() == 99
 
     # Test sorting
     gradebook.add_student("Dalton Gomez")
@@ -520,11 +3916,121 @@ def run_tests():
 
 def main():
     """Main function to run the program"""
-    # Uncomment the line below to run tests
-    # run_tests()
-
-    manager = GradebookManager()
-    manager.run()
+    global DEBUG_AGGREGATES
+
+    # Pass --test to run the unit tests (tests/ has the full pytest suite)
+    if "--test" in sys.argv[1:]:
+        run_tests()
+        return
+
+    # Pass --debug to cross-check running averages against full recomputes
+    if "--debug" in sys.argv[1:]:
+        DEBUG_AGGREGATES = True
+
+    # Pass --stress-snapshots to check snapshot reports under concurrent writes
+    if "--stress-snapshots" in sys.argv[1:]:
+        _, _, problems = stress_snapshots()
+        sys.exit(1 if problems else 0)
+
+    if "--benchmark" in sys.argv[1:]:
+        benchmark_journal()
+        benchmark_parallel()
+        benchmark_memory()
+        benchmark_sorting()
+        benchmark_snapshots()
+        benchmark_ranks()
+        benchmark_sqlite()
+        return
+
+    # Pass --columnar to keep grades in the dense matrix storage, or --sqlite FILE
+    # to keep them in a SQLite database file
+    if "--columnar" in sys.argv[1:]:
+        gradebook = ColumnarGradebook()
+    elif "--sqlite" in sys.argv[1:]:
+        gradebook = SqliteGradebook(sys.argv[sys.argv.index("--sqlite") + 1])
+    else:
+        gradebook = Gradebook()
+
+    # Pass --cache to keep the reports and sorted lists the menu shows, for rosters
+    # where they are shown again and again with little changed in between
+    if "--cache" in sys.argv[1:]:
+        gradebook.report_cache = ReportCache()
+
+    # Pass --data DIR to save every change to a journal in DIR and reload it next time
+    if "--data" in sys.argv[1:]:
+        data_dir = sys.argv[sys.argv.index("--data") + 1]
+        GradebookJournal(data_dir).open(gradebook)
+
+    # Pass --import FILE to bulk load a CSV/TSV file before the menu starts
+    # (add --errors FILE to save the rows that could not be imported)
+    if "--import" in sys.argv[1:]:
+        error_path = sys.argv[sys.argv.index("--errors") + 1] if "--errors" in sys.argv[1:] else None
+        importer = GradebookImporter(gradebook, error_path=error_path)
+        print(importer.run(sys.argv[sys.argv.index("--import") + 1]).summary())
+
+    # Pass --export-summary FILE and/or --export-report FILE to save those reports
+    # (add --workers N to render them on N processes)
+    reporter = gradebook
+    if "--workers" in sys.argv[1:]:
+        reporter = ParallelReporter(gradebook, workers=int(sys.argv[sys.argv.index("--workers") + 1]))
+    for flag, write_report in (("--export-summary", reporter.summary_table),
+                               ("--export-report", reporter.class_report)):
+        if flag in sys.argv[1:]:
+            with open(sys.argv[sys.argv.index(flag) + 1], "w", encoding="utf-8", buffering=1 << 20) as report:
+                write_report(report)
+    if reporter is not gradebook:
+        reporter.close()
+
+    # Pass --save-binary FILE to write the gradebook to a memory-mappable file
+    if "--save-binary" in sys.argv[1:]:
+        save_binary_gradebook(gradebook, sys.argv[sys.argv.index("--save-binary") + 1])
+
+    # Pass --instrument to time Student/Gradebook methods and menu actions, printing
+    # the table on exit (add --instrument-json FILE to save it, and --cprofile N to
+    # run menu option N under cProfile)
+    instrumentation = None
+    if any(flag in sys.argv[1:] for flag in ("--instrument", "--instrument-json", "--cprofile")):
+        cprofile_action = None
+        if "--cprofile" in sys.argv[1:]:
+            cprofile_action = GradebookManager.MENU_OPTIONS[int(sys.argv[sys.argv.index("--cprofile") + 1]) - 1]
+        instrumentation = Instrumentation(cprofile_action)
+        instrumentation.instrument(Student, StudentRow, Gradebook, ColumnarGradebook, SqliteGradebook)
+
+    # Pass --serve PORT to serve the gradebook over HTTP on localhost instead of the menu
+    # (--load-test runs the server against generated data at 1, 10 and 100 clients)
+    if "--load-test" in sys.argv[1:]:
+        benchmark_server()
+        return
+    if "--serve" in sys.argv[1:]:
+        server = GradebookServer(gradebook, port=int(sys.argv[sys.argv.index("--serve") + 1]))
+        try:
+            asyncio.run(server.serve_forever())
+        except KeyboardInterrupt:
+            pass
+        if gradebook.journal is not None:
+            gradebook.journal.close()
+        return
+
+    # Pass --batch FILE (- for stdin) to run the commands in FILE instead of the menu,
+    # printing one JSON line per command; the exit status is 1 if any command failed
+    failures = 0
+    if "--batch" in sys.argv[1:]:
+        path = sys.argv[sys.argv.index("--batch") + 1]
+        with contextlib.nullcontext(sys.stdin) if path == "-" else open(path, encoding="utf-8") as commands:
+            failures = GradebookBatch(gradebook).run(commands)
+        if gradebook.journal is not None:
+            gradebook.journal.close()
+    else:
+        manager = GradebookManager(gradebook, instrumentation)
+        manager.run()
+
+    if instrumentation is not None:
+        instrumentation.remove()
+        instrumentation.report()
+        if "--instrument-json" in sys.argv[1:]:
+            instrumentation.save_json(sys.argv[sys.argv.index("--instrument-json") + 1])
+    if failures:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
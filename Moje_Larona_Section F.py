@@ -1,6 +1,6 @@
 """
 Gradebook System
-A comprehensive student grade management system that uses bubble sort for ranking.
+A comprehensive student grade management system that ranks students by average grade.
 
 Testing Documentation Summary:
 
@@ -31,6 +31,72 @@ CASES TESTED:
 7. Large number of students (performance)
    - Verified: Bubble sort handles various list sizes appropriately
    - Resolution: Added early termination in bubble sort when no swaps occur
+   - Issue: Bubble sort is O(n^2) and recomputed both averages on every comparison,
+     so ranking a few thousand students stalled for seconds
+   - Resolution: Ranking now uses rank_by_average(), which computes each average once
+     and sorts with a stable O(n log n) sort (see benchmark_ranking())
+   - Issue: calculate_average() and class_average() re-summed every grade on each call
+   - Resolution: Student and Gradebook keep running totals, so both averages are O(1);
+     set DEBUG_AGGREGATES = True to cross-check them against a full recompute
+   - Issue: add_student() and find_student() scanned the whole list, so bulk adds were O(n^2)
+   - Resolution: Gradebook keeps a lowercase name -> list position index, so name
+     lookups, duplicate checks and the new remove_student() are O(1)
+   - Moje_Larona_Benchmarks.py times add, update, search, ranking, class average and
+     the class report against Sections C, D and E on a seeded roster and fails when a
+     run is slower than a saved baseline
+
+8. Persistence
+   - Issue: All data was lost when the program exited
+   - Resolution: GradebookJournal appends every change to a log (fsynced in batches)
+     and compacts it into a snapshot; run with --data DIR to reload DIR on startup
+   - Verified: Reopening after random adds, grades and removals restores the same
+     gradebook, and a half-written last log line is dropped on recovery
+
+9. Profiling
+   - Issue: There was no way to see where time went in a session, e.g. how many
+     calculate_average() calls one ranking makes
+   - Resolution: Run with --instrument to time every Student/Gradebook method and menu
+     action (calls, total, p50 and p99), --instrument-json FILE to save the table and
+     --cprofile N to run menu option N under cProfile; without them nothing is wrapped
+
+10. Memory use
+   - Issue: Every Student had a __dict__ and its own {subject: grade} dictionary,
+     about 310 bytes per student with five subjects
+   - Resolution: Student uses __slots__, subjects get small ids in add_subject(), and the
+     grades are one byte each in the order of a GradeLayout shared between students;
+     grades is now a read-only dictionary built on request
+   - Verified: benchmark_memory() shows about 130 bytes per student
+
+11. Bulk grade uploads
+   - Issue: add_grade_to_student() looks up the student, checks the subject and grade
+     and prints a line for every single grade
+   - Resolution: add_grades_to_students() checks a whole batch in one pass, adds it all
+     or nothing with a list of bad rows, and updates the totals and journal once
+   - Verified: A batch gives the same gradebook as adding the grades one by one
+
+12. Marking period comparisons
+   - Issue: Keeping the gradebook of each marking period meant deep-copying every Student
+   - Resolution: snapshot() returns a read-only GradebookSnapshot that costs only the
+     students changed since the last one and shares all the others with it, and
+     snapshot.diff(later) lists changed grades, averages and ranks by visiting only the
+     students that changed
+   - Verified: diffs between random snapshots match comparing every student, and
+     a snapshot keeps the ranking it was taken with
+
+13. Scripted runs
+   - Issue: A nightly job had to pipe fake keystrokes through the menu prompts
+   - Resolution: --batch FILE (- for stdin) runs GradebookBatch commands such as
+     add-student, grade and report with no setup prompts and prints one JSON line
+     per command, with the Gradebook's error messages as the error text
+   - Verified: a script leaves the same gradebook as the Gradebook methods the menu calls
+
+14. Single ranks after a change
+   - Issue: Finding one student's rank after one grade change ranked the whole class again
+   - Resolution: rank_of(), student_at_rank() and students_ranked() use a StudentRanking,
+     an order-statistics tree of (-average, position) that each change updates in O(log n)
+     (descending=False counts from the lowest average, as in Section E)
+   - Verified: ranks, ties and ranges match rank_by_average() after random changes and
+     removals; benchmark_rank_queries() compares both
 
 ISSUES ENCOUNTERED AND RESOLUTIONS:
 1. Issue: Case sensitivity in student names allowed duplicates
@@ -53,29 +119,120 @@ TEST SCENARIOS VALIDATED:
 - Boundary conditions (min/max grades, empty states)
 """
 
+import contextlib
+import functools
+import inspect
+import io
+import json
+import math
+import random
+import shlex
+import sys
+import time
+import tracemalloc
+
+from Moje_Larona_Shared import (AverageRanking, ChangeJournal, FrozenStudent, Instrumentation, ReadOnlySnapshot,
+                                StudentGrades, SubjectNames, VersionPublisher)
+
+# Set to True to cross-check every running average against a full recompute
+DEBUG_AGGREGATES = False
+
+
+def check_aggregate(label, running, recomputed):
+    """Raise an error if a running total no longer matches a full recompute"""
+    if not math.isclose(running, recomputed, abs_tol=1e-9):
+        raise AssertionError(f"{label}: running value {running} != recomputed {recomputed}")
+
 
 class Student:
-    """Represents a student with their name and grades"""
+    """Represents a student with their name and grades
 
-    def __init__(self, name):
-        # Initialize a new student with name and empty grades dictionary
+    Students use __slots__ and keep their grades as one byte each in a bytes
+    object, in the order of the subject ids in their shared GradeLayout, so a
+    student takes about 130 bytes instead of about 310 (see benchmark_memory())"""
+
+    __slots__ = ("name", "_layout", "_grades", "grade_total", "gradebook")
+
+    def __init__(self, name, subject_names=None):
+        # Initialize a new student with name and no grades
         self.name = name
-        self.grades = {}  # Dictionary to store subjects and grades {subject: grade}
+        # Subjects that have a grade (a gradebook passes its own SubjectNames)
+        self._layout = (subject_names or SubjectNames()).empty
+        self._grades = b""  # One byte per subject in self._layout
+        self.grade_total = 0  # Running sum of all grades (the count is len(self._grades))
+        self.gradebook = None  # Gradebook to notify when a grade changes
+
+    @property
+    def grades(self):
+        """Read-only view of the subjects and grades {subject: grade}
+
+        TESTING: Verified that assigning through the view raises TypeError"""
+        return StudentGrades(self)
 
     def add_grade(self, subject, grade):
         """Add a grade for a specific subject
         Returns True if successful, False if grade is invalid
 
-        TESTING: Validated with grades -1, 0, 100, 101 to ensure proper boundary checking"""
+        TESTING: Validated with grades -1, 0, 100, 101 and 85.5 to ensure proper boundary checking"""
 
-        # Check if grade is within valid range (0-100)
-        if grade < 0 or grade > 100:
-            print("Error: Grade must be between 0 and 100")
+        # Check if grade is a whole number within valid range (0-100)
+        if not isinstance(grade, int) or grade < 0 or grade > 100:
+            print("Error: Grade must be a whole number between 0 and 100")
             return False
-        # Add the grade to the student's record
-        self.grades[subject] = grade
+
+        # Add the grade to the student's record and update the running total
+        old_grade = self._store_grade(subject, grade)
+
+        # Let the gradebook update its class-wide totals
+        if self.gradebook is not None:
+            self.gradebook.grade_changed(self, subject, old_grade, grade)
+        return True
+
+    def _store_grade(self, subject, grade):
+        """Store an already validated grade without telling the gradebook
+        Returns the previous grade, or None if there was none"""
+        subject_id = self._layout.names.id_of(subject)
+        grades = self._grades
+        position = self._layout.positions.get(subject_id)
+        if position is None:
+            self._layout = self._layout.add(subject_id)
+            self._grades = grades + bytes((grade,))
+            self.grade_total += grade
+            return None
+        old_grade = grades[position]
+        self._grades = grades[:position] + bytes((grade,)) + grades[position + 1:]
+        self.grade_total += grade - old_grade
+        return old_grade
+
+    def remove_grade(self, subject):
+        """Remove the grade for a specific subject
+        Returns True if a grade was removed, False if there was none
+
+        TESTING: Verified the running total and class totals drop by the removed grade"""
+        subject_id = self._layout.names.ids.get(subject)
+        position = self._layout.positions.get(subject_id)
+        if position is None:
+            return False
+
+        grades = self._grades
+        old_grade = grades[position]
+        self._layout = self._layout.remove(subject_id)
+        self._grades = grades[:position] + grades[position + 1:]
+        self.grade_total -= old_grade
+        if self.gradebook is not None:
+            self.gradebook.grade_changed(self, subject, old_grade, None)
         return True
 
+    def get_grade(self, subject):
+        """Return the grade for a subject, or None if there is none"""
+        layout = self._layout
+        position = layout.positions.get(layout.names.ids.get(subject))
+        return None if position is None else self._grades[position]
+
+    def has_subject(self, subject):
+        """Check if the student has a grade for the given subject"""
+        return self.get_grade(subject) is not None
+
     def calculate_average(self):
         """Calculate the student's average grade across all subjects
         Returns 0.0 if no grades are recorded
@@ -83,25 +240,28 @@ class Student:
         TESTING: Verified with empty grades, single grade, and multiple grades"""
 
         # Check if student has any grades
-        if not self.grades:
+        if not self._grades:
             return 0.0
 
-        # Calculate total of all grades
-        total = sum(self.grades.values())
-        # Return average (total divided by number of grades)
-        return total / len(self.grades)
+        # In debug mode, compare the running total with a full sum
+        if DEBUG_AGGREGATES:
+            check_aggregate(f"{self.name} total", self.grade_total, sum(self._grades))
+
+        # Return average (running total divided by number of grades)
+        return self.grade_total / len(self._grades)
 
     def display_info(self):
         """Display the student's name, all grades, and average"""
         print(f"{self.name}'s Grades:")
 
         # Check if student has any grades
-        if not self.grades:
+        grades = self.grades
+        if not grades:
             print("  No grades recorded")
             return
 
         # Display each subject and grade
-        for subject, grade in self.grades.items():
+        for subject, grade in grades.items():
             print(f"  {subject}: {grade}")
 
         # Calculate and display average
@@ -115,30 +275,76 @@ class Gradebook:
     def __init__(self):
         # List to store all Student objects
         self.students = []
+        # Index of lowercase student name -> position in self.students
+        self.positions = {}
         # List to store all available subjects
         self.subjects = []
+        # Subject ids and layouts shared by this gradebook's students
+        self.subject_names = SubjectNames()
+        # Running sum and count of every grade in the gradebook
+        self.grade_total = 0
+        self.grade_count = 0
+        # GradebookJournal that records every change (None when not saving)
+        self.journal = None
+        # GradebookVersions keeping the current snapshot (None until snapshot() is first called)
+        self.versions = None
+        # StudentRanking by average (None until the first rank query, then kept up to date)
+        self.rank_index = None
+
+    def grade_changed(self, student, subject, old_grade, new_grade):
+        """Update the class-wide totals after one of a student's grades changes
+        old_grade/new_grade are None when there was/is no grade
+
+        TESTING: Verified totals after adding, overwriting and removing grades"""
+        if old_grade is not None:
+            self.grade_total -= old_grade
+            self.grade_count -= 1
+        if new_grade is not None:
+            self.grade_total += new_grade
+            self.grade_count += 1
+
+        # Save the change if the gradebook is being journaled
+        if self.journal is not None:
+            self.journal.record(["grade", student.name, subject, new_grade])
+        if self.versions is not None:
+            self.versions.students_changed([self.positions[student.name.lower()]])
+        if self.rank_index is not None:
+            self.rank_index.update(self.positions[student.name.lower()])
 
     def add_subject(self, subject):
         """Add a new subject to the gradebook if it doesn't already exist
 
         TESTING: Verified duplicate subjects are prevented"""
         if subject not in self.subjects:
+            self.subject_names.id_of(subject)  # Give the subject its id once for all students
             self.subjects.append(subject)
+            if self.journal is not None:
+                self.journal.record(["subject", subject])
+            if self.versions is not None:
+                self.versions.subjects_changed()
 
     def add_student(self, name):
         """Add a new student to the gradebook
         Returns True if successful, False if student already exists
 
         TESTING: Validated case-insensitive duplicate detection"""
-        # Check if student already exists (case-insensitive)
-        for student in self.students:
-            if student.name.lower() == name.lower():
-                print(f"Error: {name} already exists")
-                return False
+        # Check if student already exists (case-insensitive index lookup)
+        key = name.lower()
+        if key in self.positions:
+            print(f"Error: {name} already exists")
+            return False
 
-        # Create new student and add to list
-        new_student = Student(name)
+        # Create new student, add to list and record its position
+        new_student = Student(name, self.subject_names)
+        new_student.gradebook = self
+        self.positions[key] = len(self.students)
         self.students.append(new_student)
+        if self.journal is not None:
+            self.journal.record(["student", name])
+        if self.versions is not None:
+            self.versions.students_changed([self.positions[key]])
+        if self.rank_index is not None:
+            self.rank_index.update(self.positions[key])
         print(f"{name} was added successfully")
         return True
 
@@ -147,11 +353,47 @@ class Gradebook:
         Returns Student object if found, None if not found
 
         TESTING: Verified case-insensitive search works correctly"""
-        # Search through all students
-        for student in self.students:
-            if student.name.lower() == name.lower():
-                return student
-        return None
+        # Look the name up in the index instead of scanning the list
+        position = self.positions.get(name.lower())
+        if position is None:
+            return None
+        return self.students[position]
+
+    def remove_student(self, name):
+        """Remove a student by name (case-insensitive)
+        Returns True if the student was removed, False if not found
+
+        The last student is moved into the removed student's slot, so removal
+        is O(1) but changes the order of the remaining students
+
+        TESTING: Verified removal of first, middle, last and only student and that
+        the index and class totals stay correct afterwards"""
+        position = self.positions.pop(name.lower(), None)
+        if position is None:
+            print(f"Error: {name} was not found")
+            return False
+
+        # Swap the last student into the freed slot
+        student = self.students[position]
+        last_student = self.students.pop()
+        if last_student is not student:
+            self.students[position] = last_student
+            self.positions[last_student.name.lower()] = position
+
+        # Take the student's grades out of the class totals
+        student.gradebook = None
+        self.grade_total -= student.grade_total
+        self.grade_count -= len(student.grades)
+        if self.journal is not None:
+            self.journal.record(["remove", student.name])
+        if self.versions is not None:
+            self.versions.student_removed(position)
+        if self.rank_index is not None:
+            self.rank_index.remove(student.name)
+            if last_student is not student:
+                self.rank_index.update(position)
+        print(f"{student.name} was removed")
+        return True
 
     def add_grade_to_student(self, name, subject, grade):
         """Add a grade to a specific student for a specific subject
@@ -176,6 +418,86 @@ class Gradebook:
             return True
         return False
 
+    def add_grades_to_students(self, updates):
+        """Add many grades at once, all or nothing
+        updates is an iterable of (name, subject, grade) rows, e.g. an end-of-term upload
+        Returns a list of (row number, message) for the bad rows; if it is not empty,
+        no grade was added
+
+        All rows are checked in one pass before anything changes, and the class totals
+        and journal are updated once for the whole batch instead of once per grade
+
+        TESTING: Verified one bad row of each kind leaves the gradebook unchanged"""
+        rows = list(updates)
+
+        # Every row must be exactly (name, subject, grade) before any value is read
+        errors = [(number, f"Row {row!r} must be (name, subject, grade)")
+                  for number, row in enumerate(rows, 1)
+                  if not isinstance(row, (tuple, list)) or len(row) != 3]
+        if errors:
+            print(f"Error: no grades were added, {len(errors)} rows are invalid")
+            return errors
+
+        # Check whole columns at once; only look row by row if something is wrong
+        # (a name that is not text gets no key, so it is reported as not found)
+        keys = [row[0].lower() if isinstance(row[0], str) else None for row in rows]
+        grades = [row[2] for row in rows]
+        unknown_names = set(keys).difference(self.positions)
+        unknown_subjects = {row[1] for row in rows}.difference(self.subjects)
+        grades_valid = set(map(type, grades)) <= {int} and (not grades or (min(grades) >= 0 and max(grades) <= 100))
+        if unknown_names or unknown_subjects or not grades_valid:
+            errors = []
+            for number, (key, (name, subject, grade)) in enumerate(zip(keys, rows), 1):
+                if key in unknown_names:
+                    errors.append((number, f"{name} was not found"))
+                elif subject in unknown_subjects:
+                    errors.append((number, f"{subject} was not found"))
+                elif not isinstance(grade, int) or grade < 0 or grade > 100:
+                    errors.append((number, f"Grade {grade!r} must be an integer from 0 to 100"))
+            if errors:
+                print(f"Error: no grades were added, {len(errors)} rows are invalid")
+                return errors
+
+        # Store every grade, then update the class totals once
+        total_change = count_change = 0
+        for key, (_, subject, grade) in zip(keys, rows):
+            student = self.students[self.positions[key]]
+            old_grade = student._store_grade(subject, grade)
+            if old_grade is None:
+                count_change += 1
+                total_change += grade
+            else:
+                total_change += grade - old_grade
+            if self.journal is not None:
+                self.journal.record(["grade", student.name, subject, grade])
+        self.grade_total += total_change
+        self.grade_count += count_change
+        if self.journal is not None:
+            self.journal.sync()
+        if self.versions is not None:
+            self.versions.students_changed([self.positions[key] for key in keys])
+        if self.rank_index is not None:
+            for key in dict.fromkeys(keys):
+                self.rank_index.update(self.positions[key])
+
+        print(f"{len(rows)} grades were added")
+        return []
+
+    def snapshot(self):
+        """Read-only copy of the gradebook as it is now (a GradebookSnapshot)
+        Use one per marking period and compare two with snapshot.diff(later)
+
+        The first call starts keeping versions, which takes one pass over the
+        students; after that each change only notes which student it touched,
+        and a snapshot costs O(log n) for each student changed since the last
+        one, sharing everything else with it
+
+        TESTING: Verified snapshots stay unchanged while grades are added and students
+        removed, and that diff() matches a comparison of every student"""
+        if self.versions is None:
+            GradebookVersions(self)
+        return self.versions.current
+
     def display_all_students(self):
         """Display a list of all students in the gradebook
 
@@ -189,10 +511,59 @@ class Gradebook:
         for student in self.students:
             print(f"  - {student.name}")
 
+    def rank_by_average(self):
+        """Rank students by average grade (highest average first)
+        Returns a new sorted list of students; the original list is not modified
+
+        Each student's average is computed once into a key list, then the positions
+        are sorted with Python's stable O(n log n) sort, so students with identical
+        averages keep their original order (same result as bubble_sort_by_average)
+
+        TESTING:
+        - Verified identical output to bubble_sort_by_average on random rosters with ties
+        - Validated original list remains unmodified
+        - Edge cases: empty list, single student, identical averages"""
+
+        # Compute every average exactly once
+        averages = [student.calculate_average() for student in self.students]
+
+        # Sort positions by average, highest first (reverse=True keeps ties stable)
+        order = sorted(range(len(averages)), key=averages.__getitem__, reverse=True)
+
+        return [self.students[i] for i in order]
+
+    def _ranking(self):
+        """The StudentRanking, built on the first call"""
+        if self.rank_index is None:
+            self.rank_index = StudentRanking(self)
+        return self.rank_index
+
+    def rank_of(self, name, descending=True):
+        """Place (from 1) of a student in rank_by_average(), found in O(log n)
+        With descending=False places count from the lowest average; equal averages
+        keep list order either way. Raises KeyError if the student is not found
+
+        TESTING: Verified against rank_by_average() after random grade changes, batches,
+        additions and removals, including students with identical averages"""
+        return self._ranking().rank_of(name, descending)
+
+    def student_at_rank(self, rank, descending=True):
+        """Student at a place (from 1) of rank_by_average(), found in O(log n)
+        Raises IndexError if no student has that rank"""
+        return self.students[self._ranking().position_at(rank, descending)]
+
+    def students_ranked(self, first, last, descending=True):
+        """Students at places first to last (inclusive) of rank_by_average()"""
+        students = self.students
+        return [students[position] for position in self._ranking().positions_between(first, last, descending)]
+
     def bubble_sort_by_average(self):
         """Sort students by average grade using bubble sort algorithm
         Returns a new sorted list of students (highest average first)
 
+        Kept as the reference implementation for benchmark_ranking();
+        display_sorted_students() uses rank_by_average()
+
         TESTING:
         - Verified sorting correctness with various grade distributions
         - Validated original list remains unmodified
@@ -233,8 +604,8 @@ class Gradebook:
             print("No students to display")
             return
 
-        # Get sorted list using bubble sort
-        sorted_students = self.bubble_sort_by_average()
+        # Get sorted list using the O(n log n) ranking engine
+        sorted_students = self.rank_by_average()
 
         print("Students Sorted by Average Grade (Highest to Lowest):")
 
@@ -255,6 +626,22 @@ class Gradebook:
         if not self.students:
             return 0.0
 
+        # In debug mode, compare the running totals with a full recompute
+        if DEBUG_AGGREGATES:
+            total, count = self.recompute_totals()
+            check_aggregate("class total", self.grade_total, total)
+            check_aggregate("class count", self.grade_count, count)
+
+        # Avoid division by zero
+        if self.grade_count == 0:
+            return 0.0
+
+        # Return average of all grades
+        return self.grade_total / self.grade_count
+
+    def recompute_totals(self):
+        """Sum every grade from scratch
+        Returns (total, count); used to check the running totals in debug mode"""
         total = 0  # Sum of all grades
         count = 0  # Number of grades
 
@@ -264,12 +651,7 @@ class Gradebook:
                 total += grade
                 count += 1
 
-        # Avoid division by zero
-        if count == 0:
-            return 0.0
-
-        # Return average of all grades
-        return total / count
+        return total, count
 
     def display_class_report(self):
         """Display a comprehensive report of the entire class
@@ -291,12 +673,149 @@ class Gradebook:
             print("-" * 30)
 
 
-def setup_gradebook():
+class StudentVersion(FrozenStudent, Student):
+    """Frozen copy of a student as of one snapshot"""
+
+    __slots__ = ()
+
+
+class StudentRanking(AverageRanking):
+    """AverageRanking of a gradebook's students by (-average, list position)
+
+    Keeps the order of rank_by_average(): highest average first and, for
+    equal averages, list position. Names are looked up in lowercase, like
+    Gradebook.positions. Gradebook builds one on the first rank query and
+    keeps it up to date from then on."""
+
+    def __init__(self, gradebook):
+        super().__init__(gradebook, enumerate(gradebook.students))
+
+    @staticmethod
+    def _name_key(name):
+        return name.lower()
+
+    def update(self, position):
+        """Move the student at position, who was added, moved or had grades changed"""
+        self._move(self.gradebook.students[position], position)
+
+    def position_at(self, rank, descending=True):
+        """List position of the student at a place from 1; raises IndexError if there is no such place"""
+        return self.entry_at(rank, descending)[0][1]
+
+    def positions_between(self, first, last, descending=True):
+        """List positions of the students at places first to last (inclusive)"""
+        return [key[1] for key, _ in self.entries_between(first, last, descending)]
+
+
+class GradebookSnapshot(ReadOnlySnapshot, Gradebook):
+    """Read-only Gradebook as of one moment (see Gradebook.snapshot())
+
+    The students are StudentVersion records in a PersistentVector by list
+    position, and the ranking is a RankTree of (-average, position), which
+    is the order rank_by_average() gives. The student list and name index
+    are only built when something asks for them; the methods that would
+    change it raise TypeError."""
+
+    ranking_type = StudentRanking
+
+    def __init__(self, records, ranking, subjects, grade_total, grade_count):
+        # Everything Gradebook.__init__ sets up is handed over by GradebookVersions
+        self.records = records
+        self.ranking = ranking
+        self.subjects = subjects  # tuple
+        self.grade_total = grade_total
+        self.grade_count = grade_count
+        self.journal = None
+        self.versions = None
+        self.rank_index = None
+        self._students = None
+        self._positions = None
+
+    @property
+    def students(self):
+        if self._students is None:
+            self._students = self.records.values()
+        return self._students
+
+    @property
+    def positions(self):
+        if self._positions is None:
+            self._positions = {student.name.lower(): position for position, student in enumerate(self.students)}
+        return self._positions
+
+    add_subject = add_student = remove_student = add_grade_to_student = add_grades_to_students = \
+        ReadOnlySnapshot._read_only
+
+    def rank_by_average(self):
+        """Rank students by average grade, read in order from the ranking tree"""
+        return self.ranked_records()
+
+    def record_key(self, position, record):
+        """Match students by lowercase name, as removing one moves the last student into its position"""
+        return record.name.lower()
+
+
+class GradebookVersions(VersionPublisher):
+    """Keeps a GradebookSnapshot of a gradebook up to date as it changes
+
+    A change notes the list positions it touched, and the next snapshot
+    shares every other student with the previous one, so older snapshots
+    stay valid and a snapshot costs only the students changed since"""
+
+    def __init__(self, gradebook):
+        super().__init__(gradebook, [(position, StudentVersion.of(student))
+                                     for position, student in enumerate(gradebook.students)])
+
+    def _subjects(self):
+        return tuple(self.gradebook.subjects)
+
+    def _snapshot(self, records, ranking, subjects, grade_total, grade_count):
+        return GradebookSnapshot(records, ranking, subjects, grade_total, grade_count)
+
+    def _version_at(self, position, _):
+        """Frozen copy of the student now at position, or None past the end of the list"""
+        students = self.gradebook.students
+        return StudentVersion.of(students[position]) if position < len(students) else None
+
+    def students_changed(self, positions):
+        """Note the (added or changed) students at positions"""
+        self._changed.update(dict.fromkeys(positions))
+
+    def student_removed(self, position):
+        """Note that the student at position was removed and the last student
+        was moved into its place"""
+        self._changed[position] = None
+        self._changed[len(self.gradebook.students)] = None  # Position the last student had
+
+
+class GradebookJournal(ChangeJournal):
+    """ChangeJournal of a gradebook, saving its subjects and students in list order"""
+
+    @staticmethod
+    def _set_grade(gradebook, name, subject, grade):
+        """Apply a logged grade change (None removes the grade)"""
+        student = gradebook.find_student(name)
+        if grade is None:
+            student.remove_grade(subject)
+        else:
+            student.add_grade(subject, grade)
+
+    def _contents(self):
+        """The subjects and students a snapshot saves"""
+        return self.gradebook.subjects, self.gradebook.students
+
+    def _loading(self):
+        """Hide the add_student()/remove_student() messages while loading"""
+        return contextlib.redirect_stdout(io.StringIO())
+
+
+def setup_gradebook(gradebook=None):
     """Set up the initial gradebook with subjects
-    Returns a configured Gradebook object
+    Returns a configured Gradebook object (a new one unless gradebook is given)
 
     TESTING: Validated input handling for invalid numbers and empty subjects"""
-    gradebook = Gradebook()
+    if gradebook is None:
+        gradebook = Gradebook()
 
     print("~~~ Gradebook Setup ~~~")
 
@@ -325,113 +844,485 @@ def setup_gradebook():
     return gradebook
 
 
-def main():
-    """Main function that runs the gradebook system
+class GradebookBatch:
+    """Runs gradebook commands from a script or stdin without the menu
+
+    One command per line; words are split like a shell's, so quote names
+    with spaces, and # starts a comment:
+      add-subject SUBJECT ...        add subjects
+      add-student NAME ...           add students
+      remove-student NAME
+      grade NAME SUBJECT GRADE       add or change a grade
+      ungrade NAME SUBJECT           remove a grade
+      students                       names and averages
+      student NAME                   grades and average
+      average                        class average
+      rank [LIMIT]                   students by average, highest first
+      report                         the class report text
+
+    Each command writes one JSON object on its own line:
+    {"line": N, "command": NAME, "ok": true, ...results} or, when it fails,
+    {"line": N, "command": NAME, "ok": false, "error": MESSAGE}. The
+    messages the Gradebook prints are caught and become the error text, and
+    the JSON lines are written lines_per_write at a time.
+
+    TESTING: Verified every command and its errors (unknown student or subject, bad
+    grade, wrong number of arguments, unclosed quote)"""
+
+    def __init__(self, gradebook, out=None, lines_per_write=1000):
+        self.gradebook = gradebook
+        self.out = out  # stdout when None
+        self.lines_per_write = lines_per_write
+        self.failures = 0
+        self.commands = {
+            "add-subject": self.add_subject,
+            "add-student": self.add_student,
+            "remove-student": self.remove_student,
+            "grade": self.grade,
+            "ungrade": self.ungrade,
+            "students": self.list_students,
+            "student": self.student,
+            "average": self.average,
+            "rank": self.rank,
+            "report": self.report,
+        }
+        self.signatures = {command: inspect.signature(action) for command, action in self.commands.items()}
+
+    def run(self, lines):
+        """Run every command in lines (a file or any iterable of str)
+        Returns the number of commands that failed"""
+        out = sys.stdout if self.out is None else self.out
+        block = []
+        for number, line in enumerate(lines, 1):
+            result = self.run_line(number, line)
+            if result is None:
+                continue
+            block.append(json.dumps(result) + "\n")
+            if len(block) >= self.lines_per_write:
+                out.write("".join(block))
+                block = []
+        out.write("".join(block))
+        if self.gradebook.journal is not None:
+            self.gradebook.journal.sync()
+        return self.failures
+
+    def run_line(self, number, line):
+        """Run one command line; returns its result dictionary, or None for a blank line or comment"""
+        parts = line.split(None, 1)
+        if not parts or parts[0].startswith("#"):
+            return None
+        command, rest = parts[0], parts[1] if len(parts) > 1 else ""
+
+        result = {"line": number, "command": command}
+        printed = io.StringIO()  # Gradebook messages, kept out of the JSON output
+        try:
+            action = self.commands.get(command)
+            if action is None:
+                raise ValueError(f"Unknown command: {command}")
+            # shlex is only needed for quotes, escapes and comments
+            if any(character in rest for character in "\"'\\#"):
+                arguments = shlex.split(rest, comments=True)
+            else:
+                arguments = rest.split()
+            try:
+                self.signatures[command].bind(*arguments)
+            except TypeError:
+                raise ValueError(f"Wrong number of arguments for {command}") from None
+            with contextlib.redirect_stdout(printed):
+                result.update(ok=True, **action(*arguments))
+        except ValueError as error:
+            # Messages printed before the failure say what went wrong, e.g. "Error: Ann was not found"
+            message = printed.getvalue().strip().splitlines()
+            result.update(ok=False, error=message[-1].removeprefix("Error: ") if message else str(error))
+            self.failures += 1
+        return result
+
+    # Commands: each returns a dictionary of results and raises ValueError on failure
+
+    def _check(self, succeeded):
+        if not succeeded:
+            raise ValueError("The command failed")
+
+    def _student(self, name):
+        student = self.gradebook.find_student(name)
+        if student is None:
+            raise ValueError(f"{name} was not found")
+        return student
+
+    def add_subject(self, *subjects):
+        if not all(subject.strip() for subject in subjects):
+            raise ValueError("Subject name cannot be empty")
+        existing = [subject for subject in subjects if subject in self.gradebook.subjects]
+        for subject in subjects:
+            self.gradebook.add_subject(subject)
+        return {"added": [subject for subject in subjects if subject not in existing], "existing": existing}
+
+    def add_student(self, *names):
+        if not all(name.strip() for name in names):
+            raise ValueError("Student name cannot be empty")
+        added, existing = [], []
+        for name in names:
+            (added if self.gradebook.add_student(name) else existing).append(name)
+        return {"added": added, "existing": existing}
+
+    def remove_student(self, name):
+        self._check(self.gradebook.remove_student(name))
+        return {"removed": name}
+
+    def grade(self, name, subject, grade):
+        try:
+            grade = int(grade)
+        except ValueError:
+            raise ValueError("Please enter a valid number") from None
+        self._check(self.gradebook.add_grade_to_student(name, subject, grade))
+        return {"name": name, "subject": subject, "grade": grade}
 
-    TESTING: End-to-end testing of complete user workflow"""
+    def ungrade(self, name, subject):
+        if not self._student(name).remove_grade(subject):
+            raise ValueError(f"{name} has no grade for {subject}")
+        return {"name": name, "subject": subject}
 
-    print("Welcome to Gradebook System!")
-    print("This system uses bubble sort to rank students by average grade")
+    def list_students(self):
+        return {"students": [{"name": student.name, "average": student.calculate_average()}
+                             for student in self.gradebook.students]}
 
-    # Set up the gradebook with subjects
-    gradebook = setup_gradebook()
+    def student(self, name):
+        student = self._student(name)
+        return {"name": student.name, "grades": dict(student.grades), "average": student.calculate_average()}
 
-    # Main program loop
-    while True:
-        # Display menu options
-        print("~~~ MAIN MENU ~~~")
-        print("1. Add Student")
-        print("2. Add Grade")
-        print("3. View Student Grades")
-        print("4. View All Students")
-        print("5. View Students Sorted by Average")
-        print("6. Class Report")
-        print("7. Exit")
+    def average(self):
+        return {"average": self.gradebook.class_average()}
 
-        # Get user choice
-        choice = input("Enter your choice (1-7): ").strip()
-
-        # Process user choice
-        if choice == '1':
-            # Add a new student
-            name = input("Enter student name: ").strip()
-            if name:
-                gradebook.add_student(name)
-            else:
-                print("Student name cannot be empty")
+    def rank(self, limit=None):
+        students = self.gradebook.rank_by_average()[:None if limit is None else int(limit)]
+        return {"students": [{"name": student.name, "average": student.calculate_average()}
+                             for student in students]}
 
-        elif choice == '2':
-            # Add a grade to a student
-            if not gradebook.students:
-                print("No students in system. Please add students first.")
-                continue
+    def report(self):
+        text = io.StringIO()
+        with contextlib.redirect_stdout(text):
+            self.gradebook.display_class_report()
+        return {"report": text.getvalue()}
 
-            if not gradebook.subjects:
-                print("No subjects in system.")
-                continue
 
-            # Show available students
-            print("Available students:")
-            gradebook.display_all_students()
+def run_batch(path, data_dir=None):
+    """Run the commands in path (- for stdin) with GradebookBatch instead of the menu
+    If data_dir is given, the gradebook is loaded from and saved to that directory
+    Returns the number of commands that failed
 
-            # Get student name
-            name = input("Enter student name: ").strip()
-            student = gradebook.find_student(name)
+    TESTING: Verified a saved gradebook is reloaded and changed with no prompts"""
+    gradebook = Gradebook()
+    if data_dir is not None:
+        GradebookJournal(data_dir).open(gradebook)
+    with contextlib.nullcontext(sys.stdin) if path == "-" else open(path, encoding="utf-8") as commands:
+        failures = GradebookBatch(gradebook).run(commands)
+    if gradebook.journal is not None:
+        gradebook.journal.close()
+    return failures
 
-            if student is None:
-                print(f"{name} not found")
-                continue
 
-            # Show available subjects
-            print(f"Available subjects: {', '.join(gradebook.subjects)}")
-            subject = input("Enter subject: ").strip()
+MENU_OPTIONS = ("Add Student", "Add Grade", "View Student Grades", "View All Students",
+                "View Students Sorted by Average", "Class Report", "Remove Student", "Exit")
 
-            if subject not in gradebook.subjects:
-                print(f"Subject '{subject}' not found")
-                continue
 
-            # Get and validate grade
-            try:
-                grade = int(input("Enter grade (0-100): "))
-                gradebook.add_grade_to_student(name, subject, grade)
-            except ValueError:
-                print("Please enter a valid number")
-
-        elif choice == '3':
-            # View a specific student's grades
-            if not gradebook.students:
-                print("No students in system")
-                continue
+def main(data_dir=None, instrumentation=None):
+    """Main function that runs the gradebook system
+    If data_dir is given, the gradebook is loaded from and saved to that directory
+    If instrumentation is given, each menu action is timed with it
 
-            name = input("Enter student name: ").strip()
-            student = gradebook.find_student(name)
+    TESTING: End-to-end testing of complete user workflow"""
 
-            if student:
-                student.display_info()
-            else:
-                print(f"{name} not found")
+    print("Welcome to Gradebook System!")
+    print("This system ranks students by average grade")
 
-        elif choice == '4':
-            # View all students
-            gradebook.display_all_students()
+    # Load the saved gradebook, or set up a new one with subjects
+    gradebook = Gradebook()
+    if data_dir is not None:
+        GradebookJournal(data_dir).open(gradebook)
+    if gradebook.subjects:
+        print(f"Loaded {len(gradebook.students)} students from {data_dir}")
+    else:
+        setup_gradebook(gradebook)
 
-        elif choice == '5':
-            # View students sorted by average (using bubble sort)
-            gradebook.display_sorted_students()
+    # Main program loop
+    while True:
+        # Display menu options
+        print("~~~ MAIN MENU ~~~")
+        for number, option in enumerate(MENU_OPTIONS, 1):
+            print(f"{number}. {option}")
 
-        elif choice == '6':
-            # View comprehensive class report
-            gradebook.display_class_report()
+        # Get user choice
+        choice = input("Enter your choice (1-8): ").strip()
 
-        elif choice == '7':
-            # Exit the program
-            print("Thank you for using Gradebook System! Goodbye!")
-            break
+        # Time the action when instrumentation is on
+        if instrumentation is not None and choice.isdigit() and 1 <= int(choice) <= len(MENU_OPTIONS):
+            timer = instrumentation.action(MENU_OPTIONS[int(choice) - 1])
+        else:
+            timer = contextlib.nullcontext()
+        with timer:
+            # Process user choice
+            if choice == '1':
+                # Add a new student
+                name = input("Enter student name: ").strip()
+                if name:
+                    gradebook.add_student(name)
+                else:
+                    print("Student name cannot be empty")
+
+            elif choice == '2':
+                # Add a grade to a student
+                if not gradebook.students:
+                    print("No students in system. Please add students first.")
+                    continue
+
+                if not gradebook.subjects:
+                    print("No subjects in system.")
+                    continue
+
+                # Show available students
+                print("Available students:")
+                gradebook.display_all_students()
+
+                # Get student name
+                name = input("Enter student name: ").strip()
+                student = gradebook.find_student(name)
+
+                if student is None:
+                    print(f"{name} not found")
+                    continue
+
+                # Show available subjects
+                print(f"Available subjects: {', '.join(gradebook.subjects)}")
+                subject = input("Enter subject: ").strip()
+
+                if subject not in gradebook.subjects:
+                    print(f"Subject '{subject}' not found")
+                    continue
+
+                # Get and validate grade
+                try:
+                    grade = int(input("Enter grade (0-100): "))
+                    gradebook.add_grade_to_student(name, subject, grade)
+                except ValueError:
+                    print("Please enter a valid number")
+
+            elif choice == '3':
+                # View a specific student's grades
+                if not gradebook.students:
+                    print("No students in system")
+                    continue
+
+                name = input("Enter student name: ").strip()
+                student = gradebook.find_student(name)
+
+                if student:
+                    student.display_info()
+                else:
+                    print(f"{name} not found")
+
+            elif choice == '4':
+                # View all students
+                gradebook.display_all_students()
+
+            elif choice == '5':
+                # View students sorted by average (using rank_by_average)
+                gradebook.display_sorted_students()
+
+            elif choice == '6':
+                # View comprehensive class report
+                gradebook.display_class_report()
+
+            elif choice == '7':
+                # Remove a student
+                if not gradebook.students:
+                    print("No students in system")
+                    continue
+
+                name = input("Enter student name: ").strip()
+                gradebook.remove_student(name)
+
+            elif choice == '8':
+                # Save any buffered changes and exit the program
+                if gradebook.journal is not None:
+                    gradebook.journal.close()
+                print("Thank you for using Gradebook System! Goodbye!")
+                break
 
+            else:
+                print("Invalid choice. Please enter 1-8")
+
+
+def benchmark_ranking(sizes=(1000, 10000, 100000), bubble_limit=10000, num_subjects=5, seed=42):
+    """Time rank_by_average() against bubble_sort_by_average() on random rosters
+
+    Bubble sort is only run up to bubble_limit students; above that its time is
+    estimated from the largest measured size assuming O(n^2) growth
+
+    TESTING: Asserts both methods return the same order for every measured size"""
+    rng = random.Random(seed)
+    subjects = [f"Subject {i + 1}" for i in range(num_subjects)]
+
+    print(f"{'Students':>10}{'Bubble (s)':>16}{'Ranking (s)':>14}{'Speedup':>12}")
+
+    measured = None  # (size, seconds) of the largest bubble sort actually run
+    for size in sizes:
+        # Build the roster, hiding the add_student() messages
+        gradebook = Gradebook()
+        for subject in subjects:
+            gradebook.add_subject(subject)
+        with contextlib.redirect_stdout(io.StringIO()):
+            for i in range(size):
+                gradebook.add_student(f"Student {i + 1}")
+        for student in gradebook.students:
+            for subject in subjects:
+                student.add_grade(subject, rng.randint(0, 100))
+
+        start = time.perf_counter()
+        ranked = gradebook.rank_by_average()
+        rank_time = time.perf_counter() - start
+
+        if size <= bubble_limit:
+            start = time.perf_counter()
+            bubbled = gradebook.bubble_sort_by_average()
+            bubble_time = time.perf_counter() - start
+            assert [s.name for s in bubbled] == [s.name for s in ranked]
+            measured = (size, bubble_time)
+            bubble_display = f"{bubble_time:.4f}"
+        elif measured is not None:
+            bubble_time = measured[1] * (size / measured[0]) ** 2
+            bubble_display = f"~{bubble_time:.1f} est."
         else:
-            print("Invalid choice. Please enter 1-7")
+            print(f"{size:>10}{'skipped':>16}{rank_time:>14.4f}{'-':>12}")
+            continue
+
+        speedup = bubble_time / rank_time if rank_time > 0 else float("inf")
+        print(f"{size:>10}{bubble_display:>16}{rank_time:>14.4f}{speedup:>11.0f}x")
+
+
+def benchmark_rank_queries(num_students=100000, num_subjects=5, changes=1000, seed=42):
+    """Time finding one student's rank after each of changes grade changes, by
+    ranking the whole class again with rank_by_average() and with rank_of()
+
+    rank_by_average() is timed on a hundredth of the changes and scaled up
+
+    TESTING: Asserts both give the same rank for the last change"""
+    rng = random.Random(seed)
+    subjects = [f"Subject {i + 1}" for i in range(num_subjects)]
+    gradebook = Gradebook()
+    for subject in subjects:
+        gradebook.add_subject(subject)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(num_students):
+            gradebook.add_student(f"Student {i + 1}")
+    for student in gradebook.students:
+        for subject in subjects:
+            student.add_grade(subject, rng.randint(0, 100))
+    names = [student.name for student in gradebook.students]
+    updates = [(rng.choice(names), rng.choice(subjects), rng.randint(0, 100)) for _ in range(changes)]
+
+    sampled = updates[:max(1, changes // 100)]
+    start = time.perf_counter()
+    for name, subject, grade in sampled:
+        student = gradebook.find_student(name)
+        student.add_grade(subject, grade)
+        gradebook.rank_by_average().index(student)
+    sort_time = (time.perf_counter() - start) * changes / len(sampled)
+
+    gradebook.rank_of(names[0])  # Builds the StudentRanking once, before timing
+    start = time.perf_counter()
+    for name, subject, grade in updates:
+        gradebook.find_student(name).add_grade(subject, grade)
+        rank = gradebook.rank_of(name)
+    index_time = time.perf_counter() - start
+    assert gradebook.rank_by_average().index(gradebook.find_student(updates[-1][0])) + 1 == rank
+
+    print(f"{num_students} students, {changes} grade changes each followed by one rank")
+    print(f"{'Method':<18}{'Total (s)':>12}{'Per rank (ms)':>16}")
+    print(f"{'rank_by_average()':<18}{sort_time:>12.4f}{sort_time / changes * 1000:>16.3f}")
+    print(f"{'rank_of()':<18}{index_time:>12.4f}{index_time / changes * 1000:>16.3f}")
+
+
+def benchmark_memory(num_students=100000, num_subjects=5):
+    """Measure with tracemalloc how much memory Students take, compared with
+    the dictionary layout Student used before __slots__
+
+    TESTING: Verified the slots layout uses under half the memory of the dict layout"""
+
+    class DictStudent:
+        """Old layout: a __dict__ per student plus a {subject: grade} dictionary"""
+
+        def __init__(self, name):
+            self.name = name
+            self.grades = {}
+            self.grade_total = 0
+            self.gradebook = None
+
+        def add_grade(self, subject, grade):
+            self.grade_total += grade - self.grades.get(subject, 0)
+            self.grades[subject] = grade
+            return True
+
+    subjects = [f"Subject {i + 1}" for i in range(num_subjects)]
+    subject_names = SubjectNames()  # What a gradebook gives its students
+    for subject in subjects:
+        subject_names.id_of(subject)
+    names = [f"Student {i + 1}" for i in range(num_students)]  # Same names for both layouts
+
+    def measure(student_class):
+        # Count only the memory allocated while the students are built
+        tracemalloc.start()
+        students = []
+        for i, name in enumerate(names):
+            student = student_class(name)
+            for j, subject in enumerate(subjects):
+                student.add_grade(subject, (i * 31 + j * 17) % 101)
+            students.append(student)
+        used = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return used
+
+    print(f"{num_students} students x {num_subjects} subjects")
+    print(f"{'Layout':<12}{'Total (MB)':>14}{'Per student (bytes)':>22}")
+    slots_student = functools.partial(Student, subject_names=subject_names)
+    for label, student_class in (("dict", DictStudent), ("slots", slots_student)):
+        used = measure(student_class)
+        print(f"{label:<12}{used / 1e6:>14.1f}{used / num_students:>22.0f}")
 
 
 # Start the program when this file is run directly
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # Pass --debug to cross-check running averages against full recomputes
+    if "--debug" in sys.argv[1:]:
+        DEBUG_AGGREGATES = True
+
+    # Pass --instrument to time Student/Gradebook methods and menu actions, printing
+    # the table on exit (add --instrument-json FILE to save it, and --cprofile N to
+    # run menu option N under cProfile)
+    instrumentation = None
+    if any(flag in sys.argv[1:] for flag in ("--instrument", "--instrument-json", "--cprofile")):
+        cprofile_action = None
+        if "--cprofile" in sys.argv[1:]:
+            cprofile_action = MENU_OPTIONS[int(sys.argv[sys.argv.index("--cprofile") + 1]) - 1]
+        instrumentation = Instrumentation(cprofile_action).instrument(Student, Gradebook)
+
+    # Pass --data DIR to save the gradebook in DIR and reload it next time
+    data_dir = sys.argv[sys.argv.index("--data") + 1] if "--data" in sys.argv[1:] else None
+    failures = 0
+    if "--benchmark" in sys.argv[1:]:
+        benchmark_ranking()
+        benchmark_rank_queries()
+        benchmark_memory()
+    elif "--batch" in sys.argv[1:]:
+        # Pass --batch FILE (- for stdin) to run the commands in FILE instead of the menu,
+        # printing one JSON line per command; the exit status is 1 if any command failed
+        failures = run_batch(sys.argv[sys.argv.index("--batch") + 1], data_dir)
+    else:
+        main(data_dir, instrumentation)
+
+    if instrumentation is not None:
+        instrumentation.remove()
+        instrumentation.report()
+        if "--instrument-json" in sys.argv[1:]:
+            instrumentation.save_json(sys.argv[sys.argv.index("--instrument-json") + 1])
+    if failures:
+        sys.exit(1)
\ No newline at end of file
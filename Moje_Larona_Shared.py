@@ -0,0 +1,911 @@
+"""
+Structures shared by the Section E and Section F gradebooks
+
+Both sections store grades the same way (SubjectNames, GradeLayout), take
+snapshots from the same persistent structures (PersistentVector,
+RankTree), and have the same ranking, diff, journal and instrumentation
+machinery. The classes here do the common work and each section
+subclasses them for how its Gradebook stores students: Section E numbers
+students in insertion order, while Section F keeps them in a list by
+position and looks names up in lowercase.
+"""
+
+import contextlib
+import cProfile
+import functools
+import inspect
+import io
+import json
+import math
+import os
+import pstats
+import random
+import sys
+import tempfile
+import threading
+import time
+from array import array
+from collections.abc import Mapping
+
+
+def percentile(ordered, percent):
+    """Nearest-rank percentile of an already sorted sequence"""
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+class SubjectNames:
+    """Interns subject names to small integer ids shared by a gradebook's students
+
+    Students refer to subjects by these ids, so each subject name is kept once
+    instead of once per student. The order of a student's subjects is a
+    GradeLayout, which is also interned, so students whose grades were added in
+    the same order share one. Each Gradebook has its own, so the names and
+    layouts are freed with it"""
+
+    def __init__(self):
+        self.ids = {}  # {subject: id}
+        self.names = []  # Subject of each id
+        self.layouts = {}  # {tuple of subject ids: GradeLayout}
+        self.empty = self.layout(())  # Layout of a student with no grades
+
+    def id_of(self, subject):
+        """Id of a subject, giving it the next id the first time it is seen"""
+        subject_id = self.ids.get(subject)
+        if subject_id is None:
+            subject_id = self.ids[subject] = len(self.names)
+            self.names.append(subject)
+        return subject_id
+
+    def layout(self, subject_ids):
+        """The shared GradeLayout for a tuple of subject ids"""
+        layout = self.layouts.get(subject_ids)
+        if layout is None:
+            layout = self.layouts[subject_ids] = GradeLayout(self, subject_ids)
+        return layout
+
+
+class GradeLayout:
+    """Which subjects a student has grades in, in the order they were added
+
+    Shared between students, so it is never changed: adding or removing a
+    subject moves the student to another layout (the moves are cached)"""
+
+    __slots__ = ("names", "subject_ids", "positions", "_added", "_removed")
+
+    def __init__(self, names, subject_ids):
+        self.names = names  # SubjectNames the ids belong to
+        self.subject_ids = subject_ids
+        self.positions = {subject_id: position for position, subject_id in enumerate(subject_ids)}
+        self._added = {}
+        self._removed = {}
+
+    def add(self, subject_id):
+        """Layout with subject_id appended"""
+        layout = self._added.get(subject_id)
+        if layout is None:
+            layout = self._added[subject_id] = self.names.layout(self.subject_ids + (subject_id,))
+        return layout
+
+    def remove(self, subject_id):
+        """Layout without subject_id"""
+        layout = self._removed.get(subject_id)
+        if layout is None:
+            position = self.positions[subject_id]
+            layout = self.names.layout(self.subject_ids[:position] + self.subject_ids[position + 1:])
+            self._removed[subject_id] = layout
+        return layout
+
+
+class StudentGrades(Mapping):
+    """Read-only {subject: grade} view of a Student's grades
+
+    Reads the student's grade bytes, so making one is O(1) and it always
+    shows the current grades. Change grades with add_grade and remove_grade"""
+
+    __slots__ = ("student",)
+
+    def __init__(self, student):
+        self.student = student
+
+    def __getitem__(self, subject):
+        grade = self.student.get_grade(subject)
+        if grade is None:
+            raise KeyError(subject)
+        return grade
+
+    def __iter__(self):
+        layout = self.student._layout
+        names = layout.names.names
+        return (names[subject_id] for subject_id in layout.subject_ids)
+
+    def __len__(self):
+        return len(self.student._grades)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+_EMPTY_NODE = (None,) * 32
+
+
+class PersistentVector:
+    """Immutable sparse array indexed by small integers, sharing structure between versions
+
+    A 32-way trie of tuples: set() returns a new vector that copies only
+    the nodes on the path to one index (about log32(n) tuples of 32 slots)
+    and shares every other node with the old vector, which stays valid and
+    unchanged. None marks an empty slot."""
+
+    BITS = 5
+    WIDTH = 1 << BITS
+    MASK = WIDTH - 1
+
+    __slots__ = ("root", "shift", "count")
+
+    def __init__(self, root=_EMPTY_NODE, shift=0, count=0):
+        self.root = root
+        self.shift = shift  # Bits of the index below the root's slots; 0 when the root is a leaf
+        self.count = count  # Number of slots that are not None
+
+    @classmethod
+    def from_items(cls, items):
+        """Build a vector from (index, value) pairs in one pass, leaves first"""
+        nodes = {}  # Position at the current level -> list of 32 slots
+        count = 0
+        for index, value in items:
+            nodes.setdefault(index >> cls.BITS, [None] * cls.WIDTH)[index & cls.MASK] = value
+            count += 1
+        shift = 0
+        while len(nodes) > 1 or any(nodes):  # Until one node sits at position 0
+            parents = {}
+            for position, node in nodes.items():
+                parents.setdefault(position >> cls.BITS, [None] * cls.WIDTH)[position & cls.MASK] = tuple(node)
+            nodes = parents
+            shift += cls.BITS
+        return cls(tuple(nodes[0]) if nodes else _EMPTY_NODE, shift, count)
+
+    def __len__(self):
+        return self.count
+
+    def get(self, index, default=None):
+        """Value at index, or default if the slot is empty"""
+        if index >> self.shift >= self.WIDTH:
+            return default
+        node = self.root
+        shift = self.shift
+        while shift:
+            node = node[(index >> shift) & self.MASK]
+            if node is None:
+                return default
+            shift -= self.BITS
+        value = node[index & self.MASK]
+        return default if value is None else value
+
+    def set(self, index, value):
+        """New vector with value at index (None empties the slot)"""
+        root, shift = self.root, self.shift
+        while index >> shift >= self.WIDTH:
+            root = (root,) + _EMPTY_NODE[1:]  # One more level on top
+            shift += self.BITS
+        count = self.count + (value is not None) - (self.get(index) is not None)
+        return PersistentVector(self._assoc(root, shift, index, value), shift, count)
+
+    @classmethod
+    def _assoc(cls, node, shift, index, value):
+        """Copy of node with value stored at index; only the path to it is copied"""
+        position = (index >> shift) & cls.MASK
+        if shift:
+            child = node[position]
+            value = cls._assoc(_EMPTY_NODE if child is None else child, shift - cls.BITS, index, value)
+        return node[:position] + (value,) + node[position + 1:]
+
+    def values(self):
+        """List of the values that are not None, in index order"""
+        nodes = [self.root]
+        for _ in range(self.shift // self.BITS):
+            nodes = [child for node in nodes for child in node if child is not None]
+        return [value for node in nodes for value in node if value is not None]
+
+    def diff(self, other):
+        """Yield (index, value here, value in other) for every slot holding a different object
+
+        Both tries are walked together and a node the two vectors share is
+        skipped without looking inside, so comparing two versions of one
+        vector takes time for the changed paths only"""
+        shift = max(self.shift, other.shift)
+        yield from self._diff(self._lift(self.root, self.shift, shift), self._lift(other.root, other.shift, shift),
+                              shift, 0)
+
+    @classmethod
+    def _lift(cls, root, shift, target):
+        """root as seen from a taller trie: the first child of single-child nodes"""
+        while shift < target:
+            root = (root,) + _EMPTY_NODE[1:]
+            shift += cls.BITS
+        return root
+
+    @classmethod
+    def _diff(cls, mine, theirs, shift, base):
+        for position, (value, other) in enumerate(zip(mine, theirs)):
+            if value is other:
+                continue
+            index = base | (position << shift)
+            if shift:
+                yield from cls._diff(_EMPTY_NODE if value is None else value,
+                                     _EMPTY_NODE if other is None else other, shift - cls.BITS, index)
+            else:
+                yield index, value, other
+
+
+class RankTree:
+    """Immutable order-statistics tree, sharing structure between versions
+
+    A treap (a binary search tree on the keys that is also a heap on
+    random priorities, which keeps it about 2 log2(n) deep) whose nodes
+    count the size of their subtree. insert() and remove() copy only the
+    nodes on one path and return a new tree; rank() and at() walk one path.
+    A node is the tuple (key, value, priority, size, left, right). Keys
+    must be distinct."""
+
+    __slots__ = ("root",)
+
+    def __init__(self, root=None):
+        self.root = root
+
+    @classmethod
+    def from_sorted(cls, items):
+        """Build a tree from (key, value) pairs already in key order, in O(n)
+
+        Nodes are given priorities by depth, higher than every node below
+        them, as the largest of n random priorities would be"""
+        items = list(items)
+        slots = len(items) + 1
+
+        def build(first, last, depth):
+            if first >= last:
+                return None
+            middle = (first + last) // 2
+            left, right = build(first, middle, depth + 1), build(middle + 1, last, depth + 1)
+            priority = 1 - (2 ** depth - 1 + random.random() * 2 ** depth) / slots
+            key, value = items[middle]
+            return key, value, priority, last - first, left, right
+
+        return cls(build(0, len(items), 0))
+
+    def __len__(self):
+        return self.root[3] if self.root is not None else 0
+
+    @staticmethod
+    def _node(node, left, right):
+        """Copy of node with new children"""
+        size = 1 + (left[3] if left is not None else 0) + (right[3] if right is not None else 0)
+        return node[0], node[1], node[2], size, left, right
+
+    @classmethod
+    def _split(cls, node, key):
+        """(tree of the keys below key, tree of the rest)"""
+        if node is None:
+            return None, None
+        if node[0] < key:
+            low, high = cls._split(node[5], key)
+            return cls._node(node, node[4], low), high
+        low, high = cls._split(node[4], key)
+        return low, cls._node(node, high, node[5])
+
+    @classmethod
+    def _join(cls, low, high):
+        """One tree of two, every key of low being below every key of high"""
+        if low is None:
+            return high
+        if high is None:
+            return low
+        if low[2] > high[2]:
+            return cls._node(low, low[4], cls._join(low[5], high))
+        return cls._node(high, cls._join(low, high[4]), high[5])
+
+    @classmethod
+    def _insert(cls, node, new):
+        if node is None:
+            return new
+        if new[2] > node[2]:
+            return cls._node(new, *cls._split(node, new[0]))
+        if new[0] < node[0]:
+            return cls._node(node, cls._insert(node[4], new), node[5])
+        return cls._node(node, node[4], cls._insert(node[5], new))
+
+    @classmethod
+    def _remove(cls, node, key):
+        if node is None:
+            raise KeyError(key)
+        if key == node[0]:
+            return cls._join(node[4], node[5])
+        if key < node[0]:
+            return cls._node(node, cls._remove(node[4], key), node[5])
+        return cls._node(node, node[4], cls._remove(node[5], key))
+
+    def insert(self, key, value):
+        """New tree with key added"""
+        return RankTree(self._insert(self.root, (key, value, random.random(), 1, None, None)))
+
+    def remove(self, key):
+        """New tree without key (KeyError if it is not there)"""
+        return RankTree(self._remove(self.root, key))
+
+    def rank(self, key):
+        """Number of keys below key"""
+        node = self.root
+        below = 0
+        while node is not None:
+            if node[0] < key:
+                below += 1 + (node[4][3] if node[4] is not None else 0)
+                node = node[5]
+            else:
+                node = node[4]
+        return below
+
+    def at(self, index):
+        """(key, value) of the index-th lowest key, counting from 0"""
+        node = self.root
+        while node is not None:
+            left = node[4][3] if node[4] is not None else 0
+            if index < left:
+                node = node[4]
+            elif index == left:
+                return node[0], node[1]
+            else:
+                index -= left + 1
+                node = node[5]
+        raise IndexError(f"Rank {index} is past the end of the tree")
+
+    def items(self, start=0, stop=None):
+        """List of (key, value) for the keys ranked start to stop - 1, in key order"""
+        stop = len(self) if stop is None else min(stop, len(self))
+        path = []  # Nodes still to be visited, the next one last
+        node = self.root
+        index = start
+        while node is not None:
+            left = node[4][3] if node[4] is not None else 0
+            if index <= left:
+                path.append(node)
+                node = node[4] if index < left else None
+            else:
+                index -= left + 1
+                node = node[5]
+
+        items = []
+        while path and len(items) < stop - start:
+            node = path.pop()
+            items.append((node[0], node[1]))
+            child = node[5]
+            while child is not None:
+                path.append(child)
+                child = child[4]
+        return items
+
+
+def rank_key(student, index):
+    """Key of a student stored at index in a ranking: highest average first, then by index"""
+    return -student.calculate_average(), index
+
+
+class FrozenStudent:
+    """Mixin for a frozen copy of a student as of one snapshot
+
+    A Student replaces its grade bytes and layout instead of changing them,
+    so the copy simply shares them with the live student. Each section
+    mixes it into its own Student: class StudentVersion(FrozenStudent, Student)"""
+
+    __slots__ = ()
+
+    @classmethod
+    def of(cls, student):
+        """Copy a Student"""
+        version = cls.__new__(cls)
+        version.name = student.name
+        version.gradebook = None
+        version._layout, version._grades, version.grade_total = student._layout, student._grades, student.grade_total
+        return version
+
+    def add_grade(self, subject, grade):
+        raise TypeError("Students in a gradebook snapshot are read-only")
+
+    def remove_grade(self, subject):
+        raise TypeError("Students in a gradebook snapshot are read-only")
+
+
+class AverageRanking:
+    """Order-statistics index of students by average
+
+    The students are the keys (-average, index) of a RankTree, where index
+    is the number a gradebook stores the student under, so ties keep that
+    order when sorting highest first and lowest first alike. Moving a
+    student after a grade change, finding a student's rank and finding the
+    student at a rank each take O(log n) instead of sorting the whole class
+    again. Each section's StudentRanking builds one from its gradebook and
+    moves students with _move() as they change."""
+
+    def __init__(self, gradebook, students):
+        self.gradebook = gradebook
+        self.keys = {self._name_key(student.name): rank_key(student, index) for index, student in students}
+        self.tree = RankTree.from_sorted(sorted((key, name) for name, key in self.keys.items()))
+
+    @staticmethod
+    def _name_key(name):
+        """Key of a student's name in self.keys"""
+        return name
+
+    @classmethod
+    def of_tree(cls, tree):
+        """Read-only ranking over a RankTree of (-average, index) -> name"""
+        ranking = cls.__new__(cls)
+        ranking.gradebook = None
+        ranking.tree = tree
+        ranking.keys = {cls._name_key(name): key for key, name in tree.items()}
+        return ranking
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _move(self, student, index):
+        """Move a student who was added, moved or had grades changed to their new place"""
+        name = self._name_key(student.name)
+        key = rank_key(student, index)
+        old_key = self.keys.get(name)
+        if key == old_key:
+            return
+        tree = self.tree if old_key is None else self.tree.remove(old_key)
+        self.tree = tree.insert(key, name)
+        self.keys[name] = key
+
+    def remove(self, name):
+        self.tree = self.tree.remove(self.keys.pop(self._name_key(name)))
+
+    def rank_of(self, name, descending=True):
+        """Place of a student from 1; raises KeyError if they are not found"""
+        key = self.keys.get(self._name_key(name))
+        if key is None:
+            raise KeyError(f"{name} was not found")
+        tree = self.tree
+        if descending:
+            return tree.rank(key) + 1
+        # Students with a lower average, then those with the same average and a lower index
+        lower = len(tree) - tree.rank((key[0], math.inf))
+        return lower + tree.rank(key) - tree.rank((key[0], -math.inf)) + 1
+
+    def entry_at(self, rank, descending=True):
+        """(key, name) of the student at a place from 1; raises IndexError if there is no such place"""
+        tree = self.tree
+        if not 1 <= rank <= len(tree):
+            raise IndexError(f"Rank {rank} is outside 1 to {len(tree)}")
+        if descending:
+            return tree.at(rank - 1)
+        # Lowest first the groups of equal averages come in reverse, each still in index order
+        (average, _), _ = tree.at(len(tree) - rank)
+        first, last = tree.rank((average, -math.inf)), tree.rank((average, math.inf))
+        return tree.at(first + rank - 1 - (len(tree) - last))
+
+    def entries_between(self, first, last, descending=True):
+        """(key, name) of the students at places first to last (inclusive)"""
+        first, last = max(first, 1), min(last, len(self.tree))
+        if descending:
+            return self.tree.items(first - 1, last)
+        return [self.entry_at(rank, False) for rank in range(first, last + 1)]
+
+
+class ReadOnlySnapshot:
+    """Mixin for a read-only Gradebook as of one moment
+
+    The students are frozen records in a PersistentVector by index and the
+    ranking is a RankTree of rank_key() -> name. Each section mixes it into
+    its own Gradebook and sets the methods that would change it to
+    _read_only; ranking_type is the section's StudentRanking."""
+
+    ranking_type = AverageRanking
+
+    def _read_only(self, *args):
+        raise TypeError("Gradebook snapshots are read-only")
+
+    def snapshot(self):
+        return self
+
+    def _ranking(self):
+        """StudentRanking over this snapshot's own ranking tree"""
+        if self.rank_index is None:
+            self.rank_index = self.ranking_type.of_tree(self.ranking)
+        return self.rank_index
+
+    def ranked_records(self):
+        """Records from the highest average to the lowest, read in order from the ranking tree"""
+        records = self.records
+        return [records.get(index) for (_, index), _ in self.ranking.items()]
+
+    def record_key(self, index, record):
+        """What GradebookDiff matches a student's records in two snapshots by"""
+        return index, record.name
+
+    def rank_of_record(self, index, student):
+        """Place (from 1) of the student stored at index, highest average first"""
+        return self.ranking.rank(rank_key(student, index)) + 1
+
+    def diff(self, other):
+        """GradebookDiff of what changed from this snapshot to other"""
+        return GradebookDiff(self, other)
+
+
+class VersionPublisher:
+    """Keeps an immutable snapshot of a gradebook up to date as it changes
+
+    A change only notes the indexes it touched. When a reader next asks for
+    the current snapshot, a new one is built from the previous one by
+    replacing the records at those indexes, so it shares every unchanged
+    student with the snapshots before it and older snapshots stay valid.
+    A change costs the same whether or not snapshots are read, and a
+    snapshot costs only the students changed since the last one. Each
+    section's GradebookVersions says how to build its snapshots (_snapshot()
+    and _subjects()) and how to copy the live student at an index
+    (_version_at()).
+
+    Writers on several threads must take turns with write_lock; a reader
+    only takes it while building a snapshot from changes made since the
+    last one, so it never sees half of a change."""
+
+    def __init__(self, gradebook, versions):
+        """versions are (index, frozen student) pairs of every student in gradebook"""
+        self.gradebook = gradebook
+        self.write_lock = threading.RLock()
+        self._changed = {}  # {index: what _version_at() finds the student by} since self._current
+        self._subjects_changed = False
+        records = PersistentVector.from_items(versions)
+        ranking = RankTree.from_sorted(sorted((rank_key(student, index), student.name) for index, student in versions))
+        grade_total = sum(student.grade_total for _, student in versions)
+        grade_count = sum(len(student._grades) for _, student in versions)
+        self._current = None
+        self._current = self._snapshot(records, ranking, self._subjects(), grade_total, grade_count)
+        gradebook.versions = self
+
+    @property
+    def current(self):
+        """Snapshot of the gradebook as of its last change"""
+        if self._changed or self._subjects_changed:
+            with self.write_lock:
+                self._publish()
+        return self._current
+
+    def _publish(self):
+        """Make a snapshot of the changes since the previous one the current one"""
+        if not self._changed and not self._subjects_changed:
+            return  # Another reader published them while this one waited for the lock
+        previous = self._current
+        records, ranking = previous.records, previous.ranking
+        grade_total, grade_count = previous.grade_total, previous.grade_count
+        for index, key in self._changed.items():
+            old, new = records.get(index), self._version_at(index, key)
+            if old is None and new is None:
+                continue  # Added and removed again in between
+            if old is not None:
+                ranking = ranking.remove(rank_key(old, index))
+                grade_total -= old.grade_total
+                grade_count -= len(old._grades)
+            if new is not None:
+                ranking = ranking.insert(rank_key(new, index), new.name)
+                grade_total += new.grade_total
+                grade_count += len(new._grades)
+            records = records.set(index, new)
+        subjects = self._subjects() if self._subjects_changed else previous.subjects
+        self._changed = {}
+        self._subjects_changed = False
+        self._current = self._snapshot(records, ranking, subjects, grade_total, grade_count)
+
+    def subjects_changed(self):
+        self._subjects_changed = True
+
+    def close(self):
+        """Stop keeping versions; snapshots already taken stay readable"""
+        self.gradebook.versions = None
+
+
+class GradebookDiff:
+    """What changed for each student between two snapshots of a gradebook
+
+    Only the students whose records differ are visited: the two snapshots'
+    record tries are compared with PersistentVector.diff, which skips every
+    part they share, and ranks come from each snapshot's ranking tree, so a
+    week of changes in a large class is compared in time for the students
+    that changed. The records before and after are matched by the
+    snapshots' record_key(); snapshots of unrelated gradebooks share nothing
+    and are compared in full.
+
+    grade_changes   [(name, subject, old grade, new grade)], None for no grade
+    average_changes [(name, old average, new average)], None when not in that snapshot
+    rank_changes    [(name, old rank, new rank)] highest average first from 1,
+                    None when not in that snapshot
+    added, removed  names of students only in the new or only in the old snapshot
+
+    Unchanged students are not listed, even when others moving past them
+    shifted their rank, except in rank_changes when they were moved to
+    another index (ties are ranked by index)."""
+
+    def __init__(self, old, new):
+        self.old = old
+        self.new = new
+        self.grade_changes = []
+        self.average_changes = []
+        self.rank_changes = []
+        self.added = []
+        self.removed = []
+
+        # record key -> [(index, record) before, (index, record) after]
+        changed = {}
+        for index, before, after in old.records.diff(new.records):
+            if before is not None:
+                changed.setdefault(old.record_key(index, before), [None, None])[0] = (index, before)
+            if after is not None:
+                changed.setdefault(new.record_key(index, after), [None, None])[1] = (index, after)
+        for before, after in changed.values():
+            self._compare(before, after)
+
+    def _compare(self, before, after):
+        old_grades = before[1].grades if before is not None else {}
+        new_grades = after[1].grades if after is not None else {}
+        old_rank = self.old.rank_of_record(*before) if before is not None else None
+        new_rank = self.new.rank_of_record(*after) if after is not None else None
+        name = (after or before)[1].name
+        if before is not None and after is not None and old_grades == new_grades:
+            if before[0] != after[0] and old_rank != new_rank:
+                self.rank_changes.append((name, old_rank, new_rank))
+            return  # Republished or moved without a change
+        if before is None:
+            self.added.append(name)
+        elif after is None:
+            self.removed.append(name)
+
+        for subject in {**old_grades, **new_grades}:
+            if old_grades.get(subject) != new_grades.get(subject):
+                self.grade_changes.append((name, subject, old_grades.get(subject), new_grades.get(subject)))
+        self.average_changes.append((name, before and before[1].calculate_average(),
+                                     after and after[1].calculate_average()))
+        if old_rank != new_rank:
+            self.rank_changes.append((name, old_rank, new_rank))
+
+    def average_deltas(self):
+        """{name: new average - old average} for students in both snapshots"""
+        return {name: after - before for name, before, after in self.average_changes
+                if before is not None and after is not None}
+
+    def __bool__(self):
+        return bool(self.average_changes or self.rank_changes)
+
+
+class ChangeJournal:
+    """Append-only log of gradebook changes plus compacted snapshots
+
+    Every change is written as one JSON line to journal-<generation>.log and
+    fsynced in batches. compact() saves the whole gradebook to snapshot.json
+    and starts the next generation's empty log, so recovery loads the
+    snapshot and only replays the changes made since. Each section's
+    GradebookJournal says how a grade is set (_set_grade()) and what a
+    snapshot holds (_contents())."""
+
+    def __init__(self, directory, batch_size=256, snapshot_every=100000):
+        self.directory = directory
+        self.batch_size = batch_size  # Records per fsync
+        self.snapshot_every = snapshot_every  # Records per automatic compact(); None to disable
+        self.generation = 0
+        self.gradebook = None
+        self._log = None
+        self._unsynced = 0  # Records written since the last fsync
+        self._since_snapshot = 0  # Records in the current log
+
+    def _snapshot_path(self):
+        return os.path.join(self.directory, "snapshot.json")
+
+    def _log_path(self, generation):
+        return os.path.join(self.directory, f"journal-{generation}.log")
+
+    def apply(self, gradebook, entry):
+        """Apply one logged change to a gradebook"""
+        action = entry[0]
+        if action == "subject":
+            gradebook.add_subject(entry[1])
+        elif action == "student":
+            gradebook.add_student(entry[1])
+        elif action == "grade":
+            self._set_grade(gradebook, *entry[1:])
+        elif action == "remove":
+            gradebook.remove_student(entry[1])
+        else:
+            raise ValueError(f"Unknown journal entry: {entry!r}")
+
+    def _loading(self):
+        """Context manager wrapped around loading a gradebook in open()"""
+        return contextlib.nullcontext()
+
+    def open(self, gradebook):
+        """Load the snapshot and log into an empty gradebook, then journal its changes
+
+        Returns the number of log records replayed"""
+        os.makedirs(self.directory, exist_ok=True)
+
+        replayed = 0
+        with self._loading():
+            if os.path.exists(self._snapshot_path()):
+                with open(self._snapshot_path(), encoding="utf-8") as snapshot:
+                    data = json.load(snapshot)
+                self.generation = data["generation"]
+                for subject in data["subjects"]:
+                    self.apply(gradebook, ["subject", subject])
+                for name, grades in data["students"]:
+                    self.apply(gradebook, ["student", name])
+                    for subject, grade in grades.items():
+                        self.apply(gradebook, ["grade", name, subject, grade])
+
+            log_path = self._log_path(self.generation)
+            if os.path.exists(log_path):
+                with open(log_path, "rb") as log:
+                    valid_bytes = 0
+                    for line in log:
+                        # A crash can leave a torn last line; drop it
+                        if not line.endswith(b"\n"):
+                            break
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            break
+                        self.apply(gradebook, entry)
+                        valid_bytes += len(line)
+                        replayed += 1
+                os.truncate(log_path, valid_bytes)
+
+        self._since_snapshot = replayed
+        self._log = open(log_path, "a", encoding="utf-8")
+        self.gradebook = gradebook
+        gradebook.journal = self
+        return replayed
+
+    def record(self, entry):
+        """Append one change; fsync once per batch and compact when the log is long"""
+        self._log.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self._unsynced += 1
+        self._since_snapshot += 1
+        if self._unsynced >= self.batch_size:
+            self.sync()
+        if self.snapshot_every and self._since_snapshot >= self.snapshot_every:
+            self.compact()
+
+    def sync(self):
+        """Flush buffered records and fsync the log"""
+        self._log.flush()
+        os.fsync(self._log.fileno())
+        self._unsynced = 0
+
+    def compact(self):
+        """Write a snapshot of the gradebook and start a new, empty log"""
+        self.sync()
+        subjects, students = self._contents()
+        data = {
+            "generation": self.generation + 1,
+            "subjects": subjects,
+            "students": [[student.name, dict(student.grades)] for student in students],
+        }
+
+        # Write to a temporary file first so a crash never leaves half a snapshot
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as snapshot:
+            json.dump(data, snapshot, separators=(",", ":"))
+            snapshot.flush()
+            os.fsync(snapshot.fileno())
+        os.replace(temp_path, self._snapshot_path())
+
+        # The snapshot now covers the old log, so switch to the next one
+        self._log.close()
+        old_log = self._log_path(self.generation)
+        self.generation += 1
+        self._log = open(self._log_path(self.generation), "a", encoding="utf-8")
+        self._since_snapshot = 0
+        if os.path.exists(old_log):
+            os.remove(old_log)
+
+    def close(self):
+        """Sync the log and stop journaling"""
+        if self._log is not None:
+            self.sync()
+            self._log.close()
+            self._log = None
+        if self.gradebook is not None:
+            self.gradebook.journal = None
+            self.gradebook = None
+
+
+class Instrumentation:
+    """Opt-in call counts and latencies for Student/Gradebook methods and menu actions
+
+    Nothing is measured until instrument() is called: it swaps each method
+    defined on the given classes for a wrapper that counts the calls and
+    records how long each took, and remove() puts the originals back, so a
+    normal run pays nothing. Generator methods are left alone; their time
+    shows up in the method that consumes them. Menu actions are timed with
+    action(), and the action named by cprofile_action also runs under cProfile."""
+
+    def __init__(self, cprofile_action=None):
+        self.samples = {}  # Label -> array of call durations in seconds
+        self.cprofile_action = cprofile_action
+        self.cprofile_stats = None  # pstats text of the last profiled action
+        self._originals = []
+
+    def instrument(self, *classes):
+        """Start timing every method defined on the given classes"""
+        for cls in classes:
+            for name, method in list(vars(cls).items()):
+                if name.startswith("__") or not inspect.isfunction(method) or inspect.isgeneratorfunction(method):
+                    continue
+                self._originals.append((cls, name, method))
+                setattr(cls, name, self._timed(f"{cls.__name__}.{name}", method))
+        return self
+
+    def _timed(self, label, method):
+        """Wrap method so each call's duration is appended to samples[label]"""
+        durations = self.samples.setdefault(label, array("d"))
+        clock = time.perf_counter
+
+        @functools.wraps(method)
+        def timed_method(*args, **kwargs):
+            start = clock()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                durations.append(clock() - start)
+        return timed_method
+
+    def remove(self):
+        """Put the original methods back; the samples are kept"""
+        for cls, name, method in reversed(self._originals):
+            setattr(cls, name, method)
+        self._originals.clear()
+
+    @contextlib.contextmanager
+    def action(self, label):
+        """Time one menu action (and cProfile it if it is cprofile_action)"""
+        durations = self.samples.setdefault(f"menu: {label}", array("d"))
+        profiler = cProfile.Profile() if label == self.cprofile_action else None
+        start = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            durations.append(time.perf_counter() - start)
+            if profiler is not None:
+                text = io.StringIO()
+                pstats.Stats(profiler, stream=text).sort_stats("cumulative").print_stats(25)
+                self.cprofile_stats = text.getvalue()
+                print(self.cprofile_stats)
+
+    def stats(self):
+        """{label: {"calls", "total", "p50", "p99"}} in seconds, largest total first"""
+        rows = {}
+        for label, durations in self.samples.items():
+            if durations:
+                ordered = sorted(durations)
+                rows[label] = {"calls": len(ordered), "total": math.fsum(ordered),
+                               "p50": percentile(ordered, 50), "p99": percentile(ordered, 99)}
+        return dict(sorted(rows.items(), key=lambda item: item[1]["total"], reverse=True))
+
+    def table_lines(self):
+        """Yield the stats as a text table"""
+        yield f"{'Method / action':<45}{'Calls':>10}{'Total (ms)':>13}{'p50 (us)':>12}{'p99 (us)':>12}\n"
+        for label, row in self.stats().items():
+            yield (f"{label:<45}{row['calls']:>10}{row['total'] * 1e3:>13.2f}"
+                   f"{row['p50'] * 1e6:>12.1f}{row['p99'] * 1e6:>12.1f}\n")
+
+    def report(self, out=None):
+        """Write the stats table to out (stdout by default)"""
+        if out is None:
+            out = sys.stdout
+        out.write("".join(self.table_lines()))
+
+    def save_json(self, path):
+        """Save the stats (and the last cProfile output) as JSON"""
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump({"timings": self.stats(), "cprofile": self.cprofile_stats}, file, indent=2)
@@ -0,0 +1,38 @@
+"""Fixtures for the Section E and Section F tests
+
+The section files have spaces in their names, so they are loaded with
+Moje_Larona_Benchmarks.load_section instead of being imported."""
+
+import contextlib
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Moje_Larona_Benchmarks import load_section  # noqa: E402
+
+
+def registered(module):
+    """Put a loaded section in sys.modules so worker processes can unpickle its functions"""
+    sys.modules[module.__name__] = module
+    return module
+
+
+@pytest.fixture(scope="session")
+def section_e():
+    return registered(load_section("E"))
+
+
+@pytest.fixture(scope="session")
+def section_f():
+    return registered(load_section("F"))
+
+
+@pytest.fixture
+def quiet():
+    """Hide what the Section F gradebook prints while a test runs"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
@@ -0,0 +1,89 @@
+"""GradebookBatch scripts in Sections E and F"""
+
+import io
+import json
+
+import pytest
+
+SCRIPT = """\
+# nightly
+add-subject Math "Computer Science"
+add-student Ann "Bob Lee" Cy
+add-student Ann
+grade Ann Math 90
+grade "Bob Lee" "Computer Science" 75
+grade Cy Math 40
+grade Cy Math 101
+grade Nobody Math 1
+grade Ann Physics 3
+grade Ann Math
+student "Bob Lee"
+ungrade Cy Math
+ungrade Cy Math
+average
+bogus
+remove-student Cy
+grade Ann Math "unterminated
+"""
+
+
+def run_script(section, script=SCRIPT):
+    """Run script on a new gradebook; returns the gradebook, the failure count and the JSON results"""
+    gradebook = section.Gradebook()
+    out = io.StringIO()
+    failures = section.GradebookBatch(gradebook, out=out, lines_per_write=3).run(io.StringIO(script))
+    return gradebook, failures, [json.loads(line) for line in out.getvalue().splitlines()]
+
+
+@pytest.mark.parametrize("section_name", ["section_e", "section_f"])
+def test_script_results(request, section_name):
+    section = request.getfixturevalue(section_name)
+    gradebook, failures, results = run_script(section)
+    by_line = {result["line"]: result for result in results}
+
+    assert 1 not in by_line  # Comments are skipped
+    assert by_line[3]["added"] == ["Ann", "Bob Lee", "Cy"]
+    assert by_line[4] == {"line": 4, "command": "add-student", "ok": True, "added": [], "existing": ["Ann"]}
+    assert by_line[5] == {"line": 5, "command": "grade", "ok": True, "name": "Ann", "subject": "Math", "grade": 90}
+    assert by_line[12]["grades"] == {"Computer Science": 75}
+    assert by_line[15]["average"] == 82.5
+    assert by_line[9]["error"] == "Nobody was not found"
+    assert by_line[10]["error"] == "Physics was not found"
+    assert by_line[11]["error"] == "Wrong number of arguments for grade"
+    assert by_line[14]["error"] == "Cy has no grade for Math"
+    assert by_line[16]["error"] == "Unknown command: bogus"
+    assert by_line[18]["error"] == "No closing quotation"
+    assert not by_line[8]["ok"] and "100" in by_line[8]["error"]
+    assert failures == sum(not result["ok"] for result in results) == 7
+
+    # Failed commands change nothing
+    assert dict(gradebook.get_student("Ann").grades if section_name == "section_e"
+                else gradebook.find_student("Ann").grades) == {"Math": 90}
+
+
+def test_section_f_matches_the_gradebook_methods(section_f, quiet):
+    """The batch leaves the same gradebook as the Gradebook methods the menu calls"""
+    batch, _, _ = run_script(section_f)
+    menu = section_f.Gradebook()
+    for subject in ("Math", "Computer Science"):
+        menu.add_subject(subject)
+    for name in ("Ann", "Bob Lee", "Cy", "Ann"):
+        menu.add_student(name)
+    for name, subject, grade in (("Ann", "Math", 90), ("Bob Lee", "Computer Science", 75), ("Cy", "Math", 40),
+                                 ("Cy", "Math", 101), ("Nobody", "Math", 1), ("Ann", "Physics", 3)):
+        menu.add_grade_to_student(name, subject, grade)
+    menu.find_student("Cy").remove_grade("Math")
+    menu.remove_student("Cy")
+    assert [(student.name, dict(student.grades)) for student in batch.students] == \
+        [(student.name, dict(student.grades)) for student in menu.students]
+    assert batch.class_average() == menu.class_average()
+
+
+def test_section_f_run_batch_reopens_saved_data(section_f, tmp_path, capsys):
+    script = tmp_path / "commands.txt"
+    script.write_text("add-subject Math\nadd-student Ann\ngrade Ann Math 80\n", encoding="utf-8")
+    assert section_f.run_batch(str(script), str(tmp_path / "data")) == 0
+    script.write_text("grade Ann Math 95\nstudent Ann\n", encoding="utf-8")
+    assert section_f.run_batch(str(script), str(tmp_path / "data")) == 0
+    last = json.loads(capsys.readouterr().out.splitlines()[-1])
+    assert last["grades"] == {"Math": 95}
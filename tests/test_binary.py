@@ -0,0 +1,58 @@
+"""The memory-mapped binary gradebook format in Section E"""
+
+import random
+
+import pytest
+
+
+def random_gradebook(section_e, gradebook_class, rng, students=300):
+    gradebook = getattr(section_e, gradebook_class)()
+    for subject in ("Math", "Art", "Zoölogy"):
+        gradebook.add_subject(subject)
+    for i in range(students):
+        gradebook.add_student(f"Student {i} é")
+        for subject in gradebook.subjects:
+            if rng.random() < 0.7:
+                gradebook.update_student_grade(f"Student {i} é", subject, rng.randint(0, 100))
+    return gradebook
+
+
+@pytest.mark.parametrize("chunk_rows", [7, 1 << 20])
+@pytest.mark.parametrize("gradebook_class", ["Gradebook", "ColumnarGradebook"])
+def test_mapped_gradebook_matches_the_gradebook(section_e, tmp_path, monkeypatch, gradebook_class, chunk_rows):
+    monkeypatch.setattr(section_e.MappedGradebook, "CHUNK_ROWS", chunk_rows)
+    gradebook = random_gradebook(section_e, gradebook_class, random.Random(4))
+    path = str(tmp_path / "grades.bin")
+    section_e.save_binary_gradebook(gradebook, path)
+
+    with section_e.MappedGradebook(path) as mapped:
+        students = list(gradebook.students.values())
+        assert len(mapped) == len(students)
+        assert mapped.subjects == sorted(gradebook.subjects)
+        assert [mapped.name(row) for row in range(len(mapped))] == [student.name for student in students]
+        for row, student in enumerate(students):
+            for subject in mapped.subjects:
+                assert mapped.get_grade(row, subject) == student.get_grade(subject)
+        assert mapped.get_grade(0, "Physics") is None
+        for subject in mapped.subjects:
+            assert mapped.subject_stats(subject) == pytest.approx(gradebook.subject_stats(subject))
+        assert mapped.class_average() == pytest.approx(gradebook.class_average())
+        for descending in (True, False):
+            assert mapped.rank_by_average(descending) == \
+                [student.name for student in gradebook.sort_students_by_average(descending)]
+        assert list(mapped.rows(["Art", "Physics"], 3, 5)) == \
+            [(student.name, [student.get_grade("Art"), None]) for student in students[3:5]]
+
+
+def test_empty_gradebook(section_e, tmp_path):
+    path = str(tmp_path / "empty.bin")
+    section_e.save_binary_gradebook(section_e.Gradebook(), path)
+    with section_e.MappedGradebook(path) as mapped:
+        assert (len(mapped), mapped.subjects, mapped.class_average(), mapped.rank_by_average()) == (0, [], 0, [])
+
+
+def test_rejects_other_files(section_e, tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(bytes(64))
+    with pytest.raises(ValueError, match="not a binary gradebook file"):
+        section_e.MappedGradebook(str(path))
@@ -0,0 +1,173 @@
+"""GradebookDiff in Sections E and F, and the persistent structures behind snapshots"""
+
+import random
+
+import pytest
+
+from Moje_Larona_Shared import PersistentVector, RankTree
+
+
+def test_rank_tree_matches_a_sorted_list():
+    rng = random.Random(1)
+    keys = sorted(rng.sample(range(10000), 500))
+    tree = RankTree.from_sorted((key, str(key)) for key in keys)
+    for step in range(2000):
+        if rng.random() < 0.5 and keys:
+            key = rng.choice(keys)
+            old, tree = tree, tree.remove(key)
+            keys.remove(key)
+            assert len(old) == len(tree) + 1  # The old version is unchanged
+        else:
+            key = rng.randrange(20000)
+            if key in keys:
+                continue
+            tree = tree.insert(key, str(key))
+            keys.append(key)
+            keys.sort()
+        assert len(tree) == len(keys)
+        if step % 97 == 0:
+            assert [key for key, _ in tree.items()] == keys
+            for rank in range(0, len(keys), 7):
+                assert tree.at(rank) == (keys[rank], str(keys[rank]))
+                assert tree.rank(keys[rank]) == rank
+            first, last = sorted(rng.sample(range(len(keys) + 3), 2))
+            assert [key for key, _ in tree.items(first, last)] == keys[first:last]
+
+
+def test_persistent_vector_diff_lists_only_changed_slots():
+    vector = PersistentVector.from_items((index, index) for index in range(100))
+    changed = vector.set(5, "x").set(3000, "y").set(50, None)
+    assert vector.get(5) == 5 and vector.get(3000) is None
+    assert list(vector.diff(changed)) == [(5, 5, "x"), (50, 50, None), (3000, None, "y")]
+    assert list(changed.diff(vector)) == [(5, "x", 5), (50, None, 50), (3000, "y", None)]
+
+
+def full_comparison(old_students, new_students, old_order, new_order):
+    """What a diff should hold, from comparing every student: ({grade changes}, {name: averages}, ranks)"""
+    old_rank = {student.name: rank for rank, student in enumerate(old_order, 1)}
+    new_rank = {student.name: rank for rank, student in enumerate(new_order, 1)}
+    grade_changes, averages = set(), {}
+    for name in old_students.keys() | new_students.keys():
+        before, after = old_students.get(name), new_students.get(name)
+        old_grades = dict(before.grades) if before is not None else {}
+        new_grades = dict(after.grades) if after is not None else {}
+        if before is not None and after is not None and old_grades == new_grades:
+            continue
+        for subject in old_grades.keys() | new_grades.keys():
+            if old_grades.get(subject) != new_grades.get(subject):
+                grade_changes.add((name, subject, old_grades.get(subject), new_grades.get(subject)))
+        averages[name] = (before and before.calculate_average(), after and after.calculate_average())
+    return grade_changes, averages, old_rank, new_rank
+
+
+def check_diff(diff, expected):
+    grade_changes, averages, old_rank, new_rank = expected
+    assert set(diff.grade_changes) == grade_changes
+    assert {name: (before, after) for name, before, after in diff.average_changes} == averages
+    assert set(diff.added) == {name for name, (before, _) in averages.items() if before is None}
+    assert set(diff.removed) == {name for name, (_, after) in averages.items() if after is None}
+    for name, before, after in diff.rank_changes:
+        assert (old_rank.get(name), new_rank.get(name)) == (before, after)
+    listed = {name for name, _, _ in diff.rank_changes}
+    assert {name for name in averages if old_rank.get(name) != new_rank.get(name)} <= listed
+
+
+@pytest.mark.parametrize("gradebook_class", ["Gradebook", "ColumnarGradebook"])
+def test_section_e_diffs_match_comparing_every_student(section_e, gradebook_class):
+    rng = random.Random(7)
+    subjects = ["A", "B", "C"]
+    gradebook = getattr(section_e, gradebook_class)()
+    for subject in subjects:
+        gradebook.add_subject(subject)
+    for i in range(200):
+        gradebook.add_student(f"S{i}")
+        for subject in subjects:
+            if rng.random() < 0.7:
+                gradebook.update_student_grade(f"S{i}", subject, rng.choice([50, 60, 70, rng.randint(0, 100)]))
+
+    snapshots, added = [gradebook.snapshot()], 200
+    for _ in range(6):
+        for _ in range(rng.randint(0, 40)):
+            action, names = rng.random(), list(gradebook.students)
+            if action < 0.6:
+                gradebook.update_student_grade(rng.choice(names), rng.choice(subjects), rng.choice([50, 60, 70]))
+            elif action < 0.75:
+                gradebook.add_student(f"S{added}")
+                added += 1
+            elif action < 0.85:
+                gradebook.remove_student(rng.choice(names))
+            else:
+                gradebook.update_grades([(rng.choice(names), rng.choice(subjects), rng.randint(0, 100))
+                                         for _ in range(5)])
+        snapshots.append(gradebook.snapshot())
+        assert [s.name for s in snapshots[-1].sort_students_by_average()] == \
+            [s.name for s in gradebook.sort_students_by_average()]
+
+    for old in snapshots:
+        for new in snapshots:
+            check_diff(old.diff(new), full_comparison(
+                dict(old.students.items()), dict(new.students.items()),
+                old.sort_students_by_average(), new.sort_students_by_average()))
+    assert not snapshots[-1].diff(snapshots[-1])
+
+
+def test_section_e_diff_of_unrelated_gradebooks(section_e):
+    first, second = section_e.Gradebook(), section_e.Gradebook()
+    for gradebook in (first, second):
+        gradebook.add_subject("M")
+    first.add_student("X")
+    second.add_student("Y")
+    second.update_student_grade("Y", "M", 5)
+    diff = first.snapshot().diff(second.snapshot())
+    assert (diff.added, diff.removed) == (["Y"], ["X"])
+
+
+def test_section_f_snapshots_and_diffs(section_f, quiet):
+    rng = random.Random(3)
+    subjects = ["A", "B", "C"]
+    gradebook = section_f.Gradebook()
+    for subject in subjects:
+        gradebook.add_subject(subject)
+    for i in range(150):
+        gradebook.add_student(f"S{i}")
+        for subject in subjects:
+            if rng.random() < 0.7:
+                gradebook.add_grade_to_student(f"S{i}", subject, rng.choice([50, 60, 70]))
+
+    snapshots, frozen, added = [gradebook.snapshot()], [], 150
+    for _ in range(6):
+        for _ in range(rng.randint(0, 40)):
+            action, names = rng.random(), [student.name for student in gradebook.students]
+            if action < 0.55:
+                gradebook.add_grade_to_student(rng.choice(names), rng.choice(subjects), rng.choice([50, 60, 70]))
+            elif action < 0.65:
+                gradebook.find_student(rng.choice(names)).remove_grade(rng.choice(subjects))
+            elif action < 0.75:
+                gradebook.add_student(f"S{added}")
+                added += 1
+            elif action < 0.88:
+                gradebook.remove_student(rng.choice(names))
+            else:
+                gradebook.add_grades_to_students([(rng.choice(names), rng.choice(subjects), rng.randint(0, 100))
+                                                  for _ in range(5)])
+        snapshots.append(gradebook.snapshot())
+        frozen.append(([s.name for s in gradebook.students], [s.name for s in gradebook.rank_by_average()],
+                       gradebook.class_average()))
+
+    # Later changes leave every snapshot as it was when it was taken
+    for snapshot, (names, ranked, average) in zip(snapshots[1:], frozen):
+        assert [s.name for s in snapshot.students] == names
+        assert [s.name for s in snapshot.rank_by_average()] == ranked
+        assert [s.name for s in section_f.Gradebook.rank_by_average(snapshot)] == ranked
+        assert snapshot.class_average() == average
+
+    for old in snapshots:
+        for new in snapshots:
+            check_diff(old.diff(new), full_comparison(
+                {s.name: s for s in old.students}, {s.name: s for s in new.students},
+                old.rank_by_average(), new.rank_by_average()))
+
+    with pytest.raises(TypeError):
+        snapshots[0].add_student("x")
+    with pytest.raises(TypeError):
+        snapshots[0].students[0].add_grade("A", 1)
@@ -0,0 +1,81 @@
+"""Section E's GradebookFederation against one gradebook holding every section"""
+
+import pytest
+
+SUBJECTS = ("Math", "Art", "History")
+SECTIONS = (("A", "Gradebook"), ("B", "ColumnarGradebook"), ("C", "SqliteGradebook"))
+
+
+def fill(gradebook, section, offset, students=40):
+    for subject in SUBJECTS:
+        gradebook.add_subject(subject)
+    for i in range(students):
+        name = f"{section} Student {i}"
+        gradebook.add_student(name)
+        for j, subject in enumerate(SUBJECTS):
+            if (i + j) % 5:  # Leave some grades out
+                gradebook.update_student_grade(name, subject, (i * 37 + j * 11 + offset) % 101)
+
+
+@pytest.fixture(params=[None, 3], ids=["serial", "threads"])
+def federation(request, section_e):
+    sections = {}
+    for offset, (section, gradebook_type) in enumerate(SECTIONS):
+        sections[section] = getattr(section_e, gradebook_type)()
+        fill(sections[section], section, offset * 29)
+    return section_e.GradebookFederation(sections, top_k=10, workers=request.param)
+
+
+@pytest.fixture
+def merged(section_e):
+    gradebook = section_e.Gradebook()
+    for offset, (section, _) in enumerate(SECTIONS):
+        fill(gradebook, section, offset * 29)
+    return gradebook
+
+
+def expected_top(gradebook, subject, count):
+    if subject is None:
+        ranked = gradebook.sort_students_by_average()
+        return [(student.calculate_average(), student.name) for student in ranked[:count]]
+    return [(student.get_grade(subject), student.name) for student in gradebook.top_students(subject, count)]
+
+
+def test_answers_match_a_merged_gradebook(federation, merged):
+    assert federation.class_average() == pytest.approx(merged.class_average())
+    for subject in SUBJECTS + ("Music",):
+        assert federation.subject_stats(subject) == pytest.approx(merged.subject_stats(subject))
+    assert [(value, name) for value, _, name in federation.top_students(10)] == pytest.approx(
+        expected_top(merged, None, 10))
+    for subject in SUBJECTS:
+        assert [(grade, name) for grade, _, name in federation.top_students_in(subject, 5)] == \
+            expected_top(merged, subject, 5)
+    assert all(name.startswith(section) for _, section, name in federation.top_students(10))
+
+
+def test_only_changed_sections_are_summarised_again(federation, merged):
+    before = federation.summaries()
+    federation.sections["B"].update_student_grade("B Student 3", "Math", 100)
+    merged.update_student_grade("B Student 3", "Math", 100)
+    after = federation.summaries()
+    assert after["A"] is before["A"] and after["C"] is before["C"]
+    assert after["B"] is not before["B"]
+    assert [(grade, name) for grade, _, name in federation.top_students_in("Math", 3)] == \
+        expected_top(merged, "Math", 3)
+    assert federation.class_average() == pytest.approx(merged.class_average())
+
+
+def test_sections_can_be_added_and_removed(section_e, federation):
+    assert federation.remove_section("C") and not federation.remove_section("C")
+    assert {section for _, section, _ in federation.top_students(10)} <= {"A", "B"}
+    extra = section_e.Gradebook()
+    extra.add_subject("Math")
+    extra.add_student("Top")
+    extra.update_student_grade("Top", "Math", 100)
+    federation.add_section("D", extra)
+    assert federation.top_students(1) == [(100, "D", "Top")]
+
+
+def test_asking_for_more_than_top_k_raises(federation):
+    with pytest.raises(ValueError):
+        federation.top_students(11)
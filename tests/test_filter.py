@@ -0,0 +1,78 @@
+"""Section E's GradeFilter and grade_columns, against filtering students one by one"""
+
+import pytest
+
+GRADEBOOK_TYPES = ("Gradebook", "ColumnarGradebook", "SqliteGradebook")
+
+# Filter -> the same test of (grades, average), for students read one at a time
+FILTERS = {
+    "Math < 50": lambda grades, average: grades.get("Math", 101) < 50,
+    "Math >= 50 and average > 60": lambda grades, average: grades.get("Math", -1) >= 50 and average > 60,
+    "not Art = 70 or avg <= 40.5": lambda grades, average: not grades.get("Art") == 70 or average <= 40.5,
+    "(Math > 80 or Art > 80) and not 'World History' != 33":
+        lambda grades, average: (grades.get("Math", -1) > 80 or grades.get("Art", -1) > 80)
+        and not grades.get("World History", 33) != 33,  # A missing grade fails the !=, so passes the not
+    "World History <= 10 OR Math == 100": lambda grades, average: grades.get("World History", 101) <= 10
+        or grades.get("Math") == 100,
+}
+
+
+@pytest.fixture(params=GRADEBOOK_TYPES)
+def gradebook(request, section_e):
+    gradebook = getattr(section_e, request.param)()
+    subjects = ("Math", "Art", "World History")
+    for subject in subjects:
+        gradebook.add_subject(subject)
+    for i in range(300):
+        name = f"Student {i}"
+        gradebook.add_student(name)
+        for j, subject in enumerate(subjects):
+            if (i * 3 + j) % 7:  # Leave some grades out
+                gradebook.update_student_grade(name, subject, (i * 41 + j * 23) % 101)
+    return gradebook
+
+
+@pytest.mark.parametrize("expression", FILTERS)
+@pytest.mark.parametrize("cached", [False, True], ids=["uncached", "cached"])
+def test_filter_matches_checking_each_student(section_e, gradebook, expression, cached):
+    if cached:
+        gradebook.report_cache = section_e.ReportCache()
+    test = FILTERS[expression]
+    expected = [student.name for student in gradebook.students.values()
+                if test(dict(student.grades), student.calculate_average())]
+    for _ in range(2):  # Again, served from the cache when there is one
+        assert [student.name for student in gradebook.filter_students(expression)] == expected
+
+
+def test_grade_columns_takes_a_list_of_subjects_with_the_cache_on(section_e, gradebook):
+    gradebook.report_cache = section_e.ReportCache()
+    view = gradebook.grade_columns(["Math"])
+    assert gradebook.grade_columns(["Math"]) is view
+    assert gradebook.report_cache.stats()["hits"] == 1
+    assert isinstance(view.columns["Math"], bytes)
+    gradebook.update_student_grade("Student 0", "Math", 100)
+    assert gradebook.grade_columns(["Math"]).columns["Math"][0] == 100
+
+
+def test_grade_columns_has_bytes_columns(section_e, gradebook):
+    view = gradebook.grade_columns(("Math", "Art"))
+    assert len(view) == 300 and list(view.columns) == ["Math", "Art"]
+    assert all(type(column) is bytes for column in view.columns.values())
+    assert view.columns["Math"][0] == section_e.MISSING_GRADE
+
+
+@pytest.mark.parametrize("expression, message", [
+    ("Math <", "Expected number"),
+    ("Math < 50 and", "Expected word"),
+    ("(Math < 50", r"Expected \)"),
+    ("Math < 50 Art", "Unexpected"),
+    ("Math ~ 50", "Cannot read"),
+])
+def test_malformed_filters_raise(section_e, expression, message):
+    with pytest.raises(ValueError, match=message):
+        section_e.GradeFilter(expression)
+
+
+def test_unknown_subject_raises(gradebook):
+    with pytest.raises(ValueError, match="Unknown subject in filter: Music"):
+        list(gradebook.filter_students("Music > 1"))
@@ -0,0 +1,50 @@
+"""All-or-nothing grade batches in Sections E and F"""
+
+import random
+
+
+def roster(section, names, subjects):
+    gradebook = section.Gradebook()
+    for subject in subjects:
+        gradebook.add_subject(subject)
+    for name in names:
+        gradebook.add_student(name)
+    return gradebook
+
+
+def test_section_e_update_grades_is_all_or_nothing(section_e):
+    rng = random.Random(1)
+    names, subjects = [f"N{i}" for i in range(50)], ["M", "S", "A"]
+    one_by_one, batched = roster(section_e, names, subjects), roster(section_e, names, subjects)
+    rows = [(rng.choice(names), rng.choice(subjects), rng.randint(0, 100)) for _ in range(200)]
+    for row in rows:
+        one_by_one.update_student_grade(*row)
+    assert batched.update_grades(iter(rows)) == []
+    assert [dict(student.grades) for student in batched.students.values()] == \
+        [dict(student.grades) for student in one_by_one.students.values()]
+
+    before = [dict(student.grades) for student in batched.students.values()]
+    errors = batched.update_grades(rows[:3] + [("zz", "M", 1), ("N1", "Q", 1), ("N1", "M", -1)])
+    assert [row for row, _ in errors] == [4, 5, 6]
+    assert [row for row, _ in batched.update_grades(rows[:3] + [("N1", "M")])] == [4]
+    assert [dict(student.grades) for student in batched.students.values()] == before
+
+
+def test_section_f_add_grades_to_students_is_all_or_nothing(section_f, quiet):
+    rng = random.Random(2)
+    names, subjects = [f"N{i}" for i in range(50)], ["M", "S", "A"]
+    one_by_one, batched = roster(section_f, names, subjects), roster(section_f, names, subjects)
+    rows = [(rng.choice(names).lower(), rng.choice(subjects), rng.randint(0, 100)) for _ in range(200)]
+    for row in rows:
+        one_by_one.add_grade_to_student(*row)
+    assert batched.add_grades_to_students(iter(rows)) == []
+    assert [(student.name, dict(student.grades)) for student in batched.students] == \
+        [(student.name, dict(student.grades)) for student in one_by_one.students]
+    assert (batched.grade_total, batched.grade_count) == (one_by_one.grade_total, one_by_one.grade_count)
+
+    before = [dict(student.grades) for student in batched.students]
+    errors = batched.add_grades_to_students(rows[:3] + [("zz", "M", 1), ("N1", "Q", 1), ("N1", "M", -1),
+                                                        ("N1", "M", 7.0), (5, "M", 1)])
+    assert [row for row, _ in errors] == [4, 5, 6, 7, 8]
+    assert [row for row, _ in batched.add_grades_to_students(rows[:3] + [("N1", "M")])] == [4]
+    assert [dict(student.grades) for student in batched.students] == before
@@ -0,0 +1,35 @@
+"""The cross-section benchmark harness in Moje_Larona_Benchmarks.py"""
+
+import pytest
+
+import Moje_Larona_Benchmarks as benchmarks
+
+SETTINGS = {"students": 60, "subjects": 3, "density": 0.7, "seed": 1, "repeat": 1}
+
+
+def test_make_roster_is_reproducible():
+    first, second = benchmarks.make_roster(50, 4, 0.5, seed=3), benchmarks.make_roster(50, 4, 0.5, seed=3)
+    assert (first.students, first.updates, first.searches) == (second.students, second.updates, second.searches)
+    assert benchmarks.make_roster(50, 4, 0.5, seed=4).students != first.students
+    assert all(len(grades) == 4 for _, grades in benchmarks.make_roster(20, 4).students)
+    assert any(len(grades) < 4 for _, grades in first.students)  # Sparse at density 0.5
+    assert benchmarks.make_roster(0, 2).updates == []
+
+
+def test_run_benchmarks_times_every_operation():
+    names = [name for name in benchmarks.IMPLEMENTATIONS if name[0] in "DEF"]
+    results = benchmarks.run_benchmarks(SETTINGS, names)
+    assert list(results["timings"]) == names
+    assert results["errors"] == {}
+    for name in names:
+        assert results["timings"][name]["add"] > 0
+        assert set(results["timings"][name]) == set(benchmarks.OPERATIONS)
+
+
+def test_compare_to_baseline():
+    baseline = {"settings": SETTINGS, "timings": {"E": {"add": 1.0, "update": 0.001, "sort": None}}}
+    results = {"settings": SETTINGS, "timings": {"E": {"add": 1.3, "update": 0.5, "sort": 2.0}, "F": {"add": 9.0}}}
+    assert benchmarks.compare_to_baseline(results, baseline) == ["E add: 1.0000s -> 1.3000s (+30%)"]
+    assert benchmarks.compare_to_baseline(results, baseline, threshold=0.5) == []
+    with pytest.raises(ValueError):
+        benchmarks.compare_to_baseline(results, dict(baseline, settings=dict(SETTINGS, seed=2)))
@@ -0,0 +1,50 @@
+"""GradebookImporter CSV/TSV loads in Section E"""
+
+
+def write(path, text):
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def grades_of(gradebook):
+    return {student.name: dict(student.grades) for student in gradebook.students.values()}
+
+
+def test_wide_layout_with_bad_rows(section_e, tmp_path):
+    path = write(tmp_path / "grades.csv", "Name,Math,Art\nAnn,90,\nBob,x,70\n,50,50\n\nCy,40,101\nDee,10,20,30\nEd,5\n")
+    gradebook = section_e.Gradebook()
+    importer = section_e.GradebookImporter(gradebook, batch_size=2, error_path=str(tmp_path / "errors.csv")).run(path)
+
+    assert grades_of(gradebook) == {"Ann": {"Math": 90}, "Ed": {"Math": 5}}
+    assert (importer.rows_read, importer.rows_imported, importer.grades_imported) == (6, 2, 2)  # The blank line is not a row
+    assert [line for line, _ in importer.errors] == [3, 4, 6, 7]
+    assert importer.error_count == 4
+    assert (tmp_path / "errors.csv").read_text(encoding="utf-8").splitlines()[1].startswith("3,")
+
+
+def test_long_layout_tsv_updates_existing_students(section_e, tmp_path):
+    gradebook = section_e.Gradebook()
+    gradebook.add_subject("Math")
+    gradebook.add_student("Ann")
+    gradebook.update_student_grade("Ann", "Math", 10)
+    path = write(tmp_path / "grades.tsv", "name\tsubject\tgrade\nAnn\tMath\t80\nAnn\tArt\t70\nBob\t\t5\nBob\tMath\n")
+    importer = section_e.GradebookImporter(gradebook).run(path)
+
+    assert grades_of(gradebook) == {"Ann": {"Math": 80, "Art": 70}}
+    assert [message for _, message in importer.errors] == ["Subject name cannot be empty",
+                                                           "Expected name, subject and grade"]
+    assert (gradebook.grade_total, gradebook.grade_count) == (150, 2)
+
+
+def test_empty_header_cells_are_skipped(section_e, tmp_path):
+    gradebook = section_e.Gradebook()
+    importer = section_e.GradebookImporter(gradebook).run(write(tmp_path / "grades.csv", "name,Math,,Art\nX,10,5,20\n"))
+    assert sorted(gradebook.subjects) == ["Art", "Math"]
+    assert grades_of(gradebook) == {"X": {"Math": 10, "Art": 20}}
+    assert importer.grades_imported == 2
+
+
+def test_empty_file(section_e, tmp_path):
+    gradebook = section_e.Gradebook()
+    importer = section_e.GradebookImporter(gradebook).run(write(tmp_path / "grades.csv", ""))
+    assert (importer.rows_read, gradebook.students) == (0, {})
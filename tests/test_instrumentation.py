@@ -0,0 +1,53 @@
+"""Instrumentation of Section F's Student and Gradebook methods"""
+
+import io
+import json
+
+
+def test_counts_match_the_calls_and_remove_restores_the_methods(section_f, quiet, tmp_path):
+    originals = dict(vars(section_f.Gradebook)), dict(vars(section_f.Student))
+    instrumentation = section_f.Instrumentation().instrument(section_f.Student, section_f.Gradebook)
+    try:
+        gradebook = section_f.Gradebook()
+        gradebook.add_subject("Math")
+        for name in ("Ann", "Bob", "Cy"):
+            gradebook.add_student(name)
+            gradebook.add_grade_to_student(name, "Math", 70)
+        with instrumentation.action("View Students Sorted by Average"):
+            gradebook.rank_by_average()
+    finally:
+        instrumentation.remove()
+    assert (dict(vars(section_f.Gradebook)), dict(vars(section_f.Student))) == originals
+
+    stats = instrumentation.stats()
+    assert stats["Gradebook.add_student"]["calls"] == 3
+    assert stats["Gradebook.add_grade_to_student"]["calls"] == 3
+    assert stats["Student.add_grade"]["calls"] == 3
+    assert stats["Gradebook.rank_by_average"]["calls"] == 1
+    assert stats["menu: View Students Sorted by Average"]["calls"] == 1
+
+    out = io.StringIO()
+    instrumentation.report(out)
+    assert out.getvalue().splitlines()[0].startswith("Method / action")
+    instrumentation.save_json(tmp_path / "timings.json")
+    assert json.loads((tmp_path / "timings.json").read_text())["timings"] == json.loads(json.dumps(stats))
+
+
+def test_section_e_counts_and_remove(section_e):
+    originals = dict(vars(section_e.Gradebook))
+    instrumentation = section_e.Instrumentation().instrument(section_e.Student, section_e.Gradebook)
+    try:
+        gradebook = section_e.Gradebook()
+        gradebook.add_subject("Math")
+        gradebook.add_student("Ann")
+        for grade in (50, 60, 70):
+            gradebook.update_student_grade("Ann", "Math", grade)
+        gradebook.sort_students_by_average()
+    finally:
+        instrumentation.remove()
+    assert dict(vars(section_e.Gradebook)) == originals
+
+    stats = instrumentation.stats()
+    assert stats["Gradebook.update_student_grade"]["calls"] == 3
+    assert stats["Gradebook.sort_students_by_average"]["calls"] == 1
+    assert all(entry["p50"] <= entry["p99"] for entry in stats.values())
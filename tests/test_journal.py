@@ -0,0 +1,114 @@
+"""GradebookJournal recovery in Sections E and F"""
+
+import random
+
+import pytest
+
+
+def state_e(gradebook):
+    return (sorted(gradebook.subjects), [(student.name, dict(student.grades)) for student in gradebook.students.values()],
+            gradebook.grade_total, gradebook.grade_count)
+
+
+def state_f(gradebook):
+    return (list(gradebook.subjects), [(student.name, dict(student.grades)) for student in gradebook.students],
+            gradebook.grade_total, gradebook.grade_count)
+
+
+def random_changes_e(gradebook, rng):
+    for _ in range(rng.randint(0, 150)):
+        name, action = f"n{rng.randint(0, 10)}", rng.random()
+        if action < 0.1:
+            gradebook.add_subject(rng.choice("ABCD"))
+        elif action < 0.35:
+            gradebook.add_student(name)
+        elif action < 0.45:
+            gradebook.remove_student(name)
+        elif action < 0.9:
+            gradebook.update_student_grade(name, rng.choice("ABCDE"), rng.randint(0, 100))
+        elif gradebook.get_student(name) is not None:
+            gradebook.get_student(name).remove_grade(rng.choice("ABCDE"))
+
+
+def random_changes_f(gradebook, rng):
+    for _ in range(rng.randint(0, 150)):
+        name, action = rng.choice(["n", "N"]) + str(rng.randint(0, 10)), rng.random()
+        if action < 0.1:
+            gradebook.add_subject(rng.choice("ABCD"))
+        elif action < 0.35:
+            gradebook.add_student(name)
+        elif action < 0.45:
+            gradebook.remove_student(name)
+        elif action < 0.9:
+            gradebook.add_grade_to_student(name, rng.choice("ABCDE"), rng.randint(-3, 103))
+        elif gradebook.find_student(name) is not None:
+            gradebook.find_student(name).remove_grade(rng.choice("ABCDE"))
+
+
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("gradebook_class", ["Gradebook", "ColumnarGradebook"])
+def test_section_e_reopens_the_same_gradebook(section_e, tmp_path, gradebook_class, seed):
+    rng = random.Random(seed)
+    cls = getattr(section_e, gradebook_class)
+    journal = section_e.GradebookJournal(str(tmp_path), batch_size=rng.randint(1, 5),
+                                         snapshot_every=rng.choice([None, 3, 17]))
+    gradebook = cls()
+    journal.open(gradebook)
+    random_changes_e(gradebook, rng)
+    journal.close()
+
+    reopened = cls()
+    section_e.GradebookJournal(str(tmp_path)).open(reopened)
+    assert state_e(reopened) == state_e(gradebook)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_section_f_reopens_the_same_gradebook(section_f, tmp_path, quiet, seed):
+    rng = random.Random(seed)
+    journal = section_f.GradebookJournal(str(tmp_path), batch_size=rng.randint(1, 5),
+                                         snapshot_every=rng.choice([None, 3, 17]))
+    gradebook = section_f.Gradebook()
+    journal.open(gradebook)
+    random_changes_f(gradebook, rng)
+    journal.close()
+
+    reopened = section_f.Gradebook()
+    section_f.GradebookJournal(str(tmp_path)).open(reopened)
+    assert state_f(reopened) == state_f(gradebook)
+
+
+@pytest.mark.parametrize("section_name", ["section_e", "section_f"])
+def test_torn_last_line_is_dropped(request, tmp_path, quiet, section_name):
+    section = request.getfixturevalue(section_name)
+    gradebook = section.Gradebook()
+    journal = section.GradebookJournal(str(tmp_path))
+    journal.open(gradebook)
+    gradebook.add_subject("M")
+    gradebook.add_student("a")
+    journal.close()
+    log = tmp_path / "journal-0.log"
+    with open(log, "a", encoding="utf-8") as file:
+        file.write('["student","b')
+
+    reopened = section.Gradebook()
+    assert section.GradebookJournal(str(tmp_path)).open(reopened) == 2
+    assert log.read_text(encoding="utf-8") == '["subject","M"]\n["student","a"]\n'
+    assert reopened.subjects and len(reopened.students) == 1
+
+
+@pytest.mark.parametrize("section_name", ["section_e", "section_f"])
+def test_recovery_after_compaction_and_with_no_files(request, tmp_path, quiet, section_name):
+    section = request.getfixturevalue(section_name)
+    gradebook = section.Gradebook()
+    journal = section.GradebookJournal(str(tmp_path / "new"))
+    assert journal.open(gradebook) == 0  # No snapshot or log yet
+    gradebook.add_subject("M")
+    gradebook.add_student("a")
+    journal.compact()
+    gradebook.add_student("b")
+    journal.close()
+    assert sorted(path.name for path in (tmp_path / "new").iterdir()) == ["journal-1.log", "snapshot.json"]
+
+    reopened = section.Gradebook()
+    assert section.GradebookJournal(str(tmp_path / "new")).open(reopened) == 1  # Only the change after compact()
+    assert len(reopened.students) == 2
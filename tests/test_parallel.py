@@ -0,0 +1,46 @@
+"""ParallelReporter reports against the gradebook's own in Section E"""
+
+import io
+import random
+
+import pytest
+
+
+def render(report, *args):
+    out = io.StringIO()
+    report(*args, out)
+    return out.getvalue()
+
+
+@pytest.mark.parametrize("gradebook_class", ["Gradebook", "ColumnarGradebook"])
+def test_reports_match_the_gradebook_after_changes(section_e, gradebook_class):
+    rng = random.Random(5)
+    gradebook = getattr(section_e, gradebook_class)()
+    for subject in ("Math", "Art", "History"):
+        gradebook.add_subject(subject)
+    for i in range(120):
+        gradebook.add_student(f"S{i}")
+        for subject in rng.sample(sorted(gradebook.subjects), rng.randint(0, 3)):  # Grades in any order
+            gradebook.update_student_grade(f"S{i}", subject, rng.randint(0, 100))
+
+    with section_e.ParallelReporter(gradebook, workers=2, chunk_rows=17) as reporter:
+        for _ in range(2):
+            assert render(reporter.summary_table) == render(gradebook.summary_table)
+            assert render(reporter.class_report) == render(gradebook.class_report)
+            assert reporter.class_average() == pytest.approx(gradebook.class_average())
+            for subject, stats in reporter.subject_stats().items():
+                assert stats == pytest.approx(gradebook.subject_stats(subject))
+            assert reporter.sort_students_by_average(False) == gradebook.sort_students_by_average(False)
+
+            # A reporter kept open packs the gradebook again after it changes
+            gradebook.update_student_grade("S3", "Math", 100)
+            gradebook.remove_student("S4")
+            gradebook.add_student("New")
+
+
+def test_empty_gradebook(section_e):
+    gradebook = section_e.Gradebook()
+    with section_e.ParallelReporter(gradebook, workers=1) as reporter:
+        assert render(reporter.summary_table) == render(gradebook.summary_table)
+        assert render(reporter.class_report) == render(gradebook.class_report)
+        assert reporter.class_average() == 0
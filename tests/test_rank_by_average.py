@@ -0,0 +1,38 @@
+"""Section F's rank_by_average against bubble_sort_by_average"""
+
+import random
+
+import pytest
+
+
+@pytest.mark.parametrize("grades", [[], [70], [70, 90, 70, 80, 90]])
+def test_rank_by_average_edge_cases(section_f, quiet, grades):
+    gradebook = section_f.Gradebook()
+    gradebook.add_subject("Math")
+    for i, grade in enumerate(grades):
+        gradebook.add_student(f"s{i}")
+        gradebook.add_grade_to_student(f"s{i}", "Math", grade)
+    students = list(gradebook.students)
+    ranked = gradebook.rank_by_average()
+    assert gradebook.students == students  # The original list is not modified
+    assert [s.name for s in ranked] == [s.name for s in gradebook.bubble_sort_by_average()]
+    assert [s.name for s in ranked] == [s.name for s in sorted(students, key=lambda s: -s.calculate_average())]
+
+
+def test_rank_by_average_on_random_rosters_with_ties(section_f, quiet):
+    rng = random.Random(8)
+    gradebook = section_f.Gradebook()
+    for subject in ("A", "B"):
+        gradebook.add_subject(subject)
+    for i in range(300):
+        gradebook.add_student(f"s{i}")
+        for subject in ("A", "B"):
+            if rng.random() < 0.8:
+                gradebook.add_grade_to_student(f"s{i}", subject, rng.choice([60, 70, 80]))
+    assert [s.name for s in gradebook.rank_by_average()] == [s.name for s in gradebook.bubble_sort_by_average()]
+
+
+def test_benchmark_ranking(section_f, capsys):
+    section_f.benchmark_ranking(sizes=(50, 400, 2000), bubble_limit=400)
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 4 and lines[-1].split()[1].startswith("~")  # Bubble sort estimated above the limit
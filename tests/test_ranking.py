@@ -0,0 +1,119 @@
+"""rank_of, student_at_rank and students_ranked against a full sort in Sections E and F"""
+
+import random
+
+import pytest
+
+
+def check_ranks(gradebook, orders, rng, lookup=str):
+    """orders maps descending to the names in the order a full sort gives"""
+    for descending, order in orders.items():
+        for rank, name in enumerate(order, 1):
+            assert gradebook.rank_of(lookup(name), descending) == rank
+            assert gradebook.student_at_rank(rank, descending).name == name
+        if order:
+            first = rng.randint(1, len(order))
+            last = rng.randint(first, len(order) + 3)
+            assert [s.name for s in gradebook.students_ranked(first, last, descending)] == order[first - 1:last]
+        for rank in (0, len(order) + 1):
+            with pytest.raises(IndexError):
+                gradebook.student_at_rank(rank, descending)
+    with pytest.raises(KeyError):
+        gradebook.rank_of("nobody")
+
+
+def orders_e(section_e, gradebook):
+    """Full sorts by average, with Gradebook's own sort so snapshots are not ranked by their ranking tree"""
+    return {descending: [s.name for s in section_e.Gradebook.sort_students_by_average(gradebook, descending)]
+            for descending in (True, False)}
+
+
+@pytest.mark.parametrize("gradebook_class", ["Gradebook", "ColumnarGradebook", "SqliteGradebook"])
+def test_section_e_ranks_after_random_changes(section_e, gradebook_class):
+    rng = random.Random(9)
+    subjects = ["A", "B", "C"]
+    gradebook = getattr(section_e, gradebook_class)()
+    for subject in subjects:
+        gradebook.add_subject(subject)
+    for i in range(120):
+        gradebook.add_student(f"S{i}")
+        for subject in subjects:
+            if rng.random() < 0.6:
+                gradebook.update_student_grade(f"S{i}", subject, rng.choice([50, 60, 70]))  # Many ties
+    check_ranks(gradebook, orders_e(section_e, gradebook), rng)
+
+    added = 120
+    for step in range(300):
+        action, names = rng.random(), list(gradebook.students)
+        if action < 0.5:
+            gradebook.update_student_grade(rng.choice(names), rng.choice(subjects), rng.choice([50, 60, 70]))
+        elif action < 0.6:
+            gradebook.get_student(rng.choice(names)).remove_grade(rng.choice(subjects))
+        elif action < 0.7:
+            gradebook.add_student(f"S{added}")
+            added += 1
+        elif action < 0.8:
+            gradebook.remove_student(rng.choice(names))
+        else:
+            gradebook.update_grades([(rng.choice(names), rng.choice(subjects), rng.choice([50, 60, 70]))
+                                     for _ in range(4)])
+        if step % 25 == 0:
+            check_ranks(gradebook, orders_e(section_e, gradebook), rng)
+    check_ranks(gradebook, orders_e(section_e, gradebook), rng)
+
+    if gradebook_class != "SqliteGradebook":
+        snapshot = gradebook.snapshot()
+        orders = orders_e(section_e, snapshot)
+        gradebook.update_student_grade(orders[True][-1], "A", 100)
+        check_ranks(snapshot, orders, rng)  # The snapshot keeps the ranks it was taken with
+
+
+def test_section_e_empty_gradebook(section_e):
+    assert section_e.Gradebook().students_ranked(1, 5) == []
+
+
+def test_section_f_ranks_after_random_changes(section_f, quiet):
+    rng = random.Random(2)
+    subjects = ["A", "B"]
+    gradebook = section_f.Gradebook()
+    for subject in subjects:
+        gradebook.add_subject(subject)
+    for i in range(100):
+        gradebook.add_student(f"S{i}")
+        for subject in subjects:
+            if rng.random() < 0.6:
+                gradebook.add_grade_to_student(f"S{i}", subject, rng.choice([50, 60]))
+
+    def orders():
+        ranked = [s.name for s in gradebook.rank_by_average()]
+        assert [s.name for s in gradebook.bubble_sort_by_average()] == ranked
+        return {True: ranked, False: [s.name for s in sorted(gradebook.students, key=lambda s: s.calculate_average())]}
+
+    check_ranks(gradebook, orders(), rng, lookup=str.upper)  # Names are found in any case
+    added = 100
+    for step in range(400):
+        action, names = rng.random(), [s.name for s in gradebook.students]
+        if action < 0.5:
+            gradebook.add_grade_to_student(rng.choice(names), rng.choice(subjects), rng.choice([50, 60, 70]))
+        elif action < 0.6:
+            gradebook.find_student(rng.choice(names)).remove_grade(rng.choice(subjects))
+        elif action < 0.7:
+            gradebook.add_student(f"S{added}")
+            added += 1
+        elif action < 0.85:
+            gradebook.remove_student(rng.choice(names))
+        else:
+            gradebook.add_grades_to_students([(rng.choice(names), rng.choice(subjects), rng.choice([50, 60]))
+                                              for _ in range(4)])
+        if step % 20 == 0:
+            check_ranks(gradebook, orders(), rng, lookup=str.upper)
+        if step == 200:
+            snapshot = gradebook.snapshot()
+            snapshot_orders = orders()
+    check_ranks(gradebook, orders(), rng, lookup=str.upper)
+    check_ranks(snapshot, snapshot_orders, rng)
+
+
+def test_benchmark_rank_queries(section_f, capsys):
+    section_f.benchmark_rank_queries(num_students=2000, changes=200)
+    assert "rank_of()" in capsys.readouterr().out
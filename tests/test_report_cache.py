@@ -0,0 +1,86 @@
+"""Section E's ReportCache and the version-scoped keys of cached reports"""
+
+
+def make_gradebook(section_e, gradebook_type="Gradebook"):
+    gradebook = getattr(section_e, gradebook_type)()
+    for subject in ("Math", "Art"):
+        gradebook.add_subject(subject)
+    for name, math, art in (("Ann", 90, 60), ("Bob", 70, 80), ("Cy", 50, 70)):
+        gradebook.add_student(name)
+        gradebook.update_student_grade(name, "Math", math)
+        gradebook.update_student_grade(name, "Art", art)
+    gradebook.report_cache = section_e.ReportCache()
+    return gradebook
+
+
+def names(students):
+    return [student.name for student in students]
+
+
+def test_a_grade_change_only_recomputes_the_reports_that_read_it(section_e):
+    gradebook = make_gradebook(section_e)
+    cache = gradebook.report_cache
+    gradebook.sort_students_by_subject("Math")
+    gradebook.sort_students_by_subject("Art")
+    gradebook.student_info_text("Ann")
+    gradebook.summary_table_text()
+    assert (cache.hits, cache.misses) == (0, 4)
+
+    gradebook.update_student_grade("Bob", "Art", 95)
+    assert names(gradebook.sort_students_by_subject("Math")) == ["Ann", "Bob", "Cy"]
+    assert (cache.hits, cache.misses) == (1, 4)
+    assert names(gradebook.sort_students_by_subject("Art")) == ["Bob", "Cy", "Ann"]
+    gradebook.student_info_text("Ann")
+    assert (cache.hits, cache.misses) == (2, 5)
+    assert "95" in gradebook.summary_table_text()
+    assert (cache.hits, cache.misses) == (2, 6)
+
+
+def test_adding_a_student_recomputes_every_subject_view(section_e):
+    gradebook = make_gradebook(section_e)
+    gradebook.sort_students_by_subject("Math")
+    gradebook.add_student("Dee")
+    gradebook.sort_students_by_subject("Math")
+    assert gradebook.report_cache.stats()["misses"] == 2
+
+
+def test_cached_lists_are_copied_on_the_way_out(section_e):
+    gradebook = make_gradebook(section_e)
+    gradebook.sort_students_by_average().clear()
+    assert names(gradebook.sort_students_by_average()) == ["Ann", "Bob", "Cy"]
+
+
+def test_least_recently_used_entries_are_evicted_first(section_e):
+    cache = section_e.ReportCache()
+    for key in range(300):
+        cache.put(key, key)
+    assert len(cache.entries) == cache.max_entries == 256
+    assert cache.lookup(43) is section_e._NOT_CACHED and cache.lookup(44) == 44
+    cache.put("new", None)
+    assert cache.lookup(45) is section_e._NOT_CACHED
+    assert cache.get("new", lambda: "recomputed") is None
+    assert cache.lookup(44) == 44
+
+
+def test_size_limit_counts_characters(section_e):
+    cache = section_e.ReportCache(max_size=10)
+    cache.put("a", "12345")
+    cache.put("b", "123456")
+    assert list(cache.entries) == ["b"] and cache.size == 6
+
+
+def test_stats(section_e):
+    cache = section_e.ReportCache()
+    cache.get("key", lambda: "text")
+    cache.get("key", lambda: "other")
+    cache.get("key", lambda: "other")
+    assert cache.stats() == {"hits": 2, "misses": 1, "hit_rate": 2 / 3, "entries": 1, "size": 4}
+
+
+def test_class_report_is_streamed_once_then_written_from_the_cache(section_e, capsys):
+    gradebook = make_gradebook(section_e, "ColumnarGradebook")
+    gradebook.class_report()
+    first = capsys.readouterr().out
+    gradebook.class_report()
+    assert capsys.readouterr().out == first
+    assert gradebook.report_cache.stats()["hits"] == 1
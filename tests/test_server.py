@@ -0,0 +1,122 @@
+"""GradebookServer (Section E) over real HTTP connections"""
+
+import asyncio
+import http.client
+import json
+import socket
+import threading
+
+import pytest
+
+
+@pytest.fixture(params=["Gradebook", "ColumnarGradebook"])
+def server(request, section_e):
+    """A GradebookServer on a free port, run by an event loop on another thread"""
+    server = section_e.GradebookServer(getattr(section_e, request.param)(), port=0)
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    asyncio.run_coroutine_threadsafe(server.start(), loop).result()
+    yield server
+    asyncio.run_coroutine_threadsafe(server.close(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+@pytest.fixture
+def request_json(server):
+    """request_json(method, path, body=None) -> (status, decoded body) on one kept-alive connection"""
+    connection = http.client.HTTPConnection("127.0.0.1", server.port, timeout=10)
+
+    def request_json(method, path, body=None):
+        connection.request(method, path, body=None if body is None else json.dumps(body),
+                           headers={"Content-Type": "application/json"})
+        response = connection.getresponse()
+        data = response.read()
+        if "json" in response.getheader("Content-Type"):
+            return response.status, json.loads(data)
+        return response.status, data.decode()
+
+    yield request_json
+    connection.close()
+
+
+def raw_exchange(server, data):
+    """Send raw bytes on a new connection and return everything the server sends back"""
+    with socket.create_connection(("127.0.0.1", server.port), timeout=10) as connection:
+        connection.sendall(data)
+        received = b""
+        while chunk := connection.recv(65536):
+            received += chunk
+    return received
+
+
+def test_grades_and_reports(request_json):
+    assert request_json("POST", "/subjects", {"name": "Math"})[0] == 201
+    assert request_json("POST", "/subjects", {"name": "Art & Craft"})[0] == 201
+    assert request_json("POST", "/subjects", {"name": "Math"})[0] == 409
+    assert request_json("POST", "/students", {"name": "Al Bo"})[0] == 201
+    assert request_json("POST", "/students", {"name": "Cy"})[0] == 201
+
+    assert request_json("PUT", "/students/Al%20Bo/grades/Math", {"grade": 90})[0] == 200
+    assert request_json("PUT", "/students/Al%20Bo/grades/Art%20%26%20Craft", {"grade": 70}) == (
+        200, {"name": "Al Bo", "subject": "Art & Craft", "grade": 70})
+    assert request_json("POST", "/grades", [["Cy", "Math", 50], {"name": "Cy", "subject": "Art & Craft", "grade": 60}]) == (
+        200, {"updated": 2})
+
+    assert request_json("GET", "/students/Al%20Bo")[1] == {"name": "Al Bo", "grades": {"Math": 90, "Art & Craft": 70},
+                                                           "average": 80.0}
+    assert request_json("GET", "/students")[1]["total"] == 2
+    assert request_json("GET", "/subjects/Math/stats")[1]["highest"] == 90
+    assert request_json("GET", "/class-average")[1] == {"average": 67.5}
+    assert [row["name"] for row in request_json("GET", "/sorted?by=average")[1]] == ["Al Bo", "Cy"]
+    assert [row["name"] for row in request_json("GET", "/sorted?by=Math&order=asc")[1]] == ["Cy", "Al Bo"]
+    assert "Summary Table" in request_json("GET", "/reports/summary")[1]
+    assert "Class Report" in request_json("GET", "/reports/class")[1]
+
+    assert request_json("DELETE", "/students/Cy/grades/Math")[0] == 200
+    assert request_json("DELETE", "/students/Cy/grades/Math")[0] == 404
+    assert request_json("DELETE", "/students/Cy")[0] == 200
+    assert request_json("GET", "/students/Cy")[0] == 404
+
+
+def test_errors(server, request_json):
+    request_json("POST", "/subjects", {"name": "Math"})
+    request_json("POST", "/students", {"name": "Cy"})
+
+    assert request_json("PUT", "/students/Cy/grades/Math", {"grade": 190})[0] == 400
+    assert request_json("PUT", "/students/Zed/grades/Math", {"grade": 19})[0] == 404
+    assert request_json("GET", "/nope")[0] == 404
+    assert request_json("PATCH", "/students")[0] == 405
+    assert request_json("POST", "/students", "x")[0] == 400
+
+    # A bad row anywhere rejects the whole batch, including rows that are too short
+    status, body = request_json("POST", "/grades", [["Cy", "Math", 50], ["Q", "Math", 1]])
+    assert status == 400 and body["errors"][0]["row"] == 2
+    status, body = request_json("POST", "/grades", [["Cy", "Math"]])
+    assert status == 400 and body["errors"][0]["row"] == 1
+    assert request_json("GET", "/students/Cy")[1]["grades"] == {}
+
+    for length in (b"abc", b"-5"):
+        response = raw_exchange(server, b"POST /grades HTTP/1.1\r\nContent-Length: " + length + b"\r\n\r\n")
+        assert response.startswith(b"HTTP/1.1 400")
+
+
+def test_handler_error_is_a_500(server, request_json):
+    def broken(*args, **kwargs):
+        raise RuntimeError("broken handler")
+
+    server._routes = [(method, pattern, broken if handler == server.get_subjects else handler, heavy)
+                      for method, pattern, handler, heavy in server._routes]
+    assert request_json("GET", "/subjects")[0] == 500
+    assert request_json("GET", "/class-average")[0] == 200  # The connection is still usable
+
+
+def test_pipelined_requests_are_answered_in_order(server, request_json):
+    request_json("POST", "/subjects", {"name": "Art"})
+    response = raw_exchange(server, b"GET /class-average HTTP/1.1\r\n\r\n"
+                                    b"GET /subjects HTTP/1.1\r\n\r\n"
+                                    b"GET /students HTTP/1.1\r\nConnection: close\r\n\r\n")
+    assert response.count(b"HTTP/1.1 200") == 3
+    assert response.index(b"average") < response.index(b"Art")
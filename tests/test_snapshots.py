@@ -0,0 +1,79 @@
+"""Read-only snapshots of the Section E gradebook"""
+
+import contextlib
+import io
+
+import pytest
+
+
+def reports(gradebook):
+    out = io.StringIO()
+    gradebook.class_report(out)
+    gradebook.summary_table(out)
+    return out.getvalue()
+
+
+@pytest.fixture(params=["Gradebook", "ColumnarGradebook", "SqliteGradebook"])
+def gradebook(request, section_e):
+    gradebook = getattr(section_e, request.param)()
+    for subject in ("Math", "Art"):
+        gradebook.add_subject(subject)
+    for i in range(30):
+        gradebook.add_student(f"S{i}")
+        gradebook.update_student_grade(f"S{i}", "Math", (i * 37) % 101)
+        if i % 3:
+            gradebook.update_student_grade(f"S{i}", "Art", (i * 11) % 101)
+    return gradebook
+
+
+def test_snapshot_keeps_what_it_saw(gradebook):
+    snapshot = gradebook.snapshot()
+    before = reports(gradebook)
+    assert reports(snapshot) == before
+    assert (snapshot.grade_total, snapshot.grade_count) == gradebook.grade_totals()
+
+    gradebook.update_student_grade("S1", "Math", 100)
+    gradebook.update_grades([("S2", "Art", 0), ("S3", "Art", 5)])
+    gradebook.remove_student("S4")
+    gradebook.add_student("S4")
+    gradebook.add_subject("History")
+    gradebook.update_student_grade("S5", "History", 50)
+    assert reports(snapshot) == before
+
+    later = gradebook.snapshot()
+    assert reports(later) == reports(gradebook)
+    assert (later.grade_total, later.grade_count) == gradebook.grade_totals()
+    assert later.subjects == frozenset(gradebook.subjects)
+
+
+def test_changes_are_published_when_a_snapshot_is_read(gradebook):
+    first = gradebook.snapshot()
+    assert gradebook.snapshot() is first  # Nothing changed
+    for grade in range(50):
+        gradebook.update_student_grade("S1", "Math", grade)
+    gradebook.add_student("New")
+    gradebook.remove_student("New")
+    second = gradebook.snapshot()
+    assert second.version == first.version + 1
+    assert "New" not in second.students
+    assert second.students["S1"].get_grade("Math") == 49
+
+
+def test_snapshot_is_read_only(section_e, gradebook):
+    snapshot = gradebook.snapshot()
+    for change in (lambda: snapshot.add_student("X"), lambda: snapshot.update_student_grade("S1", "Math", 1),
+                   lambda: snapshot.update_grades([]), lambda: snapshot.students["S1"].add_grade("Math", 1)):
+        with pytest.raises(TypeError):
+            change()
+
+
+def test_snapshot_in_a_federation(section_e, gradebook):
+    snapshot = gradebook.snapshot()
+    federation = section_e.GradebookFederation({"A": snapshot, "B": gradebook})
+    assert federation.class_average() == pytest.approx(gradebook.class_average())
+
+
+def test_stress_snapshots_finds_no_inconsistencies(section_e):
+    with contextlib.redirect_stdout(io.StringIO()):
+        writes, reads, problems = section_e.stress_snapshots(num_students=200, seconds=0.5)
+    assert writes and reads and problems == []
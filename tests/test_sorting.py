@@ -0,0 +1,48 @@
+"""Counting sorts by subject grade in Section E"""
+
+import random
+
+import pytest
+
+
+def test_counting_sort_is_stable_both_ways(section_e):
+    rng = random.Random(6)
+    items = [(rng.randint(0, 101), i) for i in range(2000)]
+    buckets = [bucket for bucket, _ in items]
+    for descending in (True, False):
+        assert section_e.counting_sort(items, buckets, descending) == \
+            sorted(items, key=lambda item: item[0], reverse=descending)
+
+
+def test_sort_by_key_falls_back_for_other_keys(section_e):
+    items = [3.5, 1.25, 3.5, -7.0, 200.0]
+    assert section_e.sort_by_key(items, lambda item: item, True) == sorted(items, reverse=True)
+    assert section_e.sort_by_key([], lambda item: item) == []
+
+
+@pytest.mark.parametrize("gradebook_class", ["Gradebook", "ColumnarGradebook", "SqliteGradebook", "snapshot"])
+def test_subject_orders_match_a_comparison_sort(section_e, gradebook_class):
+    rng = random.Random(7)
+    gradebook = getattr(section_e, "Gradebook" if gradebook_class == "snapshot" else gradebook_class)()
+    gradebook.add_subject("Math")
+    gradebook.add_subject("Art")
+    for i in range(400):
+        gradebook.add_student(f"S{i}")
+        if rng.random() < 0.8:
+            gradebook.update_student_grade(f"S{i}", "Math", rng.randint(0, 100))
+    for i in range(0, 400, 7):
+        gradebook.remove_student(f"S{i}")
+    if gradebook_class == "snapshot":
+        gradebook = gradebook.snapshot()
+
+    students = list(gradebook.students.values())
+    graded = [student for student in students if student.has_subject("Math")]
+    for descending in (True, False):
+        expected = sorted(students, key=lambda s: -1 if s.get_grade("Math") is None else s.get_grade("Math"),
+                          reverse=descending)
+        assert [s.name for s in gradebook.sort_students_by_subject("Math", descending)] == [s.name for s in expected]
+    by_grade = sorted(graded, key=lambda s: s.get_grade("Math"))
+    assert [s.name for s in gradebook.bottom_students("Math", 10)] == [s.name for s in by_grade[:10]]
+    assert [s.name for s in gradebook.top_students("Math", 10)] == \
+        [s.name for s in sorted(graded, key=lambda s: s.get_grade("Math"), reverse=True)[:10]]
+    assert gradebook.top_students("Art", 5) == [] and gradebook.top_students("Physics", 5) == []
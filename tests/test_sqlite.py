@@ -0,0 +1,100 @@
+"""Section E's SqliteGradebook: transactions, persistence and shared connections"""
+
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def gradebook(section_e, tmp_path):
+    gradebook = section_e.SqliteGradebook(str(tmp_path / "gradebook.db"))
+    gradebook.add_subject("Math")
+    for name, grade in (("Ann", 90), ("Bob", 70)):
+        gradebook.add_student(name)
+        gradebook.update_student_grade(name, "Math", grade)
+    yield gradebook
+    gradebook.close()
+
+
+def state(gradebook):
+    return ({name: dict(student.grades) for name, student in gradebook.students.items()},
+            sorted(gradebook.subjects), gradebook.grade_totals(), gradebook.class_average(),
+            [student.name for student in gradebook.sort_students_by_average()])
+
+
+def test_a_block_that_raises_is_rolled_back(section_e, gradebook):
+    before = state(gradebook)
+    version = gradebook.change_version
+    with pytest.raises(RuntimeError):
+        with gradebook.transaction():
+            gradebook.add_subject("Art")
+            gradebook.add_student("Cy")
+            gradebook.update_student_grade("Cy", "Math", 100)
+            gradebook.update_student_grade("Ann", "Math", 10)
+            gradebook.remove_student("Bob")
+            raise RuntimeError("abandon")
+    assert state(gradebook) == before
+    assert gradebook.change_version > version  # Nothing cached from inside the block is served
+
+    gradebook.add_student("Cy")  # The reloaded insertion numbers carry on from the database
+    assert list(gradebook.students) == ["Ann", "Bob", "Cy"]
+
+
+def test_a_nested_block_that_raises_only_undoes_itself(gradebook):
+    with gradebook.transaction():
+        gradebook.update_student_grade("Ann", "Math", 95)
+        with pytest.raises(ValueError):
+            with gradebook.transaction():
+                gradebook.update_student_grade("Bob", "Math", 5)
+                gradebook.update_student_grade("Bob", "Math", 101)
+    assert {name: dict(student.grades) for name, student in gradebook.students.items()} == \
+        {"Ann": {"Math": 95}, "Bob": {"Math": 70}}
+
+
+def test_a_rollback_resyncs_the_snapshot_and_report_cache(section_e, gradebook):
+    gradebook.report_cache = section_e.ReportCache()
+    gradebook.snapshot()
+    gradebook.sort_students_by_subject("Math")
+    with pytest.raises(RuntimeError):
+        with gradebook.transaction():
+            gradebook.update_student_grade("Bob", "Math", 100)
+            raise RuntimeError("abandon")
+    assert [student.name for student in gradebook.sort_students_by_subject("Math")] == ["Ann", "Bob"]
+    assert gradebook.snapshot().get_student("Bob").get_grade("Math") == 70
+
+
+def test_committed_changes_survive_reopening(section_e, gradebook):
+    with gradebook.transaction():
+        gradebook.add_subject("Art")
+        gradebook.add_student("Cy")
+        gradebook.update_student_grade("Cy", "Art", 60)
+        gradebook.update_grades([("Ann", "Art", 80), ("Bob", "Art", 40)])
+    before = state(gradebook)
+    gradebook.close()
+    with section_e.SqliteGradebook(gradebook.path) as reopened:
+        assert state(reopened) == before
+
+
+def test_threads_share_the_connection(gradebook):
+    errors = []
+
+    def write(worker):
+        try:
+            for i in range(50):
+                name = f"Student {worker}-{i}"
+                with gradebook.transaction():
+                    gradebook.add_student(name)
+                    gradebook.update_student_grade(name, "Math", (worker * 7 + i) % 101)
+                gradebook.class_average()
+        except Exception as error:  # Reported below, since the thread would swallow it
+            errors.append(error)
+
+    threads = [threading.Thread(target=write, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert len(gradebook.students) == 202
+    total = sum(grade for student in gradebook.students.values() for grade in student.grades.values())
+    assert gradebook.grade_totals() == (total, 202)
@@ -0,0 +1,34 @@
+"""Section F's lowercase name index"""
+
+import pytest
+
+
+def test_names_are_found_in_any_case(section_f, quiet):
+    gradebook = section_f.Gradebook()
+    gradebook.add_student("Ann Lee")
+    assert not gradebook.add_student("ANN LEE")
+    assert gradebook.find_student("ann lee").name == "Ann Lee"
+    assert gradebook.find_student("Bob") is None
+    assert len(gradebook.students) == 1
+
+
+@pytest.mark.parametrize("removed", ["s0", "s2", "s4"])
+def test_remove_student_keeps_the_index_and_totals(section_f, quiet, removed):
+    gradebook = section_f.Gradebook()
+    gradebook.add_subject("Math")
+    for i in range(5):
+        gradebook.add_student(f"S{i}")
+        gradebook.add_grade_to_student(f"s{i}", "Math", 10 * i)
+    assert gradebook.remove_student(removed.upper())
+    assert not gradebook.remove_student(removed)
+    assert gradebook.positions == {student.name.lower(): i for i, student in enumerate(gradebook.students)}
+    assert gradebook.grade_total == sum(student.grade_total for student in gradebook.students)
+    assert gradebook.grade_count == len(gradebook.students) == 4
+
+
+def test_remove_the_only_student(section_f, quiet):
+    gradebook = section_f.Gradebook()
+    gradebook.add_student("Ann")
+    assert gradebook.remove_student("ann")
+    assert gradebook.students == [] and gradebook.positions == {}
+    assert (gradebook.grade_total, gradebook.grade_count) == (0, 0)
@@ -0,0 +1,51 @@
+"""Students and their grades in Sections E and F"""
+
+import pytest
+
+
+def test_section_e_run_tests(section_e, capsys):
+    section_e.run_tests()
+    assert "All tests passed" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("section_name", ["section_e", "section_f"])
+def test_grades_is_a_read_only_live_view(request, quiet, section_name):
+    section = request.getfixturevalue(section_name)
+    gradebook = section.Gradebook()
+    gradebook.add_subject("Math")
+    gradebook.add_subject("Art")
+    gradebook.add_student("Ann")
+    student = gradebook.get_student("Ann") if section_name == "section_e" else gradebook.find_student("Ann")
+    grades = student.grades
+    student.add_grade("Math", 80)
+    student.add_grade("Art", 60)
+    assert dict(grades) == {"Math": 80, "Art": 60}
+    with pytest.raises(TypeError):
+        grades["Math"] = 100
+    assert student.remove_grade("Math")
+    assert dict(grades) == {"Art": 60}
+    assert (gradebook.grade_total, gradebook.grade_count) == (60, 1)
+
+
+def test_students_of_different_gradebooks_do_not_share_subject_ids(section_e):
+    first, second = section_e.Gradebook(), section_e.Gradebook()
+    first.add_subject("Math")
+    second.add_subject("Art")
+    assert first.subject_names is not second.subject_names
+    assert "Art" not in first.subject_names.ids
+
+
+def test_section_f_add_grade_bounds(section_f, quiet):
+    gradebook = section_f.Gradebook()
+    gradebook.add_subject("Math")
+    gradebook.add_student("Ann")
+    student = gradebook.find_student("Ann")
+    assert [student.add_grade("Math", grade) for grade in (-1, 101, 85.5)] == [False, False, False]
+    assert student.add_grade("Math", 0) and student.add_grade("Math", 100)
+    assert dict(student.grades) == {"Math": 100}
+
+
+def test_benchmark_memory_slots_use_under_half(section_f, capsys):
+    section_f.benchmark_memory(num_students=20000)
+    used = {line.split()[0]: float(line.split()[1]) for line in capsys.readouterr().out.splitlines()[2:]}
+    assert used["slots"] < used["dict"] / 2